@@ -0,0 +1,84 @@
+import streamlit as st
+import plotly.express as px
+from utils.data_loader import load_quality_report, QUALITY_CHECKS
+
+st.set_page_config(page_title="Data Quality", layout="wide", initial_sidebar_state="expanded")
+st.title("Data Quality Diagnostics")
+st.markdown("**Issues found in each source shard and region repairs made while the current data snapshot was loaded**")
+st.divider()
+
+report = load_quality_report()
+shards = report['shards']
+datasets = report['datasets']
+
+CHECK_LABELS = {
+    'duplicate_rows': "Duplicate Rows",
+    'missing_values': "Missing Values",
+    'invalid_dates': "Invalid Dates",
+    'negative_counts': "Negative Counts",
+    'invalid_pincodes': "Invalid Pincodes",
+    'placeholder_states': "Placeholder States",
+    'unknown_districts': "Unknown Districts"
+}
+
+st.header("Snapshot Summary")
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Rows Ingested", f"{int(datasets['rows'].sum()):,}")
+col2.metric("Shards", int(datasets['shards'].sum()))
+col3.metric("Issues Found", f"{int(datasets[QUALITY_CHECKS].sum().sum()):,}")
+col4.metric("Missing Calendar Days", int(datasets['missing_dates'].max()))
+
+columns = st.columns(len(QUALITY_CHECKS))
+for col, check in zip(columns, QUALITY_CHECKS):
+    col.metric(CHECK_LABELS[check], f"{int(datasets[check].sum()):,}")
+
+st.caption(
+    "Rows with a numeric placeholder state (e.g. \"100000\") are dropped during loading. "
+    "Duplicates are counted across all shards of a dataset and attributed to the shard holding the later copy. "
+    "Unknown districts are rows whose (state, district), after cleaning and pincode repair, is not the majority region of any pincode."
+)
+
+st.subheader("By Dataset")
+st.dataframe(datasets, use_container_width=True)
+
+st.subheader("By Shard")
+dataset_filter = st.multiselect("Datasets", datasets['dataset'].tolist(), default=datasets['dataset'].tolist())
+shard_view = shards[shards['dataset'].isin(dataset_filter)]
+st.dataframe(shard_view, use_container_width=True)
+
+issues = shard_view.melt(
+    id_vars=['dataset', 'shard'],
+    value_vars=QUALITY_CHECKS,
+    var_name='check',
+    value_name='count'
+)
+issues = issues[issues['count'] > 0]
+if len(issues) > 0:
+    issues['check'] = issues['check'].map(CHECK_LABELS)
+    fig = px.bar(
+        issues,
+        x='shard',
+        y='count',
+        color='check',
+        title="Issues by Shard",
+        labels={'shard': 'Shard', 'count': 'Rows Affected', 'check': 'Check'}
+    )
+    fig.update_layout(xaxis_tickangle=-45)
+    st.plotly_chart(fig, use_container_width=True)
+else:
+    st.success("No issues found in the selected shards.")
+
+st.header("Pincode Region Repairs")
+st.markdown(
+    "Each pincode's majority (state, district) across all three datasets forms a master index; "
+    "rows that disagree with a clear majority are reassigned during loading."
+)
+changes = report['region_changes']
+col1, col2, col3 = st.columns(3)
+col1.metric("Rows Reassigned", f"{int(changes['rows'].sum()):,}")
+col2.metric("Pincodes Affected", f"{changes['pincode'].nunique():,}")
+col3.metric("State Changes", f"{int(changes.loc[changes['from_state'] != changes['to_state'], 'rows'].sum()):,}")
+if len(changes) > 0:
+    st.dataframe(changes.sort_values('rows', ascending=False), use_container_width=True)
+else:
+    st.success("Every row agrees with its pincode's majority region.")
@@ -1,7 +1,8 @@
 import streamlit as st
 import pandas as pd
 import altair as alt
-from utils.data_loader import load_aadhaar_data
+from utils.data_loader import load_aadhaar_data, get_data_version, build_region_matrix
+from utils.analytics import growth_rates, growth_leaderboard, DATASET_VALUE_COLUMNS
 
 st.set_page_config(page_title="Overview", layout="wide", initial_sidebar_state="expanded")
 
@@ -22,6 +23,59 @@ def _format_period_label(p):
         return str(p)
 
 
+GROWTH_LEVELS = {'State': ['state'], 'District': ['state', 'district']}
+GROWTH_MEASURE_LABELS = {'Month-on-Month': 'mom_growth', '3-Month': 'growth_3m', 'Year-on-Year': 'yoy_growth'}
+
+
+@st.cache_data(show_spinner="Computing growth for every region...")
+def load_growth_table(dataset, level, data_version):
+    frame_index, value_col = DATASET_VALUE_COLUMNS[dataset]
+    data = load_aadhaar_data()[frame_index]
+    matrix = build_region_matrix(data, value_col, GROWTH_LEVELS[level], freq='M')
+    return growth_rates(matrix, last_date=data['date'].max())
+
+
+def render_growth_leaderboard(dataset, key):
+    st.subheader('Growth Leaderboard')
+    col1, col2, col3, col4 = st.columns(4)
+    level = col1.selectbox('Region Level', list(GROWTH_LEVELS), key=f'{key}_growth_level')
+    measure_label = col2.selectbox('Growth Measure', list(GROWTH_MEASURE_LABELS), key=f'{key}_growth_measure')
+    growth = load_growth_table(dataset, level, get_data_version())
+    months = sorted(pd.DatetimeIndex(growth['month'].unique()), reverse=True)
+    partial_months = set(pd.DatetimeIndex(growth.loc[growth['partial'], 'month'].unique()))
+    # Default to the latest complete month; a partial month's growth compares a few weeks with a full month
+    month = col3.selectbox(
+        'Month', months, index=int(len(partial_months) > 0 and len(months) > 1),
+        format_func=lambda m: pd.Timestamp(m).strftime('%b %Y') + (' (partial)' if m in partial_months else ''),
+        key=f'{key}_growth_month'
+    )
+    min_base = col4.number_input('Minimum Base Volume', 0, 100000, 100, step=50, key=f'{key}_growth_base')
+
+    measure = GROWTH_MEASURE_LABELS[measure_label]
+    growers, decliners = growth_leaderboard(growth, measure, month=month, min_base=min_base)
+    if month in partial_months:
+        st.warning(f"{pd.Timestamp(month).strftime('%b %Y')} is incomplete: the data ends before the month does, so its growth compares part of a month with full months.")
+    if len(growers) == 0:
+        st.info(f'Not enough history for {measure_label.lower()} growth in this month.')
+        return
+    region_cols = GROWTH_LEVELS[level]
+    left, right = st.columns(2)
+    for column, title, ranked in [(left, 'Fastest Growers', growers), (right, 'Fastest Decliners', decliners)]:
+        ranked = ranked.assign(growth_pct=ranked[measure] * 100)
+        ranked['region'] = ranked[region_cols[::-1]].agg(', '.join, axis=1)
+        chart = (
+            alt.Chart(ranked)
+            .mark_bar(color='#1f4ed8' if title == 'Fastest Growers' else '#dc2626')
+            .encode(
+                x=alt.X('growth_pct:Q', title=f'{measure_label} Growth (%)'),
+                y=alt.Y('region:N', sort='-x' if title == 'Fastest Growers' else 'x', title=level),
+                tooltip=[*[alt.Tooltip(f'{col}:N') for col in region_cols], alt.Tooltip('value:Q', format=','), alt.Tooltip('growth_pct:Q', title='Growth %', format='.1f')]
+            )
+            .properties(height=320, title=title)
+        )
+        column.altair_chart(alt_dark_chart(chart), use_container_width=True)
+
+
 def render_enrolment_tab(df):
     st.header('Enrolment — Snapshot')
     total = int(df['total_enrolments'].sum())
@@ -324,12 +378,15 @@ def main():
 
     with tabs[0]:
         render_enrolment_tab(df)
+        render_growth_leaderboard('enrolment', 'enrol')
 
     with tabs[1]:
         render_demo_tab(df_demo)
+        render_growth_leaderboard('demographic', 'demo')
 
     with tabs[2]:
         render_bio_tab(df_bio)
+        render_growth_leaderboard('biometric', 'bio')
 
 
 if __name__ == '__main__':
@@ -1,7 +1,9 @@
 import streamlit as st
 import pandas as pd
 import altair as alt
-from utils.data_loader import load_aadhaar_data
+from utils.data_loader import load_aadhaar_data, get_data_version, POSTAL_LEVELS
+from utils.analytics import cached_concentration_indices
+from utils.drilldown import load_change_points, change_point_rules, render_change_points, load_postal_rollup, format_concentration, load_peer_bands, peer_band_layers
 
 st.set_page_config(page_title="State Drilldown", layout="wide", initial_sidebar_state="expanded")
 
@@ -15,7 +17,93 @@ def alt_dark_chart(chart: alt.Chart) -> alt.Chart:
     )
 
 
-def enrolment_tab(df, selected_state=None):
+def render_concentration(concentration, state, activity):
+    # Indices are precomputed for every state over its districts; only a lookup happens here
+    # A state with no activity in this dataset (or a zero total) has no row and shows n/a
+    row = concentration.set_index('state').reindex([state]).iloc[0]
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric('Top 3 Districts Contribution', format_concentration(row['top3_share'], '.2f', 100, '%'))
+    c2.metric('Herfindahl Index (HHI)', format_concentration(row['hhi'], '.3f'))
+    c3.metric('Gini Coefficient', format_concentration(row['gini'], '.3f'))
+    c4.metric('Effective Districts', format_concentration(row['effective_units'], '.1f'), help='1 / HHI: the number of equal-sized districts that would give the same concentration')
+    if row['top3_share'] > 0.5 and row['n_units'] > 5:
+        st.warning(f'{activity} are highly concentrated in a few districts.')
+    with st.expander("Concentration across all states"):
+        st.dataframe(
+            concentration.rename(columns={'n_units': 'districts', 'effective_units': 'effective_districts'})
+            .sort_values('hhi', ascending=False),
+            use_container_width=True, hide_index=True
+        )
+
+
+# Postal hierarchy levels offered in place of states: label -> (level column, child level column)
+POSTAL_DRILLDOWN_LEVELS = {
+    'Postal Zone': ('postal_zone', 'postal_subzone'),
+    'Postal Sub-zone': ('postal_subzone', 'sorting_district')
+}
+
+
+def postal_drilldown(frames, label, prefix):
+    level, child_level = POSTAL_DRILLDOWN_LEVELS[label]
+    st.header(f"{label} {prefix} — Postal Drilldown")
+    area = load_postal_rollup(level, get_data_version()).loc[prefix]
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric('Total Enrolments', f"{int(area['total_enrolments']):,}")
+    c2.metric('Demographic Updates', f"{int(area['demo_updates']):,}")
+    c3.metric('Biometric Updates', f"{int(area['bio_updates']):,}")
+    c4.metric('Pincodes', f"{int(area['pincodes']):,}")
+    st.caption(f"Spans {int(area['districts'])} districts in {int(area['states'])} state(s): {area['state_names']}")
+
+    # Monthly trend of every dataset within the postal area
+    series = []
+    for frame, value_col, name in zip(
+        frames,
+        ['total_enrolments', 'total_updates', 'total_updates'],
+        ['Enrolments', 'Demographic Updates', 'Biometric Updates']
+    ):
+        area_df = frame[frame[level] == prefix]
+        series.append(area_df.groupby(area_df['date'].dt.to_period('M'))[value_col].sum().rename(name))
+    trend_df = pd.concat(series, axis=1).fillna(0).rename_axis('month').reset_index()
+    trend_df['date'] = trend_df['month'].dt.to_timestamp()
+    trend_df = trend_df.drop(columns='month').melt(id_vars=['date'], var_name='series', value_name='value')
+    trend_df['month_name'] = trend_df['date'].dt.strftime('%b %Y')
+    trend_chart = (
+        alt.Chart(trend_df)
+        .mark_line(point=True)
+        .encode(
+            x=alt.X('month_name:N', title='Month', sort=alt.EncodingSortField(field='date', order='ascending')),
+            y=alt.Y('value:Q', title='Total'),
+            color=alt.Color('series:N', title='Series'),
+            tooltip=[alt.Tooltip('month_name:N', title='Month'), alt.Tooltip('series:N'), alt.Tooltip('value:Q', format=',')]
+        )
+        .properties(height=320, title=f'Monthly Activity in {label} {prefix}')
+    )
+    st.altair_chart(alt_dark_chart(trend_chart), use_container_width=True)
+
+    # Next level of the postal hierarchy within this area
+    st.divider()
+    child_label = 'Postal Sub-zone' if child_level == 'postal_subzone' else 'Sorting District'
+    st.subheader(f'{child_label}s within {label} {prefix}')
+    children = load_postal_rollup(child_level, get_data_version())
+    children = children[children.index // (POSTAL_LEVELS[level] // POSTAL_LEVELS[child_level]) == prefix]
+    children = children.reset_index().sort_values('total_enrolments', ascending=False)
+    children[child_level] = children[child_level].astype(str)
+    child_chart = (
+        alt.Chart(children.head(15))
+        .mark_bar(color='#1f4ed8')
+        .encode(
+            x=alt.X('total_enrolments:Q', title='Total Enrolments'),
+            y=alt.Y(f'{child_level}:N', sort='-x', title=child_label),
+            tooltip=[alt.Tooltip(f'{child_level}:N', title=child_label), alt.Tooltip('total_enrolments:Q', format=','), alt.Tooltip('state_names:N', title='States')]
+        )
+        .properties(height=360, title=f'Top {child_label}s by Enrolments')
+    )
+    st.altair_chart(alt_dark_chart(child_chart), use_container_width=True)
+    st.dataframe(children, use_container_width=True, hide_index=True)
+
+
+def enrolment_tab(df, concentration, selected_state=None):
     if selected_state:
         st.header(f"{selected_state} — Enrolment Drilldown")
         state_df = df[df['state'] == selected_state]
@@ -71,7 +159,12 @@ def enrolment_tab(df, selected_state=None):
             )
             .properties(height=320, title='Enrolment Trend: State vs National Average')
         )
-        st.altair_chart(alt_dark_chart(trend_chart), use_container_width=True)
+        all_shifts = load_change_points('enrolment', 'state', get_data_version())
+        state_shifts = all_shifts[all_shifts['state'] == selected_state]
+        bands = peer_band_layers(load_peer_bands('enrolment', 'state', get_data_version()), 'state', 'Total Enrolments')
+        st.altair_chart(alt_dark_chart(bands + trend_chart + change_point_rules(state_shifts)), use_container_width=True)
+        st.caption("Shaded bands: 10th-90th and 25th-75th percentiles of monthly totals across states; dotted line: median state.")
+        render_change_points(state_shifts, all_shifts, selected_state, 'all states')
 
         # MoM growth metrics
         monthly_state = state_trend.set_index('date')['state_total'].pct_change()
@@ -101,11 +194,7 @@ def enrolment_tab(df, selected_state=None):
         )
         st.altair_chart(alt_dark_chart(district_chart), use_container_width=True)
 
-        top3_share = district_contrib.head(3)['total_enrolments'].sum() / state_total * 100 if state_total else 0
-        st.metric('Top 3 Districts Contribution', f"{top3_share:.2f}%")
-
-        if top3_share > 50 and len(district_contrib)>5:
-            st.warning('Enrolments are highly concentrated in a few districts.')
+        render_concentration(concentration, selected_state, 'Enrolments')
 
         # Age-wise distribution
         st.divider()
@@ -170,17 +259,19 @@ def enrolment_tab(df, selected_state=None):
         st.altair_chart(alt_dark_chart(dow_chart), use_container_width=True)
 
 
-        peak_day = age_long.groupby('day_of_week')['enrolments'].sum().idxmax()
-        st.info(
-        f"Highest enrolment activity observed on "
-        f"{['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday'][peak_day]}."
-        )
+        # A region with no rows in this dataset has no peak day
+        if len(age_long) > 0:
+            peak_day = age_long.groupby('day_of_week')['enrolments'].sum().idxmax()
+            st.info(
+            f"Highest enrolment activity observed on "
+            f"{['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday'][peak_day]}."
+            )
         st.caption(
             "Day-of-week analysis helps optimize staffing and mobile unit deployment. "
             "Peak activity days may require additional capacity to reduce wait times."
         )
 
-def demographic_tab(df_demo, selected_state=None):
+def demographic_tab(df_demo, concentration, selected_state=None):
     if selected_state:
         st.header(f"{selected_state} — Demographic Update Drilldown")
         state_demo = df_demo[df_demo['state'] == selected_state]
@@ -221,7 +312,12 @@ def demographic_tab(df_demo, selected_state=None):
             .encode(x=alt.X('month_name:N', title='Month', sort=alt.EncodingSortField(field='date', order='ascending')), y=alt.Y('value:Q', title='Total Demographic Updates'), color=alt.Color('series:N', title='Series'), tooltip=[alt.Tooltip('month_name:N', title='Month'), alt.Tooltip('series:N'), alt.Tooltip('value:Q', format=',')])
             .properties(height=320, title='Demographic Update Trend: State vs National Average')
         )
-        st.altair_chart(alt_dark_chart(trend_chart), use_container_width=True)
+        all_shifts = load_change_points('demographic', 'state', get_data_version())
+        state_shifts = all_shifts[all_shifts['state'] == selected_state]
+        bands = peer_band_layers(load_peer_bands('demographic', 'state', get_data_version()), 'state', 'Total Demographic Updates')
+        st.altair_chart(alt_dark_chart(bands + trend_chart + change_point_rules(state_shifts)), use_container_width=True)
+        st.caption("Shaded bands: 10th-90th and 25th-75th percentiles of monthly totals across states; dotted line: median state.")
+        render_change_points(state_shifts, all_shifts, selected_state, 'all states')
 
         monthly_state = state_trend.set_index('date')['state_total'].pct_change()
         monthly_national = national_trend.set_index('date')['national_avg'].pct_change()
@@ -249,10 +345,7 @@ def demographic_tab(df_demo, selected_state=None):
         )
         st.altair_chart(alt_dark_chart(district_chart), use_container_width=True)
 
-        top3_share = district_contrib.head(3)['total_updates'].sum() / state_total_updates * 100 if state_total_updates else 0
-        st.metric('Top 3 Districts Contribution', f"{top3_share:.2f}%")
-        if top3_share > 50 and len(district_contrib)>5:
-            st.warning('Updates are highly concentrated in a few districts.')
+        render_concentration(concentration, selected_state, 'Updates')
         # Age-wise composition
         st.divider()
         st.subheader('Age Group Distribution')
@@ -314,17 +407,19 @@ def demographic_tab(df_demo, selected_state=None):
         st.altair_chart(alt_dark_chart(dow_chart), use_container_width=True)
 
 
-        peak_day = age_long.groupby('day_of_week')['demographic_updates'].sum().idxmax()
-        st.info(
-        f"Highest demographic update activity observed on "
-        f"{['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday'][peak_day]}."
-        )
+        # A region with no rows in this dataset has no peak day
+        if len(age_long) > 0:
+            peak_day = age_long.groupby('day_of_week')['demographic_updates'].sum().idxmax()
+            st.info(
+            f"Highest demographic update activity observed on "
+            f"{['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday'][peak_day]}."
+            )
         st.caption(
             "Day-of-week analysis helps optimize staffing and mobile unit deployment. "
             "Peak activity days may require additional capacity to reduce wait times."
         )
 
-def biometric_tab(df_bio, selected_state=None):
+def biometric_tab(df_bio, concentration, selected_state=None):
     if selected_state:
         st.header(f"{selected_state} — Biometric Update Drilldown")
         state_bio_df = df_bio[df_bio['state'] == selected_state]
@@ -365,7 +460,12 @@ def biometric_tab(df_bio, selected_state=None):
             .encode(x=alt.X('month_name:N', title='Month', sort=alt.EncodingSortField(field='date', order='ascending')), y=alt.Y('value:Q', title='Total Biometric Updates'), color=alt.Color('series:N', title='Series'), tooltip=[alt.Tooltip('month_name:N', title='Month'), alt.Tooltip('series:N'), alt.Tooltip('value:Q', format=',')])
             .properties(height=320, title='Biometric Update Trend: State vs National Average')
         )
-        st.altair_chart(alt_dark_chart(trend_chart), use_container_width=True)
+        all_shifts = load_change_points('biometric', 'state', get_data_version())
+        state_shifts = all_shifts[all_shifts['state'] == selected_state]
+        bands = peer_band_layers(load_peer_bands('biometric', 'state', get_data_version()), 'state', 'Total Biometric Updates')
+        st.altair_chart(alt_dark_chart(bands + trend_chart + change_point_rules(state_shifts)), use_container_width=True)
+        st.caption("Shaded bands: 10th-90th and 25th-75th percentiles of monthly totals across states; dotted line: median state.")
+        render_change_points(state_shifts, all_shifts, selected_state, 'all states')
         monthly_state = state_trend.set_index('date')['state_total'].pct_change()
         monthly_national = national_trend.set_index('date')['national_avg'].pct_change()
         latest_state_growth = monthly_state.dropna().iloc[-1] if len(monthly_state.dropna()) else 0
@@ -386,10 +486,7 @@ def biometric_tab(df_bio, selected_state=None):
         )
         st.altair_chart(alt_dark_chart(district_chart), use_container_width=True)
 
-        top3_share = district_updates.head(3)['total_updates'].sum() / total_updates * 100 if total_updates else 0
-        st.metric('Top 3 Districts Contribution', f"{top3_share:.2f}%")
-        if top3_share > 50 and len(district_updates) > 5:
-            st.warning('Updates are highly concentrated in a few districts.')
+        render_concentration(concentration, selected_state, 'Updates')
         st.divider()
         st.subheader('Age Group Distribution')
         age_totals = pd.Series({
@@ -450,11 +547,13 @@ def biometric_tab(df_bio, selected_state=None):
         st.altair_chart(alt_dark_chart(dow_chart), use_container_width=True)
 
 
-        peak_day = age_long.groupby('day_of_week')['biometric_updates'].sum().idxmax()
-        st.info(
-        f"Highest biometric update activity observed on "
-        f"{['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday'][peak_day]}."
-        )
+        # A region with no rows in this dataset has no peak day
+        if len(age_long) > 0:
+            peak_day = age_long.groupby('day_of_week')['biometric_updates'].sum().idxmax()
+            st.info(
+            f"Highest biometric update activity observed on "
+            f"{['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday'][peak_day]}."
+            )
         st.caption(
             "Day-of-week analysis helps optimize staffing and mobile unit deployment. "
             "Peak activity days may require additional capacity to reduce wait times."
@@ -468,19 +567,34 @@ def main():
     except Exception as e:
         st.error(f'Failed to load data: {e}')
         return
+    hierarchy = st.sidebar.radio(
+        'Region Hierarchy', ['Administrative', 'Postal'], horizontal=True,
+        help='Postal areas group pincodes by their first digit (zone) or first two digits (sub-zone)'
+    )
+    if hierarchy == 'Postal':
+        label = st.sidebar.selectbox('Postal Level', list(POSTAL_DRILLDOWN_LEVELS))
+        rollup = load_postal_rollup(POSTAL_DRILLDOWN_LEVELS[label][0], get_data_version())
+        prefix = st.sidebar.selectbox(
+            label, rollup.index.tolist(),
+            format_func=lambda code: f"{code} ({rollup.at[code, 'state_names']})"
+        )
+        postal_drilldown([df, df_demo, df_bio], label, prefix)
+        return
+
     # Sidebar state selector for state-level drilldowns
     selected_state = st.sidebar.selectbox('Select State ', sorted(df['state'].unique()), index=0)
 
+    concentration = cached_concentration_indices('state', get_data_version(), [df, df_demo, df_bio])
     tabs = st.tabs(['Enrolment', 'Demographic Updates', 'Biometric Updates'])
 
     with tabs[0]:
-        enrolment_tab(df, selected_state if selected_state != '' else None)
+        enrolment_tab(df, concentration['enrolment'], selected_state if selected_state != '' else None)
 
     with tabs[1]:
-        demographic_tab(df_demo, selected_state if selected_state != '' else None)
+        demographic_tab(df_demo, concentration['demographic'], selected_state if selected_state != '' else None)
 
     with tabs[2]:
-        biometric_tab(df_bio, selected_state if selected_state != '' else None)
+        biometric_tab(df_bio, concentration['biometric'], selected_state if selected_state != '' else None)
 
 
 if __name__ == '__main__':
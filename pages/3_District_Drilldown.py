@@ -1,7 +1,9 @@
 import streamlit as st
 import pandas as pd
 import altair as alt
-from utils.data_loader import load_aadhaar_data
+from utils.data_loader import load_aadhaar_data, get_data_version
+from utils.analytics import cached_concentration_indices
+from utils.drilldown import load_change_points, change_point_rules, render_change_points, load_postal_rollup, format_concentration, load_peer_bands, peer_band_layers
 
 st.set_page_config(page_title="District Drilldown", layout="wide", initial_sidebar_state="expanded")
 
@@ -15,7 +17,67 @@ def alt_dark_chart(chart: alt.Chart) -> alt.Chart:
     )
 
 
-def enrolment_district_tab(df, state, district):
+def render_concentration(concentration, state, district, activity, column):
+    # Indices are precomputed for every district over its pincodes; only a lookup happens here
+    # A district with no activity in this dataset (or a zero total) has no row and shows n/a
+    row = concentration.set_index(['state', 'district']).reindex([(state, district)]).iloc[0]
+    column.metric('Top 3 Pincodes Contribution', format_concentration(row['top3_share'], '.2f', 100, '%'))
+    c1, c2, c3 = st.columns(3)
+    c1.metric('Herfindahl Index (HHI)', format_concentration(row['hhi'], '.3f'))
+    c2.metric('Gini Coefficient', format_concentration(row['gini'], '.3f'))
+    c3.metric('Effective Pincodes', format_concentration(row['effective_units'], '.1f'), help='1 / HHI: the number of equal-sized pincodes that would give the same concentration')
+    if row['top3_share'] > 0.5 and row['n_units'] > 5:
+        st.warning(f'{activity} are highly concentrated in a few pincodes.')
+    with st.expander("Concentration across all districts"):
+        st.dataframe(
+            concentration.rename(columns={'n_units': 'pincodes', 'effective_units': 'effective_pincodes'})
+            .sort_values('hhi', ascending=False),
+            use_container_width=True, hide_index=True
+        )
+
+
+def sorting_district_drilldown(frames, prefix):
+    st.header(f"Sorting District {prefix} — Postal Drilldown")
+    area = load_postal_rollup('sorting_district', get_data_version()).loc[prefix]
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric('Total Enrolments', f"{int(area['total_enrolments']):,}")
+    c2.metric('Demographic Updates', f"{int(area['demo_updates']):,}")
+    c3.metric('Biometric Updates', f"{int(area['bio_updates']):,}")
+    c4.metric('Pincodes', f"{int(area['pincodes']):,}")
+    st.caption(f"Spans {int(area['districts'])} districts in {int(area['states'])} state(s): {area['state_names']}")
+
+    # Activity of every pincode in the sorting district, with its administrative district
+    pincodes = []
+    for frame, value_col, name in zip(
+        frames,
+        ['total_enrolments', 'total_updates', 'total_updates'],
+        ['enrolments', 'demo_updates', 'bio_updates']
+    ):
+        area_df = frame[frame['sorting_district'] == prefix]
+        pincodes.append(area_df.groupby(['pincode', 'state', 'district'])[value_col].sum().rename(name))
+    pincodes = pd.concat(pincodes, axis=1).fillna(0).reset_index().sort_values('enrolments', ascending=False)
+    pincodes['pincode'] = pincodes['pincode'].astype(str)
+
+    district_mix = pincodes.groupby(['state', 'district'])[['enrolments', 'demo_updates', 'bio_updates']].sum().reset_index()
+    district_chart = (
+        alt.Chart(district_mix)
+        .mark_bar(color='#1f4ed8')
+        .encode(
+            x=alt.X('enrolments:Q', title='Total Enrolments'),
+            y=alt.Y('district:N', sort='-x', title='District'),
+            tooltip=[alt.Tooltip('district:N'), alt.Tooltip('state:N'), alt.Tooltip('enrolments:Q', format=',')]
+        )
+        .properties(height=320, title=f'Enrolments by District within Sorting District {prefix}')
+    )
+    st.altair_chart(alt_dark_chart(district_chart), use_container_width=True)
+
+    st.divider()
+    st.subheader(f'Pincodes within Sorting District {prefix}')
+    st.dataframe(pincodes, use_container_width=True, hide_index=True)
+
+
+def enrolment_district_tab(df, state, district, concentration):
     st.header(f"{district} — Enrolment Drilldown")
     filtered = df[(df['state'] == state) & (df['district'] == district)]
     state_df = df[df['state'] == state]
@@ -73,7 +135,14 @@ def enrolment_district_tab(df, state, district):
         .properties(height=320, title='Enrolment Trend: District vs State Average')
     )
 
-    st.altair_chart(alt_dark_chart(line), use_container_width=True)
+    all_shifts = load_change_points('enrolment', 'district', get_data_version())
+    state_shifts = all_shifts[all_shifts['state'] == state]
+    district_shifts = state_shifts[state_shifts['district'] == district]
+    peer_bands = load_peer_bands('enrolment', 'district', get_data_version())
+    bands = peer_band_layers(peer_bands[peer_bands['state'] == state], 'district', 'Total Enrolments')
+    st.altair_chart(alt_dark_chart(bands + line + change_point_rules(district_shifts)), use_container_width=True)
+    st.caption(f"Shaded bands: 10th-90th and 25th-75th percentiles of monthly totals across the districts of {state}; dotted line: median district.")
+    render_change_points(district_shifts, state_shifts, district, f'districts of {state}')
 
     # Month-on-month growth
     district_monthly = district_trend.set_index('date')['district_total'].pct_change().dropna()
@@ -113,13 +182,9 @@ def enrolment_district_tab(df, state, district):
 
     st.altair_chart(alt_dark_chart(chart), use_container_width=True)
     col1 , col2 = st.columns(2)
-    top_pincode_share = pincodes.head(3)['total_enrolments'].sum() / district_total * 100 if district_total else 0
-    col1.metric('Top 3 Pincodes Contribution', f"{top_pincode_share:.2f}%")
-
     low_activity_pincodes = pincodes[pincodes['total_enrolments'] < 0.01 * district_total]
     col2.metric('Low-Activity Pincodes', len(low_activity_pincodes))
-    if top_pincode_share > 50 and len(pincodes)>5:
-            st.warning('Enrolments are highly concentrated in a few pincodes.')
+    render_concentration(concentration, state, district, 'Enrolments', col1)
     # Age-wise distribution
     st.divider()
     st.subheader('Age Group Distribution')
@@ -179,11 +244,13 @@ def enrolment_district_tab(df, state, district):
         .properties(height=320, title="Enrolments by Day of Week and Age Group")
     )
     st.altair_chart(alt_dark_chart(dow_chart), use_container_width=True)
-    peak_day = age_long.groupby('day_of_week')['enrolments'].sum().idxmax()
-    st.info(
-    f"Highest enrolment activity observed on "
-    f"{['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday'][peak_day]}."
-    )
+    # A region with no rows in this dataset has no peak day
+    if len(age_long) > 0:
+        peak_day = age_long.groupby('day_of_week')['enrolments'].sum().idxmax()
+        st.info(
+        f"Highest enrolment activity observed on "
+        f"{['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday'][peak_day]}."
+        )
     st.caption(
         "Day-of-week analysis helps optimize staffing and mobile unit deployment. "
         "Peak activity days may require additional capacity to reduce wait times."
@@ -191,7 +258,7 @@ def enrolment_district_tab(df, state, district):
 
     
 
-def demographic_district_tab(df_demo, state, district):
+def demographic_district_tab(df_demo, state, district, concentration):
     st.header(f"{district} — Demographic Update Drilldown")
     filtered = df_demo[(df_demo['state'] == state) & (df_demo['district'] == district)]
     state_demo = df_demo[df_demo['state'] == state]
@@ -239,7 +306,14 @@ def demographic_district_tab(df_demo, state, district):
         .encode(x=alt.X('month_name:N', title='Month', sort=alt.EncodingSortField(field='date', order='ascending')), y=alt.Y('value:Q', title='Total Demographic Updates'), color=alt.Color('series:N', title='Series'), tooltip=[alt.Tooltip('month_name:N', title='Month'), alt.Tooltip('series:N'), alt.Tooltip('value:Q', format=',')])
         .properties(height=320, title='Demographic Update Trend: District vs State Average')
     )
-    st.altair_chart(alt_dark_chart(line), use_container_width=True)
+    all_shifts = load_change_points('demographic', 'district', get_data_version())
+    state_shifts = all_shifts[all_shifts['state'] == state]
+    district_shifts = state_shifts[state_shifts['district'] == district]
+    peer_bands = load_peer_bands('demographic', 'district', get_data_version())
+    bands = peer_band_layers(peer_bands[peer_bands['state'] == state], 'district', 'Total Demographic Updates')
+    st.altair_chart(alt_dark_chart(bands + line + change_point_rules(district_shifts)), use_container_width=True)
+    st.caption(f"Shaded bands: 10th-90th and 25th-75th percentiles of monthly totals across the districts of {state}; dotted line: median district.")
+    render_change_points(district_shifts, state_shifts, district, f'districts of {state}')
     district_monthly = district_trend.set_index('date')['district_total'].pct_change().dropna()
     state_monthly = state_level.set_index('date')['state_avg'].pct_change().dropna()
     latest_growth = district_monthly.iloc[-1] if len(district_monthly) else 0
@@ -273,13 +347,9 @@ def demographic_district_tab(df_demo, state, district):
     )
     st.altair_chart(alt_dark_chart(chart), use_container_width=True)
     col1, col2 = st.columns(2)
-    top3_share = pincodes.head(3)['total'].sum() / total_updates * 100 if total_updates else 0
-    col1.metric('Top 3 Pincodes Contribution', f"{top3_share:.2f}%")
-
     low_activity_pincodes = pincodes[pincodes['total'] < 0.01 * total_updates]
     col2.metric('Low-Activity Pincodes', len(low_activity_pincodes))
-    if top3_share > 50 and len(pincodes)>5:
-            st.warning('Demographic updates are highly concentrated in a few pincodes.')
+    render_concentration(concentration, state, district, 'Demographic updates', col1)
 
     st.divider()
     st.subheader('Age Group Distribution')
@@ -343,18 +413,20 @@ def demographic_district_tab(df_demo, state, district):
     st.altair_chart(alt_dark_chart(dow_chart), use_container_width=True)
 
 
-    peak_day = age_long.groupby('day_of_week')['demographic_updates'].sum().idxmax()
-    st.info(
-    f"Highest update activity observed on "
-    f"{['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday'][peak_day]}."
-    )
+    # A region with no rows in this dataset has no peak day
+    if len(age_long) > 0:
+        peak_day = age_long.groupby('day_of_week')['demographic_updates'].sum().idxmax()
+        st.info(
+        f"Highest update activity observed on "
+        f"{['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday'][peak_day]}."
+        )
     st.caption(
         "Day-of-week analysis helps optimize staffing and mobile unit deployment. "
         "Peak activity days may require additional capacity to reduce wait times."
     )
 
 
-def biometric_district_tab(df_bio, state, district):
+def biometric_district_tab(df_bio, state, district, concentration):
     st.header(f"{district} — Biometric Update Drilldown")
     filtered = df_bio[(df_bio['state'] == state) & (df_bio['district'] == district)]
     total_updates = int(filtered[['bio_age_5_17', 'bio_age_17_']].sum().sum())
@@ -399,7 +471,14 @@ def biometric_district_tab(df_bio, state, district):
         .encode(x=alt.X('month_name:N', title='Month', sort=alt.EncodingSortField(field='date', order='ascending')), y=alt.Y('value:Q', title='Total Biometric Updates'), color=alt.Color('series:N', title='Series'), tooltip=[alt.Tooltip('month_name:N', title='Month'), alt.Tooltip('series:N'), alt.Tooltip('value:Q', format=',')])
         .properties(height=320, title='Biometric Update Trend: District vs State Average')
     )
-    st.altair_chart(alt_dark_chart(line), use_container_width=True)
+    all_shifts = load_change_points('biometric', 'district', get_data_version())
+    state_shifts = all_shifts[all_shifts['state'] == state]
+    district_shifts = state_shifts[state_shifts['district'] == district]
+    peer_bands = load_peer_bands('biometric', 'district', get_data_version())
+    bands = peer_band_layers(peer_bands[peer_bands['state'] == state], 'district', 'Total Biometric Updates')
+    st.altair_chart(alt_dark_chart(bands + line + change_point_rules(district_shifts)), use_container_width=True)
+    st.caption(f"Shaded bands: 10th-90th and 25th-75th percentiles of monthly totals across the districts of {state}; dotted line: median district.")
+    render_change_points(district_shifts, state_shifts, district, f'districts of {state}')
     district_monthly = district_trend.set_index('date')['district_total'].pct_change().dropna()
     state_monthly = state_level.set_index('date')['state_avg'].pct_change().dropna()
     latest_growth = district_monthly.iloc[-1] if len(district_monthly) else 0
@@ -432,14 +511,10 @@ def biometric_district_tab(df_bio, state, district):
         .properties(height=360, title='Top 10 pincodes by Biometric Updates')
     )
     st.altair_chart(alt_dark_chart(chart), use_container_width=True)
-    top3_share = pincodes.head(3)['total'].sum() / total_updates * 100 if total_updates else 0
     col1 , col2 = st.columns(2)
-    col1.metric('Top 3 Pincodes Contribution', f"{top3_share:.2f}%")
-
     low_activity_pincodes = pincodes[pincodes['total'] < 0.01 * total_updates]
     col2.metric('Low-Activity Pincodes', len(low_activity_pincodes))
-    if top3_share > 50 and len(pincodes)>5:
-            st.warning('Biometric updates are highly concentrated in a few pincodes.')
+    render_concentration(concentration, state, district, 'Biometric updates', col1)
     st.divider()
     st.subheader('Age Group Distribution')
     age_totals = filtered[['bio_age_5_17', 'bio_age_17_']].sum().reset_index()
@@ -500,11 +575,13 @@ def biometric_district_tab(df_bio, state, district):
     st.altair_chart(alt_dark_chart(dow_chart), use_container_width=True)
 
 
-    peak_day = age_long.groupby('day_of_week')['biometric_updates'].sum().idxmax()
-    st.info(
-    f"Highest update activity observed on "
-    f"{['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday'][peak_day]}."
-    )
+    # A region with no rows in this dataset has no peak day
+    if len(age_long) > 0:
+        peak_day = age_long.groupby('day_of_week')['biometric_updates'].sum().idxmax()
+        st.info(
+        f"Highest update activity observed on "
+        f"{['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday'][peak_day]}."
+        )
     st.caption(
         "Day-of-week analysis helps optimize staffing and mobile unit deployment. "
         "Peak activity days may require additional capacity to reduce wait times."
@@ -522,19 +599,33 @@ def main():
 
     # Common sidebar filters
     st.sidebar.header('Filters')
+    hierarchy = st.sidebar.radio(
+        'Region Hierarchy', ['Administrative', 'Postal'], horizontal=True,
+        help='Sorting districts group pincodes by their first three digits'
+    )
+    if hierarchy == 'Postal':
+        rollup = load_postal_rollup('sorting_district', get_data_version())
+        prefix = st.sidebar.selectbox(
+            'Sorting District', rollup.index.tolist(),
+            format_func=lambda code: f"{code} ({rollup.at[code, 'state_names']})"
+        )
+        sorting_district_drilldown([df, df_demo, df_bio], prefix)
+        return
+
     state = st.sidebar.selectbox('State', sorted(df['state'].unique()), index=0)
     district = st.sidebar.selectbox('District', sorted(df[df['state'] == state]['district'].unique()), index=0)
 
+    concentration = cached_concentration_indices('district', get_data_version(), [df, df_demo, df_bio])
     tabs = st.tabs(['Enrolment', 'Demographic Updates', 'Biometric Updates'])
 
     with tabs[0]:
-        enrolment_district_tab(df, state, district)
+        enrolment_district_tab(df, state, district, concentration['enrolment'])
 
     with tabs[1]:
-        demographic_district_tab(df_demo, state, district)
+        demographic_district_tab(df_demo, state, district, concentration['demographic'])
 
     with tabs[2]:
-        biometric_district_tab(df_bio, state, district)
+        biometric_district_tab(df_bio, state, district, concentration['biometric'])
 
 
 if __name__ == '__main__':
@@ -1,10 +1,20 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
-from utils.data_loader import load_aadhaar_data
+from utils.data_loader import load_aadhaar_data, get_data_version, build_region_matrix
 from utils.analytics import (
-    detect_anomalies_isolation_forest
+    cached_anomaly_scores, apply_anomaly_threshold, cached_anomaly_feature_matrix, ANOMALY_FEATURE_COLUMNS,
+    rolling_robust_zscores, robust_zscore_alerts, init_robust_detector, update_robust_detector,
+    seasonal_residual_zscores, build_temporal_features, cached_peer_table, peer_deviation_scores, detect_change_points,
+    DEFAULT_ANOMALY_FEATURES, TEMPORAL_ANOMALY_FEATURES, PINCODE_MAX_SAMPLES,
+    PEER_PROFILE_FEATURES, PEER_BEHAVIOUR_FEATURES
 )
+from utils.anomaly_store import (
+    list_anomaly_runs, load_anomaly_table, new_alerts_path, stored_level_scores, stored_daily_alerts, stored_change_points,
+    POSTAL_REGION_LEVELS, DAILY_DATASETS, TREND_LEVELS
+)
+from utils.drilldown import load_postal_rollup
 
 st.set_page_config(page_title="Anomaly Detection", layout="wide", initial_sidebar_state="expanded")
 st.title("Anomaly Detection and Risk Assessment")
@@ -12,35 +22,127 @@ st.markdown("**Identify outliers, anomalies, and potential risk patterns in Aadh
 st.divider()
 
 [df, df_demo, df_bio] = load_aadhaar_data()
+data_version = get_data_version()
+# Region levels scored from the shared cross-dataset feature matrix
+REGION_LEVELS = {
+    "State Level": 'state', "District Level": 'district', "Pincode Level": 'pincode',
+    **POSTAL_REGION_LEVELS
+}
+
+def load_level_features(analysis_level, data_version):
+    if analysis_level in REGION_LEVELS:
+        return cached_anomaly_feature_matrix(REGION_LEVELS[analysis_level], data_version, [df, df_demo, df_bio])
+    return load_temporal_features(data_version)
+
+@st.cache_data(show_spinner="Aggregating detection features...")
+def load_temporal_features(data_version):
+    return build_temporal_features(load_aadhaar_data()[0])
+
+@st.cache_data(show_spinner="Reading stored anomaly scores...")
+def load_stored_anomalies(run_path):
+    return load_anomaly_table(run_path)
+
+@st.cache_data
+def load_new_alerts(run_path):
+    return pd.read_csv(new_alerts_path(run_path))
+
+# Scores from the latest batch run (python -m utils.anomaly_store) are used when they
+# match the loaded data; otherwise the page scores live
+stored_runs = list_anomaly_runs()
+stored_anomalies = load_stored_anomalies(stored_runs[-1]) if stored_runs else None
+if stored_anomalies is not None and (stored_anomalies.empty or stored_anomalies['data_version'].iloc[0] != data_version):
+    stored_anomalies = None
+
+@st.cache_data(show_spinner="Building district x day matrix...")
+def load_district_daily_matrix(dataset, data_version):
+    frame_index, value_col = DAILY_DATASETS[dataset]
+    return build_region_matrix(load_aadhaar_data()[frame_index], value_col, ['state', 'district'], freq='D')
+
+@st.cache_data(show_spinner="Scoring daily volumes against rolling baselines...")
+def load_robust_zscores(dataset, window, data_version):
+    return rolling_robust_zscores(load_district_daily_matrix(dataset, data_version), window=window)
+
+@st.cache_data(show_spinner="Removing trend and weekly seasonality...")
+def load_seasonal_residuals(dataset, data_version):
+    return seasonal_residual_zscores(load_district_daily_matrix(dataset, data_version))
+
+@st.cache_data(show_spinner="Detecting regime shifts...")
+def load_trend_change_points(dataset, trend_level, data_version):
+    frame_index, value_col = DAILY_DATASETS[dataset]
+    matrix = build_region_matrix(load_aadhaar_data()[frame_index], value_col, TREND_LEVELS[trend_level], freq='D')
+    return detect_change_points(matrix)
+
+def detect_level_anomalies(analysis_level, features, contamination):
+    # The forest is fitted once per level, feature set and data version; the slider only moves the threshold
+    level_data = load_level_features(analysis_level, data_version)
+    stored_features = TEMPORAL_ANOMALY_FEATURES if analysis_level == "Temporal (Daily)" else DEFAULT_ANOMALY_FEATURES
+    if stored_anomalies is not None and set(features) == set(stored_features):
+        scores = stored_level_scores(stored_anomalies, analysis_level, level_data)
+        # Runs written before a level was added hold no scores for it
+        if len(scores) > 0:
+            return apply_anomaly_threshold(level_data, scores, contamination)
+    if analysis_level == "Pincode Level":
+        scores = cached_anomaly_scores(
+            analysis_level, features, data_version, level_data,
+            n_jobs=-1, max_samples=PINCODE_MAX_SAMPLES
+        )
+    else:
+        scores = cached_anomaly_scores(analysis_level, features, data_version, level_data)
+    return apply_anomaly_threshold(level_data, scores, contamination)
 
 # Sidebar configuration
 st.sidebar.header("Detection Configuration")
 contamination = st.sidebar.slider("Expected Anomaly Rate", 0.05, 0.3, 0.1, 0.05)
 
-analysis_level = st.sidebar.selectbox(
-    "Analysis Level",
-    ["State Level", "District Level", "Temporal (Daily)"]
+hierarchy = st.sidebar.radio(
+    "Region Hierarchy", ["Administrative", "Postal"], horizontal=True,
+    help="Postal areas group pincodes by their first two digits (sub-zone) or three digits (sorting district)"
 )
+if hierarchy == "Postal":
+    analysis_level = st.sidebar.selectbox("Analysis Level", list(POSTAL_REGION_LEVELS))
+else:
+    analysis_level = st.sidebar.selectbox(
+        "Analysis Level",
+        ["State Level", "District Level", "Pincode Level", "Peer Comparison", "District Daily Shifts",
+         "Regime Shifts", "Temporal (Daily)"]
+    )
 
-st.header("Isolation Forest Anomaly Detection")
+features = TEMPORAL_ANOMALY_FEATURES
+if analysis_level in REGION_LEVELS:
+    features = tuple(st.sidebar.multiselect(
+        "Detection Features",
+        ANOMALY_FEATURE_COLUMNS,
+        default=list(DEFAULT_ANOMALY_FEATURES),
+        help="Enrolment, demographic-update and biometric-update features joined per region"
+    )) or DEFAULT_ANOMALY_FEATURES
+
+if stored_anomalies is not None:
+    run_id = stored_anomalies['run_id'].iloc[0]
+    st.sidebar.caption(f"Default scores read from batch run {run_id}")
+    new_alerts = load_new_alerts(stored_runs[-1])
+    with st.expander(f"Batch run {run_id}: {len(new_alerts):,} new alerts since the previous run"):
+        if len(new_alerts) > 0:
+            st.dataframe(
+                new_alerts.groupby(['level', 'dataset', 'detector']).size().rename('new_alerts').reset_index(),
+                use_container_width=True
+            )
+            st.dataframe(
+                new_alerts[['level', 'dataset', 'detector', 'region', 'date', 'score', 'direction']].head(100),
+                use_container_width=True
+            )
+else:
+    st.sidebar.caption("No batch run for this data snapshot; scoring live (python -m utils.anomaly_store)")
+
+# Levels not scored by Isolation Forest name their own detector
+LEVEL_HEADERS = {
+    "Peer Comparison": "Peer Group Deviation",
+    "District Daily Shifts": "Daily Volume Shift Detection",
+    "Regime Shifts": "Regime Shift Detection"
+}
+st.header(LEVEL_HEADERS.get(analysis_level, "Isolation Forest Anomaly Detection"))
 if analysis_level == "State Level":
-    state_data = df.groupby('state').agg({
-        'total_enrolments': 'sum',
-        'age_0_5': 'sum',
-        'age_5_17': 'sum',
-        'age_18_greater': 'sum'
-    }).reset_index()
-
-    state_data['child_ratio'] = (
-        state_data['age_0_5'] + state_data['age_5_17']
-    ) / state_data['total_enrolments']
-    
     # Detect anomalies
-    anomaly_df = detect_anomalies_isolation_forest(
-        state_data,
-        ['total_enrolments', 'child_ratio'],
-        contamination=contamination
-    )
+    anomaly_df = detect_level_anomalies(analysis_level, features, contamination)
     
     anomalies = anomaly_df[anomaly_df['is_anomaly'] == True]
 
@@ -49,7 +151,7 @@ if analysis_level == "State Level":
 
     if len(anomalies) > 0:
         st.dataframe(
-            anomalies[['state', 'total_enrolments', 'child_ratio']],
+            anomalies[['state', 'anomaly_score', *features]],
             use_container_width=True
         )
 
@@ -73,23 +175,7 @@ if analysis_level == "State Level":
         st.success("No anomalies detected at this contamination level.")
 
 elif analysis_level == "District Level":
-    district_data = df.groupby(['state', 'district']).agg({
-        'total_enrolments': 'sum',
-        'age_0_5': 'sum',
-        'age_5_17': 'sum',
-        'age_18_greater': 'sum'
-    }).reset_index()
-    
-    district_data['child_ratio'] = (
-        (district_data['age_0_5'] + district_data['age_5_17']) / 
-        district_data['total_enrolments']
-    )
-    
-    anomaly_df = detect_anomalies_isolation_forest(
-        district_data,
-        ['total_enrolments', 'child_ratio'],
-        contamination=contamination
-    )
+    anomaly_df = detect_level_anomalies(analysis_level, features, contamination)
     
     anomalies = anomaly_df[anomaly_df['is_anomaly'] == True]
 
@@ -98,29 +184,283 @@ elif analysis_level == "District Level":
 
     if len(anomalies) > 0:
         st.dataframe(
-            anomalies[['state', 'district', 'total_enrolments', 'child_ratio']].head(20),
+            anomalies.sort_values('anomaly_score', ascending=False)[
+                ['state', 'district', 'anomaly_score', *features]
+            ].head(20),
             use_container_width=True
         )
 
-else:  # Temporal
-    daily_data = df.groupby('date').agg({
-        'total_enrolments': 'sum',
-        'age_0_5': 'sum',
-        'age_5_17': 'sum',
-        'age_18_greater': 'sum'
-    }).reset_index()
-    
-    daily_data['child_ratio'] = (
-        (daily_data['age_0_5'] + daily_data['age_5_17']) / 
-        daily_data['total_enrolments']
+elif analysis_level == "Pincode Level":
+    anomaly_df = detect_level_anomalies(analysis_level, features, contamination)
+
+    anomalies = anomaly_df[anomaly_df['is_anomaly'] == True].sort_values('anomaly_score', ascending=False)
+
+    st.subheader("Detected Anomalies")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Pincodes Scored", f"{len(anomaly_df):,}")
+    col2.metric("Number of Anomalous Pincodes", f"{len(anomalies):,}")
+    col3.metric("States Affected", anomalies['state'].nunique())
+
+    if len(anomalies) > 0:
+        state_counts = anomalies.groupby('state').size().sort_values(ascending=False).head(15)
+        fig = px.bar(
+            x=state_counts.index,
+            y=state_counts.values,
+            title="Anomalous Pincodes by State (Top 15)",
+            labels={'x': 'State', 'y': 'Anomalous Pincodes'}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+        # Page through the ranked anomalies instead of sending every row to the browser
+        col_p1, col_p2 = st.columns(2)
+        page_size = col_p1.selectbox("Rows per Page", [25, 50, 100], index=1)
+        page_count = (len(anomalies) - 1) // page_size + 1
+        page = col_p2.number_input(f"Page (of {page_count})", 1, page_count, 1)
+        start = (page - 1) * page_size
+        st.dataframe(
+            anomalies[['pincode', 'state', 'district', 'anomaly_score', *features]].iloc[start:start + page_size],
+            use_container_width=True
+        )
+
+elif analysis_level in POSTAL_REGION_LEVELS:
+    level = POSTAL_REGION_LEVELS[analysis_level]
+    area_label = analysis_level.replace(" Level", "")
+    anomaly_df = detect_level_anomalies(analysis_level, features, contamination)
+    # Postal areas cross administrative boundaries; show the states each one spans
+    anomaly_df = anomaly_df.join(
+        load_postal_rollup(level, data_version)[['pincodes', 'states', 'state_names']], on=level
     )
-    daily_data['day_of_week'] = pd.to_datetime(daily_data['date']).dt.dayofweek
-    
-    anomaly_df = detect_anomalies_isolation_forest(
-        daily_data,
-        ['total_enrolments', 'child_ratio'],
-        contamination=contamination
+    anomalies = anomaly_df[anomaly_df['is_anomaly'] == True].sort_values('anomaly_score', ascending=False)
+
+    st.subheader("Detected Anomalies")
+    col1, col2, col3 = st.columns(3)
+    col1.metric(f"{area_label}s Scored", f"{len(anomaly_df):,}")
+    col2.metric(f"Number of Anomalous {area_label}s", f"{len(anomalies):,}")
+    col3.metric("Spanning Several States", int((anomalies['states'] > 1).sum()))
+
+    if len(anomaly_df) < 10:
+        st.info("Isolation Forest needs at least 10 areas to score; choose a finer postal level.")
+    elif len(anomalies) > 0:
+        st.dataframe(
+            anomalies[[level, 'state_names', 'pincodes', 'anomaly_score', *features]].head(50),
+            use_container_width=True
+        )
+        fig = px.scatter(
+            anomaly_df,
+            x='total_enrolments',
+            y='child_ratio',
+            color='is_anomaly',
+            hover_data=[level, 'state_names', 'pincodes'],
+            title=f"Anomaly Detection: {area_label} Patterns",
+            labels={
+                'total_enrolments': 'Total Enrolments',
+                'child_ratio': 'Child Enrolment Ratio',
+                'is_anomaly': 'Anomaly'
+            },
+            color_discrete_map={True: '#dc2626', False: '#1f4ed8'}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.success("No anomalies detected at this contamination level.")
+
+elif analysis_level == "District Daily Shifts":
+    st.sidebar.subheader("Daily Shift Detector")
+    dataset = st.sidebar.selectbox("Dataset", list(DAILY_DATASETS))
+    detector_type = st.sidebar.radio("Detector", ["Rolling Robust Z-Score", "Seasonal Decomposition Residual"])
+    z_threshold = st.sidebar.slider("Z-Score Threshold", 2.0, 8.0, 3.5, 0.5)
+
+    matrix = load_district_daily_matrix(dataset, data_version)
+    window = None
+    if detector_type == "Rolling Robust Z-Score":
+        window = st.sidebar.slider("Baseline Window (Days)", 7, 56, 28, 7)
+        baseline_label = "Rolling Median"
+    else:
+        baseline_label = "Trend + Weekly Seasonality"
+    use_stored = stored_anomalies is not None and (
+        window is None or
+        window in stored_anomalies.loc[stored_anomalies['detector'] == detector_type, 'window'].dropna().unique()
     )
+    if use_stored:
+        # The batch run already scored every district-day; nothing is rescored here
+        scores = None
+        alerts = stored_daily_alerts(stored_anomalies, dataset, detector_type, z_threshold)
+        latest_alerts = alerts[alerts['date'] == matrix.columns[-1]]
+    elif detector_type == "Rolling Robust Z-Score":
+        scores = load_robust_zscores(dataset, window, data_version)
+        alerts = robust_zscore_alerts(matrix, scores, threshold=z_threshold)
+
+        # Latest day scored through the online detector, as it would be on ingestion
+        detector = init_robust_detector(matrix.iloc[:, :-1], window=window)
+        _, latest_alerts = update_robust_detector(
+            detector, matrix.iloc[:, -1], matrix.columns[-1], threshold=z_threshold
+        )
+    else:
+        scores = load_seasonal_residuals(dataset, data_version)
+        alerts = robust_zscore_alerts(matrix, scores, threshold=z_threshold)
+        latest_alerts = alerts[alerts['date'] == matrix.columns[-1]]
+
+    st.subheader("Daily Volume Shifts by District")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("District-Days Flagged", f"{len(alerts):,}")
+    col2.metric("Districts with Alerts", alerts[['state', 'district']].drop_duplicates().shape[0])
+    col3.metric(f"Alerts on {matrix.columns[-1]:%d %b %Y}", len(latest_alerts))
+
+    if len(latest_alerts) > 0:
+        st.markdown("**Latest-day alerts**")
+        st.dataframe(
+            latest_alerts.sort_values('zscore', key=abs, ascending=False),
+            use_container_width=True
+        )
+
+    if len(alerts) > 0:
+        st.markdown("**Strongest shifts in the period**")
+        st.dataframe(
+            alerts.sort_values('zscore', key=abs, ascending=False).head(50),
+            use_container_width=True
+        )
+
+        alert_districts = alerts[['state', 'district']].drop_duplicates()
+        district_labels = (alert_districts['district'] + ", " + alert_districts['state']).tolist()
+        selected = st.selectbox("Inspect District", district_labels)
+        selected_key = tuple(alert_districts.iloc[district_labels.index(selected)])
+        if scores is None:
+            # Only the inspected district is scored, for its baseline; each series is scored independently
+            district_matrix = matrix.loc[[selected_key]]
+            if detector_type == "Rolling Robust Z-Score":
+                scores = rolling_robust_zscores(district_matrix, window=window)
+            else:
+                scores = seasonal_residual_zscores(district_matrix)
+        district_view = pd.DataFrame({
+            'date': matrix.columns,
+            'value': matrix.loc[selected_key].values,
+            'baseline_median': scores['median'].loc[selected_key].values,
+            'zscore': scores['zscore'].loc[selected_key].values
+        })
+        district_view['is_alert'] = district_view['zscore'].abs() > z_threshold
+        fig = px.scatter(
+            district_view,
+            x='date',
+            y='value',
+            color='is_alert',
+            title=f"Daily {dataset}: {selected}",
+            labels={'value': dataset, 'date': 'Date', 'is_alert': 'Alert'},
+            color_discrete_map={True: '#dc2626', False: '#1f4ed8'}
+        )
+        fig.add_scatter(
+            x=district_view['date'], y=district_view['baseline_median'],
+            mode='lines', name=baseline_label, line=dict(color='#f59e0b', dash='dash')
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.success("No daily volume shifts above the threshold.")
+
+elif analysis_level == "Regime Shifts":
+    st.sidebar.subheader("Regime Shift Detector")
+    dataset = st.sidebar.selectbox("Dataset", list(DAILY_DATASETS))
+    trend_level = st.sidebar.radio("Trend Level", list(TREND_LEVELS))
+    region_cols = TREND_LEVELS[trend_level]
+
+    shifts = stored_change_points(stored_anomalies, dataset, trend_level) if stored_anomalies is not None else None
+    # Runs written before the level was added hold no shifts for it
+    if shifts is None or len(shifts) == 0:
+        shifts = load_trend_change_points(dataset, trend_level, data_version)
+    shifts = shifts.assign(direction=np.where(shifts['mean_after'] > shifts['mean_before'], 'Up', 'Down'))
+
+    st.subheader("Sustained Shifts in Daily Volume")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Regime Shifts", f"{len(shifts):,}")
+    col2.metric("Regions Affected", f"{len(shifts.drop_duplicates(region_cols)):,}")
+    col3.metric("Median Change", f"{shifts['change_pct'].abs().median():.1f}%" if len(shifts) > 0 else "-")
+
+    if len(shifts) > 0:
+        weekly = (
+            shifts.assign(week=shifts['date'].dt.to_period('W').dt.start_time)
+            .groupby(['week', 'direction']).size().rename('shifts').reset_index()
+        )
+        fig = px.bar(
+            weekly,
+            x='week',
+            y='shifts',
+            color='direction',
+            title=f"{dataset}: Regime Shifts by Week",
+            labels={'week': 'Week', 'shifts': 'Regime Shifts', 'direction': 'Direction'},
+            color_discrete_map={'Up': '#16a34a', 'Down': '#dc2626'}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(
+            shifts.sort_values('strength', ascending=False)[
+                region_cols + ['date', 'direction', 'mean_before', 'mean_after', 'change_pct', 'strength']
+            ].head(100),
+            use_container_width=True
+        )
+    else:
+        st.success("No regime shifts detected in the daily series.")
+
+elif analysis_level == "Peer Comparison":
+    st.sidebar.subheader("Peer Groups")
+    peer_level = st.sidebar.radio("Peer Level", ["District Level", "Pincode Level"])
+    k = st.sidebar.slider("Peers per Region", 5, 30, 10, 5)
+
+    # Peers are matched on size and age mix, then compared on update and growth behaviour
+    level_data = load_level_features(peer_level, data_version)
+    peer_table = cached_peer_table(peer_level, PEER_PROFILE_FEATURES, k, data_version, level_data)
+    deviations = None
+    if stored_anomalies is not None and k in stored_anomalies.loc[stored_anomalies['detector'] == "Peer kNN", 'k'].dropna().unique():
+        deviations = pd.DataFrame({
+            'peer_score': stored_level_scores(stored_anomalies, peer_level, level_data, detector="Peer kNN"),
+            'top_deviation': stored_level_scores(stored_anomalies, peer_level, level_data, detector="Peer kNN", column='direction')
+        })
+    if deviations is None or len(deviations) == 0:
+        deviations = peer_deviation_scores(level_data, peer_table)
+    anomaly_df = apply_anomaly_threshold(level_data.join(deviations), deviations['peer_score'], contamination)
+    anomalies = anomaly_df[anomaly_df['is_anomaly'] == True].sort_values('anomaly_score', ascending=False)
+    region_cols = ['pincode', 'state', 'district'] if peer_level == "Pincode Level" else ['state', 'district']
+
+    st.subheader("Regions Deviating from Their Peers")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Regions Scored", f"{len(anomaly_df):,}")
+    col2.metric("Deviating Regions", f"{len(anomalies):,}")
+    col3.metric("Median Peer Distance", f"{np.median(peer_table['distances']):.2f}")
+
+    if len(anomalies) > 0:
+        st.dataframe(
+            anomalies[region_cols + ['anomaly_score', 'top_deviation', *PEER_BEHAVIOUR_FEATURES]].head(50),
+            use_container_width=True
+        )
+
+        top_regions = anomalies.head(50)
+        region_labels = top_regions[region_cols].astype(str).agg(", ".join, axis=1).tolist()
+        selected = st.selectbox("Compare with Peers", region_labels)
+        position = anomaly_df.index.get_loc(top_regions.index[region_labels.index(selected)])
+        peers = level_data.iloc[peer_table['indices'][position]]
+        comparison = pd.DataFrame({
+            'feature': list(PEER_BEHAVIOUR_FEATURES) * 2,
+            'value': np.concatenate([
+                level_data.iloc[position][list(PEER_BEHAVIOUR_FEATURES)].to_numpy(dtype=float),
+                peers[list(PEER_BEHAVIOUR_FEATURES)].median().to_numpy(dtype=float)
+            ]),
+            'series': ["Selected Region"] * len(PEER_BEHAVIOUR_FEATURES) + ["Peer Median"] * len(PEER_BEHAVIOUR_FEATURES)
+        })
+        fig = px.bar(
+            comparison,
+            x='feature',
+            y='value',
+            color='series',
+            barmode='group',
+            title=f"{selected} vs {k} Nearest Peers",
+            labels={'feature': 'Feature', 'value': 'Value', 'series': ''},
+            color_discrete_map={"Selected Region": '#dc2626', "Peer Median": '#1f4ed8'}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(
+            peers[region_cols + list(PEER_PROFILE_FEATURES)].assign(peer_distance=peer_table['distances'][position]),
+            use_container_width=True
+        )
+    else:
+        st.success("No regions deviate from their peers at this contamination level.")
+
+else:  # Temporal
+    anomaly_df = detect_level_anomalies(analysis_level, features, contamination)
     
     anomalies = anomaly_df[anomaly_df['is_anomaly'] == True]
 
@@ -3,9 +3,14 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from utils.data_loader import load_aadhaar_data
+from utils.data_loader import load_aadhaar_data, get_data_version, build_region_matrix, build_sparse_region_matrix
 from utils.forecasting import (
-    ensemble_forecast, evaluate_forecast_accuracy
+    ensemble_forecast, evaluate_forecast_accuracy,
+    seasonal_daily_forecast, seasonal_daily_forecast_batch,
+    croston_forecast, croston_forecast_batch,
+    refresh_forecast_state, forecast_from_state,
+    cohort_update_demand, DEFAULT_COHORT_PERIODS,
+    FORECAST_MODELS, backtest_forecast_models, backtest_ensemble_weights, get_model_timings
 )
 
 st.set_page_config(page_title="Predictive Analytics", layout="wide", initial_sidebar_state="expanded")
@@ -15,6 +20,77 @@ st.markdown("**Time series forecasting and predictive modeling for Aadhaar enrol
 st.divider()
 
 [df, df_demo, df_bio] = load_aadhaar_data()
+data_version = get_data_version()
+
+LEVEL_COLUMNS = {
+    "National": None,
+    "State": ['state'],
+    "District": ['state', 'district']
+}
+
+def select_dataset(forecast_type, frames):
+    df, df_demo, df_bio = frames
+    if forecast_type == "Enrolments":
+        return df, 'total_enrolments'
+    elif forecast_type == "Demographic Updates":
+        return df_demo, 'total_updates'
+    return df_bio, 'total_updates'
+
+@st.cache_data(show_spinner="Preparing forecast series...")
+def load_forecast_matrix(forecast_type, forecast_level, freq, data_version):
+    data, value_col = select_dataset(forecast_type, load_aadhaar_data())
+    return build_region_matrix(data, value_col, LEVEL_COLUMNS[forecast_level], freq=freq)
+
+@st.cache_resource
+def forecast_state_store():
+    # Closed-month forecast states, kept across data reloads: key -> refresh_forecast_state entry
+    return {}
+
+def load_forecast_state(forecast_type, forecast_level, data_version):
+    # Running OLS sums and Holt level/trend per region; months closed since the stored
+    # state are folded in with update_forecast_state instead of refitting from scratch
+    store = forecast_state_store()
+    key = (forecast_type, forecast_level)
+    state, store[key] = refresh_forecast_state(store.get(key), load_forecast_matrix(forecast_type, forecast_level, 'M', data_version))
+    return state
+
+@st.cache_data(show_spinner="Forecasting intermittent demand for every pincode...")
+def load_pincode_forecasts(forecast_type, freq, periods, data_version):
+    data, value_col = select_dataset(forecast_type, load_aadhaar_data())
+    bundle = build_sparse_region_matrix(data, value_col, 'pincode', freq=freq)
+    return bundle, croston_forecast_batch(bundle['matrix'], periods=periods)
+
+@st.cache_data(show_spinner="Fitting daily forecasts for every region...")
+def load_daily_forecasts(forecast_type, forecast_level, periods, n_draws, quantiles, data_version):
+    matrix = load_forecast_matrix(forecast_type, forecast_level, 'D', data_version)
+    return seasonal_daily_forecast_batch(matrix, periods=periods, n_draws=n_draws, quantiles=quantiles)
+
+@st.cache_data(show_spinner="Backtesting forecast models...")
+def load_backtest_report(forecast_type, forecast_level, region_key, models, data_version):
+    # Rolling-origin backtest of one region's monthly series, cached per region and model set
+    series = load_forecast_matrix(forecast_type, forecast_level, 'M', data_version).loc[region_key].dropna()
+    return backtest_forecast_models(series, horizon=min(3, max(1, len(series) - 3)), models=list(models))
+
+@st.cache_data(show_spinner="Building cohort matrices...")
+def load_cohort_matrices(data_version):
+    # Enrolment cohorts and biometric updates per district, aligned by month
+    df, _, df_bio = load_aadhaar_data()
+    region_cols = LEVEL_COLUMNS["District"]
+    return (
+        build_region_matrix(df, 'age_0_5', region_cols, freq='M'),
+        build_region_matrix(df, 'age_5_17', region_cols, freq='M'),
+        build_region_matrix(df_bio, 'bio_age_5_17', region_cols, freq='M')
+    )
+
+def load_cohort_demand(periods, data_version):
+    # The due and update flow states live in the forecast state store next to the forecast levels;
+    # like load_forecast_state this is not cached, so every call reads and writes the current entry
+    store = forecast_state_store()
+    cohort = cohort_update_demand(
+        *load_cohort_matrices(data_version), periods=periods, stored=store.get("Cohort Demand")
+    )
+    store["Cohort Demand"] = cohort['stored']
+    return cohort
 
 # Sidebar configuration
 st.sidebar.header("Forecasting Configuration")
@@ -24,42 +100,77 @@ forecast_type = st.sidebar.selectbox(
 )
 forecast_level = st.sidebar.selectbox(
     "Forecast Level",
-    ["National", "State", "District"]
+    ["National", "State", "District", "Pincode"]
+)
+forecast_granularity = st.sidebar.selectbox(
+    "Forecast Granularity",
+    ["Monthly", "Daily"]
 )
-forecast_periods = st.sidebar.slider("Forecast Periods (Months)", 1, 12, 3)
-df['month'] = df['date'].dt.to_period('M')
-df_demo['month'] = df_demo['date'].dt.to_period('M')
-df_bio['month'] = df_bio['date'].dt.to_period('M')
+if forecast_granularity == "Daily":
+    period_unit = "days"
+    forecast_periods = st.sidebar.slider("Forecast Periods (Days)", 7, 90, 28)
+else:
+    period_unit = "months"
+    forecast_periods = st.sidebar.slider("Forecast Periods (Months)", 1, 12, 3)
 if forecast_level == "National":
-    if forecast_type == "Enrolments":
-        time_series = df.groupby('month')['total_enrolments'].sum().sort_index()
-    elif forecast_type == "Demographic Updates":
-        time_series = df_demo.groupby('month')['total_updates'].sum().sort_index()
-    else:
-        time_series = df_bio.groupby('month')['total_updates'].sum().sort_index()
+    region_key = "India"
     location_name = "India"
 elif forecast_level == "State":
     state = st.sidebar.selectbox("Select State", sorted(df['state'].unique()))
-    if forecast_type == "Enrolments":
-        time_series = df[df['state'] == state].groupby('month')['total_enrolments'].sum().sort_index()
-    elif forecast_type == "Demographic Updates":
-        time_series = df_demo[df_demo['state'] == state].groupby('month')['total_updates'].sum().sort_index()
-    else:
-        time_series = df_bio[df_bio['state'] == state].groupby('month')[['bio_age_5_17', 'bio_age_17_']].sum().sum(axis=1).sort_index()
+    region_key = state
     location_name = state
-else:  # District
+elif forecast_level == "District":
     state = st.sidebar.selectbox("Select State", sorted(df['state'].unique()))
     district = st.sidebar.selectbox(
         "Select District",
         sorted(df[df['state'] == state]['district'].unique())
     )
-    if forecast_type == "Enrolments":
-        time_series = df[(df['state'] == state) & (df['district'] == district)].groupby('month')['total_enrolments'].sum().sort_index()
-    elif forecast_type == "Demographic Updates":
-        time_series = df_demo[(df_demo['state'] == state) & (df_demo['district'] == district)].groupby('month')['total_updates'].sum().sort_index()
-    else:
-        time_series = df_bio[(df_bio['state'] == state) & (df_bio['district'] == district)].groupby('month')['total_updates'].sum().sort_index()
+    region_key = (state, district)
     location_name = f"{district}, {state}"
+else:  # Pincode
+    state = st.sidebar.selectbox("Select State", sorted(df['state'].unique()))
+    district = st.sidebar.selectbox(
+        "Select District",
+        sorted(df[df['state'] == state]['district'].unique())
+    )
+    level_data, _ = select_dataset(forecast_type, [df, df_demo, df_bio])
+    district_pincodes = sorted(
+        level_data[(level_data['state'] == state) & (level_data['district'] == district)]['pincode'].unique()
+    )
+    pincode = st.sidebar.selectbox("Select Pincode", district_pincodes)
+    region_key = pincode
+    location_name = f"Pincode {pincode}, {district}, {state}"
+freq = 'D' if forecast_granularity == "Daily" else 'M'
+if forecast_level == "Pincode":
+    pincode_bundle, pincode_result = load_pincode_forecasts(forecast_type, freq, forecast_periods, data_version)
+    row = pincode_bundle['regions'].get_indexer([region_key])[0]
+    if row >= 0:
+        time_series = pd.Series(pincode_bundle['matrix'][row].toarray().ravel(), index=pincode_bundle['periods'])
+    else:
+        time_series = pd.Series(dtype=float)
+else:
+    forecast_matrix = load_forecast_matrix(forecast_type, forecast_level, freq, data_version)
+    if region_key in forecast_matrix.index:
+        time_series = forecast_matrix.loc[region_key]
+    else:
+        time_series = pd.Series(dtype=float)
+    if freq == 'M':
+        # Months with no published data are skipped; daily gaps stay NaN for the weekly model
+        time_series = time_series.dropna()
+if forecast_granularity == "Monthly" and forecast_level != "Pincode":
+    st.sidebar.subheader("Ensemble Models")
+    monthly_models = [name for name, entry in FORECAST_MODELS.items() if 'M' in entry['frequencies']]
+    ensemble_models = st.sidebar.multiselect(
+        "Models",
+        monthly_models,
+        default=[name for name in monthly_models if FORECAST_MODELS[name]['enabled']]
+    )
+    weight_by_backtest = st.sidebar.checkbox("Weight by Backtest Error", value=False)
+    max_latency_ms = st.sidebar.number_input("Max Model Latency (ms, 0 = no limit)", 0, 10000, 0)
+st.sidebar.subheader("Prediction Intervals")
+interval_coverage = st.sidebar.slider("Interval Coverage (%)", 50, 99, 95)
+bootstrap_draws = st.sidebar.select_slider("Bootstrap Draws", [200, 500, 1000, 2000], value=1000)
+interval_quantiles = ((100 - interval_coverage) / 200, 1 - (100 - interval_coverage) / 200)
 st.sidebar.subheader("Scenario Forecasting")
 optimistic_adjustment = st.sidebar.slider(
     "Optimistic Scenario Adjustment (%)",
@@ -69,21 +180,55 @@ pessimistic_adjustment = st.sidebar.slider(
     "Pessimistic Scenario Adjustment (%)",
     -30, 0, -10
 )
-time_series.index = time_series.index.to_timestamp()
-if len(time_series) < 3:
-    st.error("Insufficient historical data for forecasting. Need at least 3 data points.")
+min_points = 14 if forecast_granularity == "Daily" and forecast_level != "Pincode" else 3
+if time_series.count() < min_points:
+    st.error(f"Insufficient historical data for forecasting. Need at least {min_points} data points.")
     st.stop()
 st.header(f"Forecast for {location_name}")
 # Display historical summary
 col_sum1, col_sum2, col_sum3 = st.columns(3)
-col_sum1.metric("Historical Data Points", len(time_series))
+col_sum1.metric("Historical Data Points", time_series.count())
 col_sum2.metric("Total Historical Value", f"{time_series.sum():,.0f}")
-col_sum3.metric("Average Monthly Value", f"{time_series.mean():,.0f}")
+col_sum3.metric(f"Average {forecast_granularity} Value", f"{time_series.mean():,.0f}")
 col_met1, col_met2 = st.columns([1,3])
-col_met1.metric("Forecast Period", f"{forecast_periods} months")
-col_met2.metric("Model Type", "Ensemble")
+col_met1.metric("Forecast Period", f"{forecast_periods} {period_unit}")
+if forecast_level == "Pincode":
+    col_met2.metric("Model Type", "Intermittent Demand (SBA)")
+else:
+    col_met2.metric("Model Type", "Weekly Seasonal" if forecast_granularity == "Daily" else "Ensemble")
 # Perform forecasting
-forecast_result = ensemble_forecast(time_series, periods=forecast_periods)
+if forecast_level == "Pincode":
+    # Sparse pincodes: Croston/SBA smooths demand sizes and the gaps between them
+    forecast_result = croston_forecast(
+        time_series, periods=forecast_periods, n_draws=bootstrap_draws, quantiles=interval_quantiles
+    )
+elif forecast_granularity == "Daily":
+    # All regions at this level are fitted together and cached, so switching region is free
+    daily_result = load_daily_forecasts(
+        forecast_type, forecast_level, forecast_periods, bootstrap_draws, interval_quantiles, data_version
+    )
+    if 'error' in daily_result:
+        forecast_result = daily_result
+    else:
+        forecast_result = {
+            'forecast': daily_result['forecast'].loc[region_key].values,
+            'lower_bound': daily_result['lower_bound'].loc[region_key].values,
+            'upper_bound': daily_result['upper_bound'].loc[region_key].values,
+            'model_type': daily_result['model_type']
+        }
+else:
+    # Rolling-origin backtest of each model, used for the report and optional weights
+    backtest_report = load_backtest_report(forecast_type, forecast_level, region_key, tuple(ensemble_models), data_version)
+    ensemble_weights = None
+    if weight_by_backtest:
+        # Falls back to the registered weights when no model could be backtested
+        ensemble_weights = backtest_ensemble_weights(
+            backtest_report, max_latency_ms=max_latency_ms if max_latency_ms > 0 else None
+        ) or None
+    forecast_result = ensemble_forecast(
+        time_series, periods=forecast_periods, n_draws=bootstrap_draws, quantiles=interval_quantiles,
+        models=ensemble_models, weights=ensemble_weights
+    )
 if 'error' in forecast_result:
     st.error(f"Forecasting error: {forecast_result['error']}")
     st.stop()
@@ -92,7 +237,7 @@ optimistic_forecast = baseline_forecast * (1 + optimistic_adjustment / 100)
 pessimistic_forecast = baseline_forecast * (1 + pessimistic_adjustment / 100)
 # Generate forecast dates
 last_date = time_series.index[-1]
-forecast_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=forecast_periods, freq='MS')
+forecast_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=forecast_periods, freq='D' if forecast_granularity == "Daily" else 'MS')
 # Create visualization
 fig = go.Figure()
 # Historical data
@@ -133,7 +278,7 @@ if 'lower_bound' in forecast_result and 'upper_bound' in forecast_result:
         x=forecast_dates,
         y=forecast_result['upper_bound'],
         mode='lines',
-        name='Upper Bound (95% CI)',
+        name=f'Upper Bound ({interval_coverage}% PI)',
         line=dict(width=0),
         showlegend=False
     ))
@@ -141,7 +286,7 @@ if 'lower_bound' in forecast_result and 'upper_bound' in forecast_result:
         x=forecast_dates,
         y=forecast_result['lower_bound'],
         mode='lines',
-        name='Lower Bound (95% CI)',
+        name=f'Prediction Interval ({interval_coverage}%)',
         line=dict(width=0),
         fill='tonexty',
         fillcolor='rgba(31, 78, 216, 0.1)',
@@ -155,6 +300,28 @@ fig.update_layout(
     height=500
 )
 st.plotly_chart(fig, use_container_width=True)
+if forecast_level == "Pincode":
+    # Every pincode was forecast in one pass; rank the district's pincodes for mobile-unit planning
+    st.subheader(f"Pincode Demand Outlook in {district}")
+    rows = pincode_bundle['regions'].get_indexer(district_pincodes)
+    rows = rows[rows >= 0]
+    pincode_outlook = pd.DataFrame({
+        'Pincode': pincode_bundle['regions'][rows].astype(str),
+        'Periods with Demand': pincode_result['demand_periods'][rows],
+        'Avg Demand Size': pincode_result['demand_size'][rows],
+        'Avg Periods Between Demand': pincode_result['demand_interval'][rows],
+        'Forecast per Period': pincode_result['rate'][rows],
+        'Forecast over Horizon': pincode_result['rate'][rows] * forecast_periods
+    }).sort_values('Forecast over Horizon', ascending=False)
+    st.dataframe(pincode_outlook, use_container_width=True)
+if forecast_level in ("State", "District"):
+    with st.expander(f"Next-month outlook for every {forecast_level.lower()}"):
+        state_forecasts = forecast_from_state(load_forecast_state(forecast_type, forecast_level, data_version), periods=1)
+        outlook = pd.DataFrame({
+            'Linear Trend': state_forecasts['linear'][1],
+            "Holt's Smoothing": state_forecasts['holt'][1]
+        }).sort_values('Linear Trend', ascending=False)
+        st.dataframe(outlook, use_container_width=True)
 col1, col2, col3 = st.columns(3)
 col1.metric("Ave Baseline Forecast", f"{forecast_result['forecast'].mean():,.0f}")
 if optimistic_adjustment != 0:
@@ -180,14 +347,21 @@ if optimistic_adjustment == 0 and pessimistic_adjustment == 0:
         forecast_df['Lower Bound'] = forecast_result['lower_bound']
         forecast_df['Upper Bound'] = forecast_result['upper_bound']
     st.dataframe(forecast_df, use_container_width=True)
-if len(time_series) >= 6:
+if time_series.count() >= (28 if forecast_granularity == "Daily" else 6):
     st.subheader("Model Evaluation")
     # Split data for evaluation
     train_size = int(len(time_series) * 0.8)
     train_data = time_series.iloc[:train_size]
     test_data = time_series.iloc[train_size:]
     # Forecast on test period
-    eval_forecast = ensemble_forecast(train_data, periods=len(test_data))
+    if forecast_level == "Pincode":
+        eval_forecast = croston_forecast(train_data, periods=len(test_data))
+    elif forecast_granularity == "Daily":
+        eval_forecast = seasonal_daily_forecast(train_data, periods=len(test_data))
+    else:
+        eval_forecast = ensemble_forecast(
+            train_data, periods=len(test_data), models=ensemble_models, weights=ensemble_weights
+        )
     if 'forecast' in eval_forecast:
         accuracy = evaluate_forecast_accuracy(test_data.values, eval_forecast['forecast'])
         col_acc1, col_acc2, col_acc3, col_acc4 = st.columns(4)
@@ -196,6 +370,13 @@ if len(time_series) >= 6:
         if not np.isnan(accuracy['MAPE']):
             col_acc3.metric("MAPE", f"{accuracy['MAPE']:.2f}%")
         st.info("**Note:** Lower values indicate better forecast accuracy.")
+    if forecast_granularity == "Monthly" and forecast_level != "Pincode":
+        st.subheader("Per-Model Backtest and Latency")
+        model_report = backtest_report.copy()
+        model_report['weight'] = model_report['model'].map(forecast_result.get('weights', {})).fillna(0)
+        st.dataframe(model_report, use_container_width=True)
+        with st.expander("Recorded model latencies"):
+            st.dataframe(get_model_timings(), use_container_width=True)
 st.subheader("Forecast Insights")
 st.markdown(f"""
 - **Forecast Method:** {forecast_result.get('model_type', 'N/A')}
@@ -219,5 +400,43 @@ elif change_pct < -10:
     st.warning("Demand decline expected. Resources may be reallocated.")
 else:
     st.info("Stable demand expected. Maintain current capacity.")
-
-
+st.divider()
+st.subheader("Biometric Update Demand (Cohort Model)")
+cohort_periods = forecast_periods if forecast_granularity == "Monthly" else DEFAULT_COHORT_PERIODS
+cohort = load_cohort_demand(cohort_periods, data_version)
+st.caption(
+    f"Children enrolled at 5-17, and those enrolled at 0-5 as they turn 5, fall due for a mandatory biometric update. "
+    f"Expected updates apply the national rate of {cohort['benchmark']:.2f} updates per due child; "
+    f"backlogs are projected {cohort_periods} months ahead."
+)
+cohort_summary = cohort['summary']
+if forecast_level == "National":
+    cohort_table = cohort_summary.groupby(level='state').sum()
+    cohort_table['completion_ratio'] = cohort_table['updates'] / cohort_table['expected']
+    scope_label = "State"
+else:
+    cohort_table = cohort_summary.loc[state]
+    scope_label = "District"
+if forecast_level in ("District", "Pincode") and (state, district) in cohort_summary.index:
+    district_cohort = cohort_summary.loc[(state, district)]
+    col_c1, col_c2, col_c3, col_c4 = st.columns(4)
+    col_c1.metric("Expected Updates to Date", f"{district_cohort['expected']:,.0f}")
+    col_c2.metric("Completion Ratio", f"{district_cohort['completion_ratio']:.2f}")
+    col_c3.metric("Current Backlog", f"{district_cohort['backlog']:,.0f}")
+    col_c4.metric(f"Backlog in {cohort_periods} Months", f"{district_cohort['projected_backlog']:,.0f}")
+    fig_cohort = go.Figure()
+    fig_cohort.add_trace(go.Scatter(
+        x=cohort['expected'].columns, y=cohort['expected'].loc[(state, district)],
+        name="Expected Updates (cumulative)", mode="lines+markers", line=dict(dash="dash")
+    ))
+    fig_cohort.add_trace(go.Scatter(
+        x=cohort['updates'].columns, y=cohort['updates'].loc[(state, district)],
+        name="Actual Updates (cumulative)", mode="lines+markers"
+    ))
+    fig_cohort.update_layout(
+        title=f"Age 5-17 Biometric Updates vs Cohort Demand in {district}",
+        xaxis_title="Month", yaxis_title="Updates", hovermode='x unified', height=400
+    )
+    st.plotly_chart(fig_cohort, use_container_width=True)
+with st.expander(f"{scope_label}s ranked by projected backlog"):
+    st.dataframe(cohort_table.sort_values('projected_backlog', ascending=False), use_container_width=True)
@@ -4,10 +4,12 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 import matplotlib.pyplot as plt
-from scipy import stats as scipy_stats
-from utils.data_loader import load_aadhaar_data
+from utils.data_loader import load_aadhaar_data, load_record_summaries, get_data_version
 from utils.analytics import (
-    univariate_analysis, bivariate_correlation,
+    univariate_analysis, cached_correlation_matrices, matrix_correlation, correlation_pair_table,
+    summary_statistics, sketch_quantiles,
+    histogram_summary, box_summary, qq_quantile_grid,
+    cached_seasonal_profiles, MONTH_NAMES, WEEKDAY_NAMES,
 )
 
 # Page Config
@@ -138,23 +140,50 @@ def create_trend_analysis(data, data_type_name, value_col, state_col, district_c
         st.plotly_chart(fig_district, use_container_width=True)
     
     return monthly, mom_growth
-def create_univariate_analysis(data, col_name, var_name):
+# Record-level column of each tab, summarised shard by shard by the loader: key -> (frame index, column)
+RECORD_COLUMNS = {
+    'enrol': (0, 'total_enrolments'),
+    'demo': (1, 'total_updates'),
+    'bio': (2, 'total_updates')
+}
+SKETCH_PERCENTILES = [1, 5, 10, 25, 50, 75, 90, 95, 99, 99.9]
+
+@st.cache_data(show_spinner="Summarising distribution...")
+def load_distribution_summary(key, granularity, data_version, _values):
+    return {
+        'histogram': histogram_summary(_values, bins=50),
+        'box': box_summary(_values),
+        'qq': qq_quantile_grid(_values)
+    }
+
+def create_univariate_analysis(data, col_name, var_name, key=None):
     """Create univariate analysis section"""
     st.subheader("Statistical Univariate Analysis")   
-    # Prepare data
-    data_values = data[col_name].dropna()
-    data_df = pd.DataFrame({col_name: data_values.values})
+    granularity = "Daily Totals"
+    if key is not None:
+        granularity = st.radio(
+            "Granularity", ["Daily Totals", "All Records"], horizontal=True, key=f"{key}_granularity",
+            help="All Records reads every row from streaming moments and a quantile sketch merged across the CSV shards"
+        )
     # Perform analysis
-    stats_result = univariate_analysis(data_df, col_name)
+    if granularity == "All Records":
+        record_summary = load_record_summaries()[RECORD_COLUMNS[key][0]]
+        stats_result = summary_statistics(record_summary)
+        value_format = ",.2f"
+    else:
+        data_values = data[col_name].dropna()
+        data_df = pd.DataFrame({col_name: data_values.values})
+        stats_result = univariate_analysis(data_df, col_name)
+        value_format = ",.0f"
     # Metrics
     col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Mean", f"{stats_result['mean']:,.0f}")
-    col2.metric("Median", f"{stats_result['median']:,.0f}")
-    col3.metric("Std Dev", f"{stats_result['std']:,.0f}")
+    col1.metric("Mean", f"{stats_result['mean']:{value_format}}")
+    col2.metric("Median", f"{stats_result['median']:{value_format}}")
+    col3.metric("Std Dev", f"{stats_result['std']:{value_format}}")
     col4.metric("CV", f"{stats_result['coefficient_of_variation']:.2f}%")
     col5, col6, col7, col8 = st.columns(4)
-    col5.metric("Min", f"{stats_result['min']:,.0f}")
-    col6.metric("Max", f"{stats_result['max']:,.0f}")
+    col5.metric("Min", f"{stats_result['min']:{value_format}}")
+    col6.metric("Max", f"{stats_result['max']:{value_format}}")
     col7.metric("Skewness", f"{stats_result['skewness']:.3f}")
     col8.metric("Kurtosis", f"{stats_result['kurtosis']:.3f}")
     
@@ -165,38 +194,59 @@ def create_univariate_analysis(data, col_name, var_name):
     
     st.info(f"**Distribution:** {skew_text}, {kurt_text}")
     
+    # Charts are drawn from fixed-size summaries computed here, not from the raw values
+    if granularity == "All Records":
+        frame_index, column = RECORD_COLUMNS[key]
+        chart_values = [df, df_demo, df_bio][frame_index][column]
+        value_label = f"{var_name.replace('Daily ', '')} per Record"
+    else:
+        chart_values = data_values
+        value_label = var_name
+    distribution = load_distribution_summary(key or col_name, granularity, get_data_version(), chart_values)
+    histogram, box = distribution['histogram'], distribution['box']
+    
     # Visualizations
     col_v1, col_v2 = st.columns(2)
     
     with col_v1:
-        fig_hist = px.histogram(
-            data_df, x=col_name, nbins=50,
-            title=f"Distribution of {var_name}",
-            labels={col_name: var_name}
+        edges = histogram['edges']
+        fig_hist = go.Figure(go.Bar(
+            x=(edges[:-1] + edges[1:]) / 2, y=histogram['counts'], width=np.diff(edges),
+            marker_line_width=0
+        ))
+        fig_hist.update_layout(
+            title=f"Distribution of {value_label}",
+            xaxis_title=value_label, yaxis_title="count",
+            bargap=0, showlegend=False
         )
-        fig_hist.update_layout(showlegend=False)
         st.plotly_chart(fig_hist, use_container_width=True)
     
     with col_v2:
-        fig_box = px.box(
-            data_df, y=col_name,
-            title=f"Box Plot: {var_name}",
-            labels={col_name: var_name}
-        )
+        fig_box = go.Figure(go.Box(
+            q1=[box['q1']], median=[box['median']], q3=[box['q3']], mean=[box['mean']],
+            lowerfence=[box['lower_fence']], upperfence=[box['upper_fence']],
+            x=[value_label], name=value_label, boxpoints=False
+        ))
+        if len(box['outliers']) > 0:
+            fig_box.add_trace(go.Scatter(
+                x=[value_label] * len(box['outliers']), y=box['outliers'],
+                mode='markers', name='Outliers', marker=dict(size=4)
+            ))
+        fig_box.update_layout(title=f"Box Plot: {value_label}", yaxis_title=value_label, showlegend=False)
         st.plotly_chart(fig_box, use_container_width=True)
+        if box['n_outliers'] > len(box['outliers']):
+            st.caption(f"Showing the {len(box['outliers']):,} most extreme of {box['n_outliers']:,} outliers")
     
     # Q-Q Plot
-    sample_data = data_values.sample(min(1000, len(data_values)))
-    qq_data = scipy_stats.probplot(sample_data, dist="norm")
-    
+    qq = distribution['qq']
     fig_qq = go.Figure()
     fig_qq.add_trace(go.Scatter(
-        x=qq_data[0][0], y=qq_data[0][1],
+        x=qq['theoretical'], y=qq['sample'],
         mode='markers', name='Sample Quantiles'
     ))
     fig_qq.add_trace(go.Scatter(
-        x=qq_data[0][0],
-        y=qq_data[1][1] + qq_data[1][0] * qq_data[0][0],
+        x=qq['theoretical'],
+        y=qq['intercept'] + qq['slope'] * qq['theoretical'],
         mode='lines', name='Theoretical'
     ))
     fig_qq.update_layout(
@@ -206,6 +256,122 @@ def create_univariate_analysis(data, col_name, var_name):
         height=400
     )
     st.plotly_chart(fig_qq, use_container_width=True)
+    
+    if granularity == "All Records":
+        # Percentile profile from the all-records quantile sketch
+        percentiles = pd.DataFrame({
+            'percentile': SKETCH_PERCENTILES,
+            'value': sketch_quantiles(record_summary, np.array(SKETCH_PERCENTILES) / 100)
+        })
+        st.caption(f"{stats_result['count']:,} records; percentiles estimated from a quantile sketch")
+        fig_pct = px.line(
+            percentiles, x='percentile', y='value', markers=True,
+            title="Percentile Profile (All Records)",
+            labels={'percentile': 'Percentile', 'value': 'Value per Record'}
+        )
+        st.plotly_chart(fig_pct, use_container_width=True)
+
+# Variables of every dataset offered for cross-dataset correlation
+ALL_CORRELATION_VARIABLES = {
+    "Enrolments: Total": "total_enrolments",
+    "Enrolments: Age 0-5": "age_0_5",
+    "Enrolments: Age 5-17": "age_5_17",
+    "Enrolments: Age 18+": "age_18_greater",
+    "Demographic: Total": "demo_total_updates",
+    "Demographic: Age 5-17": "demo_age_5_17",
+    "Demographic: Age 17+": "demo_age_17_",
+    "Biometric: Total": "bio_total_updates",
+    "Biometric: Age 5-17": "bio_age_5_17",
+    "Biometric: Age 17+": "bio_age_17_"
+}
+CORRELATION_LEVELS = {"Daily": 'daily', "State": 'state', "District": 'district'}
+
+def create_bivariate_analysis(var_map, key):
+    """Create bivariate correlation section from the cached all-pairs matrices"""
+    col_g1, col_g2, col_g3 = st.columns(3)
+    with col_g1:
+        level = st.selectbox("Granularity", list(CORRELATION_LEVELS), key=f"{key}_corr_level")
+    with col_g2:
+        method = st.radio("Method", ["Pearson", "Spearman"], horizontal=True, key=f"{key}_corr_method")
+    with col_g3:
+        cross_dataset = st.checkbox("Include other datasets", key=f"{key}_corr_cross")
+    if cross_dataset:
+        var_map = ALL_CORRELATION_VARIABLES
+
+    st.subheader(f"Correlation Analysis ({method})")
+    correlations = cached_correlation_matrices(CORRELATION_LEVELS[level], get_data_version(), [df, df_demo, df_bio])
+    matrices = correlations[method.lower()]
+
+    labels = list(var_map)
+    col1, col2 = st.columns(2)
+    with col1:
+        var1 = st.selectbox("Variable 1", labels, key=f"{key}_var1")
+    with col2:
+        var2 = st.selectbox("Variable 2", labels[1:] + labels[:1], key=f"{key}_var2")
+
+    corr_result = matrix_correlation(matrices, var_map[var1], var_map[var2])
+    col_m1, col_m2, col_m3 = st.columns(3)
+    col_m1.metric("Correlation", f"{corr_result['correlation']:.4f}")
+    col_m2.metric("P-value", f"{corr_result['p_value']:.4f}")
+    col_m3.metric("Significance", corr_result.get('significance', 'N/A'))
+
+    st.info(f"**Interpretation:** {corr_result['interpretation']}")
+
+    corr_data = correlation_pair_table(correlations['table'], var_map[var1], var_map[var2])
+    fig_scatter = px.scatter(
+        corr_data, x=var_map[var1], y=var_map[var2],
+        title=f"{var1} vs {var2} ({level})", trendline="ols"
+    )
+    st.plotly_chart(fig_scatter, use_container_width=True)
+
+    columns = [var_map[label] for label in labels]
+    fig_heatmap = px.imshow(
+        matrices['correlation'].loc[columns, columns].rename(index=dict(zip(columns, labels)), columns=dict(zip(columns, labels))),
+        text_auto='.2f', zmin=-1, zmax=1, color_continuous_scale='RdBu_r',
+        title=f"{method} Correlation Matrix ({level}, n = {matrices['n']:,})"
+    )
+    st.plotly_chart(fig_heatmap, use_container_width=True)
+
+SEASONALITY_LEVELS = {"State": 'state', "District": 'district'}
+SEASONALITY_BUCKETS = {"Month of Year": 'month', "Day of Week": 'weekday'}
+
+def create_seasonality_ranking(dataset, key):
+    """Create regional seasonality ranking from the cached profiles of every region"""
+    col_s1, col_s2, col_s3 = st.columns(3)
+    with col_s1:
+        level = st.selectbox("Region Level", list(SEASONALITY_LEVELS), key=f"{key}_season_level")
+    with col_s2:
+        bucket_label = st.radio("Seasonality", list(SEASONALITY_BUCKETS), horizontal=True, key=f"{key}_season_bucket")
+    with col_s3:
+        top_n = st.slider("Regions Shown", 5, 50, 15, key=f"{key}_season_top")
+    bucket = SEASONALITY_BUCKETS[bucket_label]
+    region_cols = ['state'] if level == "State" else ['state', 'district']
+
+    st.subheader(f"Regions Ranked by {bucket_label} Seasonality")
+    profiles = cached_seasonal_profiles(SEASONALITY_LEVELS[level], get_data_version(), [df, df_demo, df_bio])[dataset]
+    summary = profiles['summary'].dropna(subset=[f'{bucket}_strength'])
+    ranked = summary.sort_values(f'{bucket}_strength', ascending=False).head(top_n)
+    st.caption(
+        "Seasonal index = a bucket's average day relative to the region's average day; "
+        "strength = standard deviation of the indices across buckets."
+    )
+    st.dataframe(
+        ranked[region_cols + ['total', f'{bucket}_strength', f'peak_{bucket}', f'trough_{bucket}']],
+        use_container_width=True, hide_index=True
+    )
+
+    index = profiles[f'{bucket}_index'].loc[ranked.set_index(region_cols).index]
+    labels = MONTH_NAMES if bucket == 'month' else WEEKDAY_NAMES
+    index = index[[label for label in labels if index[label].notna().any()]]
+    fig_heatmap = px.imshow(
+        index.values, x=index.columns,
+        y=ranked[region_cols].agg(" / ".join, axis=1).tolist(),
+        color_continuous_scale='RdBu_r', color_continuous_midpoint=1.0,
+        title=f"{bucket_label} Seasonal Index", aspect='auto',
+        labels={'color': 'Index'}
+    )
+    fig_heatmap.update_layout(height=max(400, 25 * len(index)))
+    st.plotly_chart(fig_heatmap, use_container_width=True)
 
 with tab1:
     st.header("Enrolment Analysis")
@@ -220,7 +386,7 @@ with tab1:
     # Advanced Analytics
     analysis_option = st.radio(
         "Analysis Type",
-        ["Univariate Analysis", "Bivariate Correlation"],
+        ["Univariate Analysis", "Bivariate Correlation", "Regional Seasonality"],
         horizontal=True, key="enrol_analysis"
     )
     
@@ -232,56 +398,19 @@ with tab1:
                 'age_5_17': 'sum',
                 'age_18_greater': 'sum'
             }).reset_index(),
-            'total_enrolments', 'Daily Enrolments'
+            'total_enrolments', 'Daily Enrolments', key='enrol'
         )
     
     elif analysis_option == "Bivariate Correlation":
-        st.subheader("Correlation Analysis (Pearson)")
-        
-        daily_enrol = df.groupby('date').agg({
-            'total_enrolments': 'sum',
-            'age_0_5': 'sum',
-            'age_5_17': 'sum',
-            'age_18_greater': 'sum'
-        })
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            var1 = st.selectbox("Variable 1", 
-                              ["Total Enrolments", "Age 0-5", "Age 5-17", "Age 18+"],
-                              key="enrol_var1")
-        with col2:
-            var2 = st.selectbox("Variable 2",
-                              ["Age 0-5", "Age 5-17", "Age 18+", "Total Enrolments"],
-                              key="enrol_var2")
-        
-        var_map = {
+        create_bivariate_analysis({
             "Total Enrolments": "total_enrolments",
             "Age 0-5": "age_0_5",
             "Age 5-17": "age_5_17",
             "Age 18+": "age_18_greater"
-        }
-        
-        corr_data = daily_enrol[[var_map[var1], var_map[var2]]].dropna()
-        
-        if len(corr_data) >= 3:
-            corr_result = bivariate_correlation(
-                corr_data, var_map[var1], var_map[var2],
-                method="pearson"
-            )
-            
-            col_m1, col_m2, col_m3 = st.columns(3)
-            col_m1.metric("Correlation", f"{corr_result['correlation']:.4f}")
-            col_m2.metric("P-value", f"{corr_result['p_value']:.4f}")
-            col_m3.metric("Significance", corr_result['significance'])
-            
-            st.info(f"**Interpretation:** {corr_result['interpretation']}")
-            
-            fig_scatter = px.scatter(
-                corr_data, x=var_map[var1], y=var_map[var2],
-                title=f"{var1} vs {var2}", trendline="ols"
-            )
-            st.plotly_chart(fig_scatter, use_container_width=True)
+        }, key="enrol")
+    
+    elif analysis_option == "Regional Seasonality":
+        create_seasonality_ranking('enrolment', key="enrol")
 
 with tab2:
     st.header("Demographic Updates Analysis")
@@ -295,7 +424,7 @@ with tab2:
     
     analysis_option = st.radio(
         "Analysis Type",
-        ["Univariate Analysis", "Bivariate Correlation"],
+        ["Univariate Analysis", "Bivariate Correlation", "Regional Seasonality"],
         horizontal=True, key="demo_analysis"
     )
     
@@ -304,54 +433,18 @@ with tab2:
             df_demo.groupby('date').agg({
                 'total_updates': 'sum'
             }).reset_index(),
-            'total_updates', 'Daily Updates'
+            'total_updates', 'Daily Updates', key='demo'
         )
     
     elif analysis_option == "Bivariate Correlation":
-        st.subheader("Correlation Analysis (Pearson)")
-        
-        daily_demo = df_demo.groupby('date').agg({
-            'total_updates': 'sum',
-            'demo_age_5_17': 'sum',
-            'demo_age_17_': 'sum'
-        })
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            var1 = st.selectbox("Variable 1",
-                              ["Total Updates", "Age 5-17 Updates", "Age 17+ Updates"],
-                              key="demo_var1")
-        with col2:
-            var2 = st.selectbox("Variable 2",
-                              ["Age 5-17 Updates", "Age 17+ Updates", "Total Updates"],
-                              key="demo_var2")
-        
-        var_map = {
-            "Total Updates": "total_updates",
+        create_bivariate_analysis({
+            "Total Updates": "demo_total_updates",
             "Age 5-17 Updates": "demo_age_5_17",
             "Age 17+ Updates": "demo_age_17_"
-        }
-        
-        corr_data = daily_demo[[var_map[var1], var_map[var2]]].dropna()
-        
-        if len(corr_data) >= 3:
-            corr_result = bivariate_correlation(
-                corr_data, var_map[var1], var_map[var2],
-                method="pearson"
-            )
-            
-            col_m1, col_m2, col_m3 = st.columns(3)
-            col_m1.metric("Correlation", f"{corr_result['correlation']:.4f}")
-            col_m2.metric("P-value", f"{corr_result['p_value']:.4f}")
-            col_m3.metric("Significance", corr_result['significance'])
-            
-            st.info(f"**Interpretation:** {corr_result['interpretation']}")
-            
-            fig_scatter = px.scatter(
-                corr_data, x=var_map[var1], y=var_map[var2],
-                title=f"{var1} vs {var2}", trendline="ols"
-            )
-            st.plotly_chart(fig_scatter, use_container_width=True)
+        }, key="demo")
+    
+    elif analysis_option == "Regional Seasonality":
+        create_seasonality_ranking('demographic', key="demo")
 
 with tab3:
     st.header("Biometric Updates Analysis")
@@ -365,7 +458,7 @@ with tab3:
     
     analysis_option = st.radio(
         "Analysis Type",
-        ["Univariate Analysis", "Bivariate Correlation"],
+        ["Univariate Analysis", "Bivariate Correlation", "Regional Seasonality"],
         horizontal=True, key="bio_analysis"
     )
     
@@ -374,52 +467,16 @@ with tab3:
             df_bio.groupby('date').agg({
                 'total_updates': 'sum'
             }).reset_index(),
-            'total_updates', 'Daily Updates'
+            'total_updates', 'Daily Updates', key='bio'
         )
     
     elif analysis_option == "Bivariate Correlation":
-        st.subheader("Correlation Analysis (Pearson)")
-        
-        daily_bio = df_bio.groupby('date').agg({
-            'total_updates': 'sum',
-            'bio_age_5_17': 'sum',
-            'bio_age_17_': 'sum'
-        })
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            var1 = st.selectbox("Variable 1",
-                              ["Total Updates", "Age 5-17 Updates", "Age 17+ Updates"],
-                              key="bio_var1")
-        with col2:
-            var2 = st.selectbox("Variable 2",
-                              ["Age 5-17 Updates", "Age 17+ Updates", "Total Updates"],
-                              key="bio_var2")
-        
-        var_map = {
-            "Total Updates": "total_updates",
+        create_bivariate_analysis({
+            "Total Updates": "bio_total_updates",
             "Age 5-17 Updates": "bio_age_5_17",
             "Age 17+ Updates": "bio_age_17_"
-        }
-        
-        corr_data = daily_bio[[var_map[var1], var_map[var2]]].dropna()
-        
-        if len(corr_data) >= 3:
-            corr_result = bivariate_correlation(
-                corr_data, var_map[var1], var_map[var2],
-                method="pearson"
-            )
-            
-            col_m1, col_m2, col_m3 = st.columns(3)
-            col_m1.metric("Correlation", f"{corr_result['correlation']:.4f}")
-            col_m2.metric("P-value", f"{corr_result['p_value']:.4f}")
-            col_m3.metric("Significance", corr_result['significance'])
-            
-            st.info(f"**Interpretation:** {corr_result['interpretation']}")
-            
-            fig_scatter = px.scatter(
-                corr_data, x=var_map[var1], y=var_map[var2],
-                title=f"{var1} vs {var2}", trendline="ols"
-            )
-            st.plotly_chart(fig_scatter, use_container_width=True)
+        }, key="bio")
+    
+    elif analysis_option == "Regional Seasonality":
+        create_seasonality_ranking('biometric', key="bio")
 
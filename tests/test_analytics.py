@@ -0,0 +1,28 @@
+import pandas as pd
+from utils.analytics import build_anomaly_feature_matrix
+
+
+def region_rows(rows, value_cols):
+    frame = pd.DataFrame(rows, columns=['pincode', 'state', 'district', 'date'])
+    frame['date'] = pd.to_datetime(frame['date'])
+    for column in value_cols:
+        frame[column] = 1
+    return frame
+
+
+def test_pincode_features_take_majority_region():
+    # The pincode's first row carries a stray district; most rows agree on the other one
+    df = region_rows([
+        (110001, 'Delhi', 'Stray', '2025-01-01'),
+        (110001, 'Delhi', 'New Delhi', '2025-01-02'),
+        (110002, 'Delhi', 'Central Delhi', '2025-01-02')
+    ], ['age_0_5', 'age_5_17', 'age_18_greater'])
+    df['total_enrolments'] = 3
+    df_demo = region_rows([(110001, 'Delhi', 'New Delhi', '2025-02-01')], ['demo_age_5_17', 'total_updates'])
+    df_bio = region_rows([(110002, 'Delhi', 'Central Delhi', '2025-02-01')], ['bio_age_5_17', 'total_updates'])
+
+    features = build_anomaly_feature_matrix(df, df_demo, df_bio, level='pincode').set_index('pincode')
+
+    assert features.index.is_unique
+    assert features.loc[110001, 'district'] == 'New Delhi'
+    assert features.loc[110002, 'district'] == 'Central Delhi'
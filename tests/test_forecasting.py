@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from utils import forecasting
+from utils.forecasting import init_forecast_state, refresh_forecast_state
+
+STATE_ARRAYS = ['sum_y', 'sum_xy', 'level', 'trend']
+STATE_SCALARS = ['periods', 'n', 'sum_x', 'sum_xx']
+
+
+def monthly_matrix(n_regions=4, n_months=18, gap_months=(7,), seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.poisson(200, size=(n_regions, n_months)).astype(float) + np.arange(n_months) * 5
+    values[:, list(gap_months)] = np.nan
+    return pd.DataFrame(
+        values,
+        index=pd.Index([f"Region {i}" for i in range(n_regions)], name='state'),
+        columns=pd.date_range('2024-01-01', periods=n_months, freq='MS')
+    )
+
+
+def assert_same_state(actual, expected):
+    for key in STATE_SCALARS:
+        assert actual[key] == pytest.approx(expected[key])
+    for key in STATE_ARRAYS:
+        np.testing.assert_allclose(actual[key], expected[key])
+
+
+@pytest.mark.parametrize('stored_months', [3, 6, 8, 15])
+def test_refresh_folds_closed_months_into_stored_entry(monkeypatch, stored_months):
+    matrix = monthly_matrix()
+    _, entry = refresh_forecast_state(None, matrix.iloc[:, :stored_months])
+
+    rebuilds = []
+    monkeypatch.setattr(forecasting, 'init_forecast_state', lambda *args: rebuilds.append(args) or init_forecast_state(*args))
+    state, entry = refresh_forecast_state(entry, matrix)
+
+    assert rebuilds == []
+    assert entry['closed_through'] == matrix.columns[-2]
+    assert_same_state(entry['state'], init_forecast_state(matrix.iloc[:, :-1]))
+    assert_same_state(state, init_forecast_state(matrix))
+
+
+def test_refresh_rebuilds_single_observed_month():
+    # Holt's initial trend comes from the first two observed months, so a one-month entry cannot be extended
+    matrix = monthly_matrix()
+    _, entry = refresh_forecast_state(None, matrix.iloc[:, :2])
+    state, entry = refresh_forecast_state(entry, matrix)
+    assert_same_state(entry['state'], init_forecast_state(matrix.iloc[:, :-1]))
+    assert_same_state(state, init_forecast_state(matrix))
+
+
+def test_refresh_rebuilds_when_regions_change():
+    matrix = monthly_matrix()
+    _, entry = refresh_forecast_state(None, matrix.iloc[:3, :10])
+    state, _ = refresh_forecast_state(entry, matrix)
+    assert_same_state(state, init_forecast_state(matrix))
@@ -1,14 +1,178 @@
 import pandas as pd
 import numpy as np
+import streamlit as st
 from scipy import stats
 from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import IsolationForest
+from sklearn.neighbors import NearestNeighbors
 import warnings
 warnings.filterwarnings('ignore')
 
+# Scale parameter of the quantile sketch; it keeps about half this many centroids
+DEFAULT_SKETCH_COMPRESSION = 500
+
+"""
+    Merge a sketch's centroids into at most ~compression / 2 clusters
+    
+    Centroids are grouped by the arcsine scale function of a t-digest, so that
+    clusters are small in the tails and larger around the median. Sketches at or
+    below the compression size are kept exact.
+"""
+def _compress_sketch(means, weights, compression):
+    order = np.argsort(means, kind='mergesort')
+    means, weights = means[order], weights[order]
+    if len(means) <= compression:
+        return means, weights
+    quantile = (np.cumsum(weights) - weights / 2) / weights.sum()
+    scale = compression / (2 * np.pi) * np.arcsin(2 * quantile - 1)
+    clusters = np.floor(scale - scale.min()).astype(int)
+    cluster_weights = np.bincount(clusters, weights=weights)
+    cluster_sums = np.bincount(clusters, weights=weights * means)
+    keep = cluster_weights > 0
+    return cluster_sums[keep] / cluster_weights[keep], cluster_weights[keep]
+"""
+    Summarise one chunk of values into mergeable moments and a quantile sketch
+    
+    Args:
+        values: Array-like of numbers (NaN values are ignored)
+        compression: Sketch compression parameter
+    
+    Returns:
+        dict: count, mean, m2/m3/m4 (sums of centred powers), min, max and the
+        sketch centroid 'means' and 'weights'
+"""
+def summarize_values(values, compression=DEFAULT_SKETCH_COMPRESSION):
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return {
+            'count': 0, 'mean': 0.0, 'm2': 0.0, 'm3': 0.0, 'm4': 0.0,
+            'min': np.inf, 'max': -np.inf, 'means': np.empty(0), 'weights': np.empty(0)
+        }
+    mean = values.mean()
+    deviations = values - mean
+    squared = deviations ** 2
+    means, weights = np.unique(values, return_counts=True)
+    means, weights = _compress_sketch(means, weights.astype(float), compression)
+    return {
+        'count': len(values),
+        'mean': mean,
+        'm2': squared.sum(),
+        'm3': (squared * deviations).sum(),
+        'm4': (squared ** 2).sum(),
+        'min': values.min(),
+        'max': values.max(),
+        'means': means,
+        'weights': weights
+    }
+"""
+    Merge two summaries from summarize_values
+    
+    Moments are combined with the pairwise update formulas of Chan et al. and
+    Pébay, so merging chunk summaries gives the same moments as one pass over
+    all values; sketches are concatenated and recompressed.
+    
+    Args:
+        a, b: Summaries to merge
+        compression: Sketch compression parameter
+    
+    Returns:
+        dict: Summary of the union of both inputs
+"""
+def merge_summaries(a, b, compression=DEFAULT_SKETCH_COMPRESSION):
+    if a['count'] == 0:
+        return b
+    if b['count'] == 0:
+        return a
+    n_a, n_b = a['count'], b['count']
+    n = n_a + n_b
+    delta = b['mean'] - a['mean']
+    m2 = a['m2'] + b['m2'] + delta ** 2 * n_a * n_b / n
+    m3 = (
+        a['m3'] + b['m3']
+        + delta ** 3 * n_a * n_b * (n_a - n_b) / n ** 2
+        + 3 * delta * (n_a * b['m2'] - n_b * a['m2']) / n
+    )
+    m4 = (
+        a['m4'] + b['m4']
+        + delta ** 4 * n_a * n_b * (n_a ** 2 - n_a * n_b + n_b ** 2) / n ** 3
+        + 6 * delta ** 2 * (n_a ** 2 * b['m2'] + n_b ** 2 * a['m2']) / n ** 2
+        + 4 * delta * (n_a * b['m3'] - n_b * a['m3']) / n
+    )
+    means, weights = _compress_sketch(
+        np.concatenate([a['means'], b['means']]),
+        np.concatenate([a['weights'], b['weights']]),
+        compression
+    )
+    return {
+        'count': n,
+        'mean': a['mean'] + delta * n_b / n,
+        'm2': m2,
+        'm3': m3,
+        'm4': m4,
+        'min': min(a['min'], b['min']),
+        'max': max(a['max'], b['max']),
+        'means': means,
+        'weights': weights
+    }
+"""
+    Quantiles estimated from a summary's sketch
+    
+    Interpolates between centroid midpoints; exact (matching pandas' linear
+    interpolation) while the sketch holds every distinct value.
+    
+    Args:
+        summary: Summary from summarize_values or merge_summaries
+        quantiles: Array-like of probabilities in [0, 1]
+    
+    Returns:
+        ndarray of quantile estimates
+"""
+def sketch_quantiles(summary, quantiles):
+    quantiles = np.asarray(quantiles, dtype=float)
+    if summary['count'] == 0:
+        return np.full(quantiles.shape, np.nan)
+    weights = summary['weights']
+    # Centroid i covers ranks [cum_i - w_i, cum_i); its mean sits at the centre of its first and last rank
+    ends = np.cumsum(weights)
+    starts = ends - weights
+    ranks = quantiles * (summary['count'] - 1)
+    positions = np.concatenate([starts, ends - 1])
+    values = np.concatenate([summary['means'], summary['means']])
+    order = np.argsort(positions, kind='mergesort')
+    estimates = np.interp(ranks, positions[order], values[order])
+    return np.clip(estimates, summary['min'], summary['max'])
+"""
+    Descriptive statistics of a summary, in the layout of univariate_analysis
+    
+    Returns:
+        dict: count, mean, median, std, min, max, q25, q75, iqr, skewness,
+        kurtosis (excess, biased as in scipy.stats) and coefficient_of_variation
+"""
+def summary_statistics(summary):
+    n = summary['count']
+    std = np.sqrt(summary['m2'] / (n - 1)) if n > 1 else np.nan
+    q25, median, q75 = sketch_quantiles(summary, [0.25, 0.5, 0.75])
+    return {
+        'count': n,
+        'mean': summary['mean'],
+        'median': median,
+        'std': std,
+        'min': summary['min'],
+        'max': summary['max'],
+        'q25': q25,
+        'q75': q75,
+        'iqr': q75 - q25,
+        'skewness': np.sqrt(n) * summary['m3'] / summary['m2'] ** 1.5 if summary['m2'] > 0 else 0.0,
+        'kurtosis': n * summary['m4'] / summary['m2'] ** 2 - 3 if summary['m2'] > 0 else 0.0,
+        'coefficient_of_variation': (std / summary['mean']) * 100 if summary['mean'] != 0 else 0
+    }
 """
     Perform comprehensive univariate analysis on a numeric column
     
+    Quantiles are exact; record-level columns are summarised shard by shard
+    with summarize_values and merge_summaries and read with summary_statistics instead.
+    
     Returns:
         dict: Statistical summary including mean, median, std, skewness, kurtosis, etc.
 """
@@ -28,6 +192,80 @@ def univariate_analysis(df, column):
         'kurtosis': stats.kurtosis(data),
         'coefficient_of_variation': (data.std() / data.mean()) * 100 if data.mean() != 0 else 0
     }
+"""
+    Histogram bin counts computed on the server
+    
+    Args:
+        values: Array-like of numbers (NaN values are ignored)
+        bins: Number of equal-width bins
+    
+    Returns:
+        dict: 'edges' (bins + 1 bin edges) and 'counts' (bins counts)
+"""
+def histogram_summary(values, bins=50):
+    values = np.asarray(values, dtype=float)
+    counts, edges = np.histogram(values[~np.isnan(values)], bins=bins)
+    return {'edges': edges, 'counts': counts}
+"""
+    Five-number box-plot summary with a capped list of outliers
+    
+    Whiskers extend to the most extreme values within 1.5 IQR of the quartiles,
+    as in plotly's box plots. Only the max_outliers values furthest from the
+    box are kept, so the summary has a fixed size.
+    
+    Args:
+        values: Array-like of numbers (NaN values are ignored)
+        max_outliers: Maximum number of outlier values returned
+    
+    Returns:
+        dict: q1, median, q3, mean, lower_fence, upper_fence, outliers (array)
+        and n_outliers (total count before capping)
+"""
+def box_summary(values, max_outliers=500):
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    inside = (values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)
+    outliers = values[~inside]
+    distance = np.maximum(q1 - outliers, outliers - q3)
+    if len(outliers) > max_outliers:
+        outliers = outliers[np.argpartition(distance, -max_outliers)[-max_outliers:]]
+    return {
+        'q1': q1,
+        'median': median,
+        'q3': q3,
+        'mean': values.mean(),
+        'lower_fence': values[inside].min(),
+        'upper_fence': values[inside].max(),
+        'outliers': np.sort(outliers),
+        'n_outliers': int((~inside).sum())
+    }
+"""
+    Normal Q-Q points on a fixed, stratified probability grid
+    
+    The probability range is split into `points` equal strata and the full
+    data's quantile is taken at each stratum midpoint, so the plot is the same
+    on every call and covers the tails as well as the centre. The reference
+    line is a least-squares fit of the sample quantiles, as in scipy's probplot.
+    
+    Args:
+        values: Array-like of numbers (NaN values are ignored)
+        points: Maximum number of grid points (fewer when there are fewer values)
+    
+    Returns:
+        dict: 'theoretical' and 'sample' quantile arrays, and the fitted line's
+        'slope' and 'intercept'
+"""
+def qq_quantile_grid(values, points=500):
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    m = min(points, len(values))
+    probabilities = (np.arange(m) + 0.5) / m
+    theoretical = stats.norm.ppf(probabilities)
+    sample = np.quantile(values, probabilities)
+    slope, intercept = np.polyfit(theoretical, sample, 1) if m > 1 else (0.0, sample.mean())
+    return {'theoretical': theoretical, 'sample': sample, 'slope': slope, 'intercept': intercept}
 """
     Perform bivariate correlation analysis
     
@@ -50,7 +288,11 @@ def bivariate_correlation(df, col1, col2, method='pearson'):
     corr, p_value = stats.pearsonr(data[col1], data[col2]) if method == 'pearson' else \
                     stats.spearmanr(data[col1], data[col2]) if method == 'spearman' else \
                     stats.kendalltau(data[col1], data[col2])
-
+    return _interpret_correlation(corr, p_value)
+"""
+    Strength, direction and significance labels for a correlation coefficient
+"""
+def _interpret_correlation(corr, p_value):
     abs_corr = abs(corr)
     if abs_corr < 0.3:
         strength = 'Weak'
@@ -68,31 +310,1058 @@ def bivariate_correlation(df, col1, col2, method='pearson'):
         'significance': significance,
         'interpretation': f'{strength} {direction.lower()} correlation ({significance.lower()})'
     }
+# Grouping columns for each granularity of the correlation engine
+CORRELATION_LEVEL_COLUMNS = {
+    'daily': ['date'],
+    'state': ['state'],
+    'district': ['state', 'district']
+}
+
 """
-    Detect anomalies using Isolation Forest algorithm
+    Join the age columns of all three datasets at one granularity
+    
+    Args:
+        df, df_demo, df_bio: Enrolment, demographic and biometric update DataFrames
+        level: 'daily', 'state' or 'district'
+    
+    Returns:
+        DataFrame indexed by the level's keys with age_0_5, age_5_17, age_18_greater,
+        total_enrolments, demo_age_5_17, demo_age_17_, demo_total_updates,
+        bio_age_5_17, bio_age_17_ and bio_total_updates (NaN where a dataset has no
+        records, so that each dataset's columns share one missing-row pattern)
+"""
+def build_correlation_table(df, df_demo, df_bio, level='daily'):
+    group_cols = CORRELATION_LEVEL_COLUMNS[level]
+    enrol = df.groupby(group_cols)[['age_0_5', 'age_5_17', 'age_18_greater', 'total_enrolments']].sum()
+    demo = df_demo.groupby(group_cols)[['demo_age_5_17', 'demo_age_17_', 'total_updates']].sum().rename(
+        columns={'total_updates': 'demo_total_updates'}
+    )
+    bio = df_bio.groupby(group_cols)[['bio_age_5_17', 'bio_age_17_', 'total_updates']].sum().rename(
+        columns={'total_updates': 'bio_total_updates'}
+    )
+    return enrol.join([demo, bio], how='outer')
+"""
+    Rows of the correlation table used for one pair of columns
+    
+    Keys missing from both columns are dropped, so a pair within one dataset
+    only uses that dataset's keys. A key present for only one column of a
+    cross-dataset pair had no records in the other dataset and counts as 0 there.
+    
+    Returns:
+        DataFrame with the two columns
+"""
+def correlation_pair_table(table, col1, col2):
+    return table[[col1, col2]].dropna(how='all').fillna(0)
+"""
+    Pearson or Spearman correlation and p-values of every pair of columns
+"""
+def _correlation_block(data, method):
+    if method == 'spearman':
+        data = data.rank()
+    values = data.to_numpy(dtype=float)
+    n = len(values)
+    centred = values - values.mean(axis=0)
+    norms = np.sqrt((centred ** 2).sum(axis=0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = np.clip((centred.T @ centred) / np.outer(norms, norms), -1, 1)
+        t_stat = corr * np.sqrt((n - 2) / np.maximum(1 - corr ** 2, 1e-300))
+    p_value = 2 * stats.t.sf(np.abs(t_stat), max(n - 2, 1))
+    p_value[np.isnan(corr)] = np.nan
+    return corr, p_value, n
+"""
+    All-pairs correlation matrix with two-sided p-values
+    
+    Columns with the same missing-row pattern (one dataset's columns in
+    build_correlation_table) form a group. Each pair of groups is computed at
+    once from the standardised data matrix over the rows correlation_pair_table
+    would use, so within-dataset pairs skip keys the dataset lacks and
+    cross-dataset pairs count them as 0. Spearman applies the same computation
+    to column ranks; p-values use the t distribution with n - 2 degrees of
+    freedom, as scipy does for both methods.
+    
+    Args:
+        table: DataFrame of numeric columns
+        method: 'pearson' or 'spearman'
+    
+    Returns:
+        dict: 'correlation' and 'p_value' DataFrames (columns x columns), 'pair_n'
+        (rows used per pair) and 'n' (rows with any value)
+"""
+def correlation_matrix(table, method='pearson'):
+    table = table.dropna(how='all')
+    present = table.notna().to_numpy()
+    patterns, group = np.unique(present.T, axis=0, return_inverse=True)
+    group = group.ravel()
+    n_columns = table.shape[1]
+    corr = np.full((n_columns, n_columns), np.nan)
+    p_value = np.full((n_columns, n_columns), np.nan)
+    pair_n = np.zeros((n_columns, n_columns), dtype=int)
+    for a in range(len(patterns)):
+        for b in range(a, len(patterns)):
+            columns = np.flatnonzero((group == a) | (group == b))
+            block_corr, block_p, n = _correlation_block(
+                table.iloc[patterns[a] | patterns[b], columns].fillna(0), method
+            )
+            # A group pair block only sets its cross-group pairs; within-group pairs come from (a, a)
+            cross = group[columns][:, None] != group[columns][None, :]
+            write = cross if a != b else ~cross
+            block = np.ix_(columns, columns)
+            corr[block] = np.where(write, block_corr, corr[block])
+            p_value[block] = np.where(write, block_p, p_value[block])
+            pair_n[block] = np.where(write, n, pair_n[block])
+    return {
+        'correlation': pd.DataFrame(corr, index=table.columns, columns=table.columns),
+        'p_value': pd.DataFrame(p_value, index=table.columns, columns=table.columns),
+        'pair_n': pd.DataFrame(pair_n, index=table.columns, columns=table.columns),
+        'n': len(table)
+    }
+"""
+    Correlation tables and matrices cached per (level, data version)
+    
+    Args:
+        level: 'daily', 'state' or 'district'
+        data_version: Identifier of the loaded data snapshot
+        _frames: [df, df_demo, df_bio] for that snapshot (not hashed)
+    
+    Returns:
+        dict: 'table' from build_correlation_table and 'pearson' / 'spearman'
+        results from correlation_matrix
+"""
+@st.cache_data(show_spinner="Computing correlation matrices...")
+def cached_correlation_matrices(level, data_version, _frames):
+    table = build_correlation_table(*_frames, level=level)
+    return {
+        'table': table,
+        'pearson': correlation_matrix(table, 'pearson'),
+        'spearman': correlation_matrix(table, 'spearman')
+    }
+"""
+    Read one pair from a correlation_matrix result
+    
+    Returns:
+        dict: Same layout as bivariate_correlation
+"""
+def matrix_correlation(matrices, col1, col2):
+    if matrices['pair_n'].at[col1, col2] < 3:
+        return {
+            'correlation': np.nan,
+            'p_value': np.nan,
+            'interpretation': 'Insufficient data'
+        }
+    return _interpret_correlation(
+        matrices['correlation'].at[col1, col2],
+        matrices['p_value'].at[col1, col2]
+    )
+# Grouping columns of each region level profiled for seasonality
+SEASONALITY_LEVEL_COLUMNS = {'state': ['state'], 'district': ['state', 'district']}
+# Datasets profiled per region: name -> (frame index, value column)
+DATASET_VALUE_COLUMNS = {
+    'enrolment': (0, 'total_enrolments'),
+    'demographic': (1, 'total_updates'),
+    'biometric': (2, 'total_updates')
+}
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+WEEKDAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+"""
+    Seasonal index and dispersion of every region for one calendar bucketing
+    
+    Args:
+        day_totals: Array, one row per region and one column per calendar day
+        bucket: Integer bucket code of each day (e.g. month or weekday)
+        n_buckets: Number of possible bucket codes
+    
+    Returns:
+        tuple: (index, dispersion) arrays of shape regions x buckets: the mean
+        daily total of each bucket and its standard deviation, both divided by the
+        region's overall mean daily total (NaN for buckets with no days)
+"""
+def _bucket_profile(day_totals, bucket, n_buckets):
+    n_regions = len(day_totals)
+    cells = (np.arange(n_regions)[:, None] * n_buckets + bucket[None, :]).ravel()
+    n_days = np.bincount(bucket, minlength=n_buckets).astype(float)
+    n_days[n_days == 0] = np.nan
+    sums = np.bincount(cells, weights=day_totals.ravel(), minlength=n_regions * n_buckets)
+    squares = np.bincount(cells, weights=(day_totals ** 2).ravel(), minlength=n_regions * n_buckets)
+    mean = sums.reshape(n_regions, n_buckets) / n_days
+    std = np.sqrt(np.maximum(squares.reshape(n_regions, n_buckets) / n_days - mean ** 2, 0))
+    level = day_totals.mean(axis=1, keepdims=True)
+    level[level == 0] = np.nan
+    return mean / level, std / level
+"""
+    Month-of-year and weekday seasonal profiles for every region
+    
+    Records are reduced to a region x calendar-day array with one bincount over
+    integer region and day codes; the indices and their dispersion for all
+    regions then come from one further bincount per calendar bucketing. An index
+    of 1.2 means the bucket's average day is 20% busier than the region's average
+    day. The calendar holds the days published anywhere in the dataset: a region
+    without records on a published day counts as zero, while publication gaps
+    are left out of every bucket.
+    
+    Args:
+        data: DataFrame with a 'date' column
+        value_col: Column to aggregate
+        region_cols: Columns identifying a region
+    
+    Returns:
+        dict: 'summary' DataFrame (one row per region: total, mean_daily,
+        month_strength and weekday_strength - the standard deviation of the
+        indices across buckets - and the peak/trough month and weekday), plus
+        'month_index', 'month_dispersion', 'weekday_index' and
+        'weekday_dispersion' DataFrames (regions x buckets)
+"""
+def seasonal_profiles(data, value_col, region_cols):
+    groups = data.groupby(region_cols, sort=True)
+    regions = groups.size().index
+    region_codes = groups.ngroup().to_numpy()
+    dates = data['date'].dt.normalize()
+    calendar = pd.DatetimeIndex(dates.dropna().unique()).sort_values()
+    day_codes = calendar.get_indexer(dates)
+    valid = (region_codes >= 0) & (day_codes >= 0)
+    day_totals = np.bincount(
+        region_codes[valid] * len(calendar) + day_codes[valid],
+        weights=data[value_col].to_numpy(dtype=float)[valid],
+        minlength=len(regions) * len(calendar)
+    ).reshape(len(regions), len(calendar))
+
+    result = {}
+    summary = pd.DataFrame(index=regions)
+    summary['total'] = day_totals.sum(axis=1)
+    summary['mean_daily'] = day_totals.mean(axis=1)
+    for name, bucket, labels in [
+        ('month', calendar.month.to_numpy() - 1, MONTH_NAMES),
+        ('weekday', calendar.dayofweek.to_numpy(), WEEKDAY_NAMES)
+    ]:
+        index, dispersion = _bucket_profile(day_totals, bucket, len(labels))
+        result[f'{name}_index'] = pd.DataFrame(index, index=regions, columns=labels)
+        result[f'{name}_dispersion'] = pd.DataFrame(dispersion, index=regions, columns=labels)
+        observed = np.isfinite(index).any(axis=1)
+        summary[f'{name}_strength'] = np.nanstd(index, axis=1)
+        labels = np.array(labels)
+        summary[f'peak_{name}'] = np.where(observed, labels[np.nan_to_num(index, nan=-np.inf).argmax(axis=1)], None)
+        summary[f'trough_{name}'] = np.where(observed, labels[np.nan_to_num(index, nan=np.inf).argmin(axis=1)], None)
+    result['summary'] = summary.reset_index()
+    return result
+"""
+    Seasonal profiles of every dataset cached per (level, data version)
+    
+    Args:
+        level: 'state' or 'district'
+        data_version: Identifier of the loaded data snapshot
+        _frames: [df, df_demo, df_bio] for that snapshot (not hashed)
+    
+    Returns:
+        dict: dataset name (see DATASET_VALUE_COLUMNS) -> seasonal_profiles result
+"""
+@st.cache_data(show_spinner="Profiling seasonality...")
+def cached_seasonal_profiles(level, data_version, _frames):
+    return {
+        dataset: seasonal_profiles(_frames[frame_index], value_col, SEASONALITY_LEVEL_COLUMNS[level])
+        for dataset, (frame_index, value_col) in DATASET_VALUE_COLUMNS.items()
+    }
+# Region levels measured for concentration: level -> (parent columns, unit column)
+CONCENTRATION_LEVELS = {
+    'state': (['state'], 'district'),
+    'district': (['state', 'district'], 'pincode')
+}
+CONCENTRATION_TOP_K = (1, 3, 5)
+
+"""
+    Concentration of every parent region's activity over its units
+    
+    Units are totalled with one grouped sum and sorted once, by parent and then
+    by descending total, so each unit's rank within its parent is its offset
+    from the parent's first row. Herfindahl, Gini and top-k shares then reduce
+    to bincounts over the parent codes, with no per-region loop.
+    
+    Args:
+        data: DataFrame of records
+        value_col: Column to aggregate
+        parent_cols: Columns identifying a parent region (e.g. ['state'])
+        unit_col: Column identifying a unit within a parent (e.g. 'district')
+        top_k: Unit counts for which the combined share of the largest units is reported
+    
+    Returns:
+        DataFrame: One row per parent with total, n_units, hhi (0-1),
+        effective_units (1 / hhi), gini (0 for equal units) and top<k>_share (0-1)
+"""
+def concentration_indices(data, value_col, parent_cols, unit_col, top_k=CONCENTRATION_TOP_K):
+    units = data.groupby(parent_cols + [unit_col], sort=False)[value_col].sum()
+    parent_codes, parents = pd.factorize(units.index.droplevel(unit_col), sort=True)
+    values = units.to_numpy(dtype=float)
+    order = np.lexsort((-values, parent_codes))
+    parent_codes, values = parent_codes[order], values[order]
+
+    n_parents = len(parents)
+    n_units = np.bincount(parent_codes, minlength=n_parents)
+    totals = np.bincount(parent_codes, weights=values, minlength=n_parents)
+    starts = np.concatenate([[0], np.cumsum(n_units)[:-1]])
+    rank = np.arange(len(values)) - starts[parent_codes]
+    safe_totals = np.where(totals > 0, totals, np.nan)
+    shares = values / safe_totals[parent_codes]
+
+    result = pd.DataFrame(index=parents)
+    result['total'] = totals
+    result['n_units'] = n_units
+    result['hhi'] = np.bincount(parent_codes, weights=shares ** 2, minlength=n_parents)
+    result['effective_units'] = 1 / result['hhi']
+    # Gini over units in ascending order: (2 * sum(i * x_i)) / (n * sum(x)) - (n + 1) / n
+    ascending_rank = n_units[parent_codes] - rank
+    weighted = np.bincount(parent_codes, weights=ascending_rank * values, minlength=n_parents)
+    result['gini'] = 2 * weighted / (n_units * safe_totals) - (n_units + 1) / n_units
+    for k in top_k:
+        result[f'top{k}_share'] = np.bincount(parent_codes, weights=values * (rank < k), minlength=n_parents) / safe_totals
+    result.loc[totals <= 0, ['hhi', 'effective_units', 'gini']] = np.nan
+    result.index.names = parent_cols
+    return result.reset_index()
+"""
+    Concentration indices of every dataset cached per (level, data version)
+    
+    Args:
+        level: 'state' (over districts) or 'district' (over pincodes)
+        data_version: Identifier of the loaded data snapshot
+        _frames: [df, df_demo, df_bio] for that snapshot (not hashed)
+    
+    Returns:
+        dict: dataset name (see DATASET_VALUE_COLUMNS) -> concentration_indices result
+"""
+@st.cache_data(show_spinner="Measuring concentration...")
+def cached_concentration_indices(level, data_version, _frames):
+    parent_cols, unit_col = CONCENTRATION_LEVELS[level]
+    return {
+        dataset: concentration_indices(_frames[frame_index], value_col, parent_cols, unit_col)
+        for dataset, (frame_index, value_col) in DATASET_VALUE_COLUMNS.items()
+    }
+# Growth measures: column -> (lag in months, column holding the comparison base)
+GROWTH_MEASURES = {
+    'mom_growth': (1, 'prev_month'),
+    'growth_3m': (3, 'prev_3m'),
+    'yoy_growth': (12, 'prev_year')
+}
+
+"""
+    Growth of every series over a lag, as one shifted-array operation
+    
+    Args:
+        values: Array, one row per series and one column per period
+        lag: Number of periods to compare across
+    
+    Returns:
+        tuple: (growth, base) arrays shaped like values; growth is NaN where the
+        base is missing or not positive
+"""
+def _shifted_growth(values, lag):
+    base = np.full(values.shape, np.nan)
+    base[:, lag:] = values[:, :-lag]
+    growth = (values - base) / np.where(base > 0, base, np.nan)
+    return growth, base
+"""
+    Month-on-month, three-month and year-on-year growth for every region and month
+    
+    All regions and months are computed together on the region x month matrix:
+    month-on-month and year-on-year compare each month with the month 1 and 12
+    columns earlier, and three-month growth compares each rolling three-month
+    total (from a cumulative sum) with the one ending three months earlier.
+    Year-on-year growth stays NaN until the matrix spans more than a year, and
+    any growth touching an unpublished (NaN) month is NaN.
+    
+    Args:
+        matrix: DataFrame of monthly totals, one row per region and one column per month
+        last_date: Last date with records; if it falls before the end of its
+            month, that month is flagged partial
+    
+    Returns:
+        DataFrame: One row per region and month with the region columns, month,
+        partial, value, and each GROWTH_MEASURES column (a fraction, NaN where
+        undefined) next to its comparison base
+"""
+def growth_rates(matrix, last_date=None):
+    values = matrix.to_numpy(dtype=float)
+    cumulative = np.nancumsum(values, axis=1)
+    rolling_3m = np.full(values.shape, np.nan)
+    rolling_3m[:, 2:] = cumulative[:, 2:] - np.pad(cumulative, ((0, 0), (1, 0)))[:, :-3]
+    gaps = np.cumsum(np.isnan(values), axis=1)
+    rolling_3m[:, 2:][gaps[:, 2:] > np.pad(gaps, ((0, 0), (1, 0)))[:, :-3]] = np.nan
+    series = {'value': values}
+    for column, (lag, base_column) in GROWTH_MEASURES.items():
+        growth, base = _shifted_growth(rolling_3m if column == 'growth_3m' else values, lag)
+        series[column], series[base_column] = growth, base
+
+    n_regions, n_months = values.shape
+    index = matrix.index.repeat(n_months)
+    result = pd.DataFrame(
+        {name: array.ravel() for name, array in series.items()},
+        index=index
+    )
+    result.insert(0, 'month', np.tile(matrix.columns, n_regions))
+    result.insert(1, 'partial', False)
+    if last_date is not None:
+        last_date = pd.Timestamp(last_date).normalize()
+        if last_date < last_date + pd.offsets.MonthEnd(0):
+            result['partial'] = result['month'] == last_date.to_period('M').to_timestamp()
+    return result.reset_index()
+"""
+    Fastest-growing and fastest-declining regions in one month
+    
+    Args:
+        growth: Output of growth_rates
+        measure: One of GROWTH_MEASURES
+        month: Month to rank (None for the latest month not flagged partial)
+        top_n: Number of regions in each list
+        min_base: Smallest comparison base ranked, so tiny regions do not dominate
+    
+    Returns:
+        tuple: (growers, decliners) DataFrames, sorted from the most extreme
+"""
+def growth_leaderboard(growth, measure='mom_growth', month=None, top_n=10, min_base=100):
+    if month is None:
+        complete = growth.loc[~growth['partial'], 'month']
+        month = complete.max() if len(complete) > 0 else growth['month'].max()
+    base_column = GROWTH_MEASURES[measure][1]
+    eligible = growth[(growth['month'] == month) & (growth[base_column] >= min_base)].dropna(subset=[measure])
+    return eligible.nlargest(top_n, measure), eligible.nsmallest(top_n, measure)
+# Percentiles of the benchmark bands drawn around a region's trend
+PEER_BAND_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+"""
+    Percentile bands across peer regions for every period
+    
+    Each (peer group, period) cell is a contiguous run of one lexsort over the
+    flattened matrix, so every quantile of every cell is read by indexing into
+    the sorted values, with linear interpolation as in numpy.quantile. NaN
+    values sort to the end of their run and are skipped, as in numpy.nanquantile.
+    
+    Args:
+        matrix: DataFrame, one row per region and one column per period (NaN
+            where a region has no records in the period)
+        group_level: Index level whose regions are peers of each other (e.g.
+            'state' for districts), or None to treat every row as a peer
+        quantiles: Quantiles to compute
+    
+    Returns:
+        DataFrame: One row per peer group and period with the group column (if
+        any), period, n_peers (regions with a value) and a p<percentile> column
+        per quantile (NaN where no peer has a value)
+"""
+def peer_percentile_bands(matrix, group_level=None, quantiles=PEER_BAND_QUANTILES):
+    values = matrix.to_numpy(dtype=float)
+    n_regions, n_periods = values.shape
+    if group_level is None:
+        codes, groups = np.zeros(n_regions, dtype=int), None
+    else:
+        codes, groups = pd.factorize(matrix.index.get_level_values(group_level), sort=True)
+    n_groups = 1 if groups is None else len(groups)
+
+    cells = (codes[:, None] * n_periods + np.arange(n_periods)[None, :]).ravel()
+    flat = values.ravel()
+    sorted_values = flat[np.lexsort((flat, cells))]
+    sizes = np.bincount(cells, minlength=n_groups * n_periods)
+    counts = np.bincount(cells, weights=~np.isnan(flat), minlength=n_groups * n_periods).astype(int)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    position = np.maximum(counts[:, None] - 1, 0) * np.asarray(quantiles)[None, :]
+    lower = np.floor(position).astype(int)
+    upper = np.ceil(position).astype(int)
+    weight = position - lower
+    bands = (
+        sorted_values[starts[:, None] + lower] * (1 - weight)
+        + sorted_values[starts[:, None] + upper] * weight
+    )
+    bands[counts == 0] = np.nan
+
+    result = pd.DataFrame(bands, columns=[f"p{round(q * 100)}" for q in quantiles])
+    result.insert(0, 'n_peers', counts)
+    result.insert(0, 'period', np.tile(matrix.columns, n_groups))
+    if groups is not None:
+        result.insert(0, group_level, np.repeat(groups, n_periods))
+    return result
+# Grouping columns for each region level of the anomaly feature matrix
+FEATURE_LEVEL_COLUMNS = {
+    'state': ['state'],
+    'district': ['state', 'district'],
+    'pincode': ['pincode'],
+    'postal_zone': ['postal_zone'],
+    'postal_subzone': ['postal_subzone'],
+    'sorting_district': ['sorting_district']
+}
+
+# Columns of the anomaly feature matrix that detectors can use
+ANOMALY_FEATURE_COLUMNS = [
+    'total_enrolments', 'demo_updates', 'bio_updates', 'active_days',
+    'child_ratio', 'infant_share', 'demo_child_share', 'bio_child_share',
+    'demo_per_enrolment', 'bio_per_enrolment', 'bio_per_child_enrolment',
+    'enrolment_growth', 'demo_growth', 'bio_growth'
+]
+# Features scored by default, and by the batch anomaly job
+DEFAULT_ANOMALY_FEATURES = (
+    'total_enrolments', 'child_ratio', 'demo_per_enrolment',
+    'bio_per_child_enrolment', 'enrolment_growth', 'bio_growth'
+)
+# Features of the national daily (temporal) detector
+TEMPORAL_ANOMALY_FEATURES = ('total_enrolments', 'child_ratio')
+# Rows subsampled per tree when scoring every pincode
+PINCODE_MAX_SAMPLES = 512
+# Features locating a region among its peers (volumes are log-scaled) and
+# features on which it is compared with them
+PEER_PROFILE_FEATURES = ('total_enrolments', 'demo_updates', 'bio_updates', 'child_ratio', 'infant_share')
+PEER_BEHAVIOUR_FEATURES = (
+    'demo_per_enrolment', 'bio_per_enrolment', 'bio_per_child_enrolment',
+    'demo_child_share', 'bio_child_share', 'enrolment_growth', 'bio_growth'
+)
+PEER_VOLUME_FEATURES = ('total_enrolments', 'demo_updates', 'bio_updates', 'active_days')
+
+"""
+    Divide two Series, returning 0 where the denominator is 0
+"""
+def _safe_ratio(numerator, denominator):
+    return (numerator / denominator.replace(0, np.nan)).fillna(0)
+"""
+    Latest month-on-month growth per region
+    
+    Args:
+        data: DataFrame with a 'date' column
+        group_cols: Columns identifying a region
+        value_col: Column to aggregate
+    
+    Returns:
+        Series of growth between the last two months of the dataset, indexed by region
+"""
+def _latest_monthly_growth(data, group_cols, value_col):
+    month = data['date'].dt.to_period('M')
+    last_month = month.max()
+    recent = data[month >= last_month - 1]
+    monthly = (
+        recent[value_col]
+        .groupby([recent[col] for col in group_cols] + [month[month >= last_month - 1].rename('month')])
+        .sum()
+        .unstack('month', fill_value=0)
+        .reindex(columns=[last_month - 1, last_month], fill_value=0)
+    )
+    return _safe_ratio(monthly[last_month] - monthly[last_month - 1], monthly[last_month - 1])
+"""
+    Build the cross-dataset anomaly feature matrix for one region level
+    
+    Joins enrolment, demographic-update and biometric-update aggregates per region
+    and derives ratios (updates per enrolment, biometric updates per child
+    enrolment), age-mix shares and latest month-on-month growth rates.
+    
+    Args:
+        df, df_demo, df_bio: Enrolment, demographic and biometric update DataFrames
+        level: 'state', 'district', 'pincode' or a postal level (see FEATURE_LEVEL_COLUMNS)
+    
+    Returns:
+        DataFrame with one row per region: region columns (state, district and
+        pincode, or the postal prefix, as applicable) followed by ANOMALY_FEATURE_COLUMNS
+"""
+def build_anomaly_feature_matrix(df, df_demo, df_bio, level='district'):
+    group_cols = FEATURE_LEVEL_COLUMNS[level]
+    enrol = df.groupby(group_cols)[['total_enrolments', 'age_0_5', 'age_5_17', 'age_18_greater']].sum()
+    demo = df_demo.groupby(group_cols)[['total_updates', 'demo_age_5_17']].sum().rename(
+        columns={'total_updates': 'demo_updates'}
+    )
+    bio = df_bio.groupby(group_cols)[['total_updates', 'bio_age_5_17']].sum().rename(
+        columns={'total_updates': 'bio_updates'}
+    )
+    active_days = (
+        pd.concat([frame[group_cols + ['date']] for frame in (df, df_demo, df_bio)])
+        .drop_duplicates()
+        .groupby(group_cols)
+        .size()
+        .rename('active_days')
+    )
+    features = enrol.join([demo, bio, active_days], how='outer').fillna(0)
+
+    child_enrolments = features['age_0_5'] + features['age_5_17']
+    features['child_ratio'] = _safe_ratio(child_enrolments, features['total_enrolments'])
+    features['infant_share'] = _safe_ratio(features['age_0_5'], features['total_enrolments'])
+    features['demo_child_share'] = _safe_ratio(features['demo_age_5_17'], features['demo_updates'])
+    features['bio_child_share'] = _safe_ratio(features['bio_age_5_17'], features['bio_updates'])
+    features['demo_per_enrolment'] = _safe_ratio(features['demo_updates'], features['total_enrolments'])
+    features['bio_per_enrolment'] = _safe_ratio(features['bio_updates'], features['total_enrolments'])
+    features['bio_per_child_enrolment'] = _safe_ratio(features['bio_age_5_17'], child_enrolments)
+    for name, frame, value_col in [
+        ('enrolment_growth', df, 'total_enrolments'),
+        ('demo_growth', df_demo, 'total_updates'),
+        ('bio_growth', df_bio, 'total_updates')
+    ]:
+        features[name] = _latest_monthly_growth(frame, group_cols, value_col).reindex(features.index).fillna(0)
+
+    features = features.reset_index()
+    region_cols = list(group_cols)
+    if level == 'pincode':
+        # A pincode's state and district are its majority region across all rows, as in the pincode master
+        location = (
+            pd.concat([frame[['pincode', 'state', 'district']] for frame in (df, df_demo, df_bio)])
+            .groupby(['pincode', 'state', 'district'])
+            .size()
+            .rename('votes')
+            .reset_index()
+            .sort_values(['pincode', 'votes'], ascending=[True, False])
+            .drop_duplicates('pincode')
+            .drop(columns='votes')
+        )
+        features = features.merge(location, on='pincode', how='left')
+        region_cols = ['pincode', 'state', 'district']
+    return features[region_cols + ANOMALY_FEATURE_COLUMNS]
+"""
+    Build national daily enrolment features for temporal anomaly detection
+    
+    Args:
+        df: Enrolment DataFrame
+    
+    Returns:
+        DataFrame with one row per date: age-group and total enrolments,
+        child_ratio and day_of_week
+"""
+def build_temporal_features(df):
+    daily = df.groupby('date').agg({
+        'total_enrolments': 'sum',
+        'age_0_5': 'sum',
+        'age_5_17': 'sum',
+        'age_18_greater': 'sum'
+    }).reset_index()
+    daily['child_ratio'] = (daily['age_0_5'] + daily['age_5_17']) / daily['total_enrolments']
+    daily['day_of_week'] = pd.to_datetime(daily['date']).dt.dayofweek
+    return daily
+"""
+    Anomaly feature matrix cached per (level, data version)
+    
+    Every detector reads its features from this cache, so the joins and ratios
+    are computed once per snapshot rather than once per model.
+    
+    Args:
+        level: Key of FEATURE_LEVEL_COLUMNS
+        data_version: Identifier of the loaded data snapshot
+        _frames: [df, df_demo, df_bio] for that snapshot (not hashed)
+    
+    Returns:
+        DataFrame from build_anomaly_feature_matrix
+"""
+@st.cache_data(show_spinner="Building anomaly feature matrix...")
+def cached_anomaly_feature_matrix(level, data_version, _frames):
+    df, df_demo, df_bio = _frames
+    return build_anomaly_feature_matrix(df, df_demo, df_bio, level)
+"""
+    Fit Isolation Forest once and return raw anomaly scores
     
     Args:
         df: DataFrame
         columns: List of columns to use for anomaly detection
-        contamination: Expected proportion of anomalies
+        random_state: Seed for the forest
+        n_jobs: Number of cores used to build the trees (-1 for all)
+        max_samples: Rows subsampled per tree ('auto' or an int, capped at the row count)
     
     Returns:
-        DataFrame with anomaly flags
+        Series of anomaly scores (higher is more anomalous) for rows with complete
+        features, or an empty Series if there are fewer than 10 such rows
 """
-def detect_anomalies_isolation_forest(df, columns, contamination=0.1):
+def fit_anomaly_scores(df, columns, random_state=42, n_jobs=None, max_samples='auto'):
     data = df[columns].dropna()
     
     if len(data) < 10:
-        return df.assign(is_anomaly=False)
+        return pd.Series(dtype=float)
     
     scaler = StandardScaler()
     scaled_data = scaler.fit_transform(data)
     
-    iso_forest = IsolationForest(contamination=contamination, random_state=42)
-    anomalies = iso_forest.fit_predict(scaled_data)
+    if max_samples != 'auto':
+        max_samples = min(max_samples, len(data))
+    iso_forest = IsolationForest(random_state=random_state, n_jobs=n_jobs, max_samples=max_samples)
+    iso_forest.fit(scaled_data)
     
+    return pd.Series(-iso_forest.score_samples(scaled_data), index=data.index)
+"""
+    Flag anomalies by applying contamination as a quantile threshold on scores
+    
+    Args:
+        df: DataFrame the scores were computed on
+        scores: Output of fit_anomaly_scores
+        contamination: Expected proportion of anomalies
+    
+    Returns:
+        DataFrame with anomaly_score and is_anomaly columns
+"""
+def apply_anomaly_threshold(df, scores, contamination=0.1):
     result_df = df.copy()
+    result_df['anomaly_score'] = scores
     result_df['is_anomaly'] = False
-    result_df.loc[data.index, 'is_anomaly'] = (anomalies == -1)
-    
+    if len(scores) > 0:
+        threshold = np.percentile(scores, 100 * (1 - contamination))
+        result_df.loc[scores.index, 'is_anomaly'] = scores > threshold
     return result_df
+"""
+    Anomaly scores cached per (level, feature set, data version)
+    
+    The forest is fitted once per key and shared across reruns and sessions, so
+    changing the contamination only moves the threshold in apply_anomaly_threshold.
+    
+    Args:
+        level: Name of the aggregation level the data was built at
+        columns: Tuple of feature columns
+        data_version: Identifier of the loaded data snapshot
+        _data: DataFrame of features for that key (not hashed)
+        n_jobs: Number of cores used to build the trees (-1 for all)
+        max_samples: Rows subsampled per tree
+    
+    Returns:
+        Series of anomaly scores
+"""
+@st.cache_data(show_spinner="Fitting anomaly model...")
+def cached_anomaly_scores(level, columns, data_version, _data, n_jobs=None, max_samples='auto'):
+    return fit_anomaly_scores(_data, list(columns), n_jobs=n_jobs, max_samples=max_samples)
+"""
+    Detect anomalies using Isolation Forest algorithm
+    
+    Args:
+        df: DataFrame
+        columns: List of columns to use for anomaly detection
+        contamination: Expected proportion of anomalies
+    
+    Returns:
+        DataFrame with anomaly flags
+"""
+def detect_anomalies_isolation_forest(df, columns, contamination=0.1):
+    scores = fit_anomaly_scores(df, columns)
+    return apply_anomaly_threshold(df, scores, contamination)
+"""
+    Precompute each region's nearest peers on a normalized profile
+    
+    Volume features are log-scaled and all profile features standardised before a
+    KD-tree (or ball-tree) query, so neighbour search stays O(n log n) in the
+    number of regions.
+    
+    Args:
+        features: Feature matrix, one row per region
+        profile_columns: Columns forming the profile vector
+        k: Number of peers per region
+        algorithm: 'kd_tree' or 'ball_tree'
+    
+    Returns:
+        dict: 'indices' and 'distances' arrays of shape (regions, k), positional
+        into features and excluding the region itself
+"""
+def build_peer_table(features, profile_columns=PEER_PROFILE_FEATURES, k=10, algorithm='kd_tree'):
+    profile = features[list(profile_columns)].astype(float).copy()
+    volume_columns = [col for col in profile_columns if col in PEER_VOLUME_FEATURES]
+    profile[volume_columns] = np.log1p(profile[volume_columns].clip(lower=0))
+    scaled = StandardScaler().fit_transform(profile.fillna(0))
+    
+    k = min(k, len(features) - 1)
+    neighbours = NearestNeighbors(n_neighbors=k + 1, algorithm=algorithm).fit(scaled)
+    distances, indices = neighbours.kneighbors(scaled)
+    # Drop each region's own row; with duplicate profiles it is not always in column 0
+    not_self = indices != np.arange(len(features))[:, None]
+    keep = np.cumsum(not_self, axis=1) <= k
+    mask = not_self & keep
+    return {
+        'indices': indices[mask].reshape(len(features), k),
+        'distances': distances[mask].reshape(len(features), k)
+    }
+"""
+    Peer table cached per (level, profile, k, data version)
+    
+    Args:
+        level: Region level of the feature matrix
+        profile_columns: Tuple of profile columns
+        k: Number of peers per region
+        data_version: Identifier of the loaded data snapshot
+        _features: Feature matrix for that level and snapshot (not hashed)
+    
+    Returns:
+        dict from build_peer_table
+"""
+@st.cache_data(show_spinner="Finding peer regions...")
+def cached_peer_table(level, profile_columns, k, data_version, _features):
+    return build_peer_table(_features, profile_columns, k)
+"""
+    Score how far each region's behaviour deviates from its peers
+    
+    For each behaviour feature the region's value is compared with the median of
+    its peers and scaled by the peers' MAD (floored at a tenth of the feature's
+    overall MAD), all regions at once through the precomputed neighbour indices.
+    
+    Args:
+        features: Feature matrix the peer table was built on
+        peer_table: Output of build_peer_table
+        behaviour_columns: Columns compared with the peers
+    
+    Returns:
+        DataFrame aligned to features with a '<column>_peer_z' column per behaviour
+        feature, 'peer_score' (root mean square of those z-scores) and
+        'top_deviation' (the feature furthest from the peers)
+"""
+def peer_deviation_scores(features, peer_table, behaviour_columns=PEER_BEHAVIOUR_FEATURES):
+    behaviour_columns = list(behaviour_columns)
+    values = features[behaviour_columns].to_numpy(dtype=float)
+    peers = values[peer_table['indices']]
+    peer_median = np.median(peers, axis=1)
+    peer_mad = np.median(np.abs(peers - peer_median[:, None, :]), axis=1)
+    overall_mad = np.median(np.abs(values - np.median(values, axis=0)), axis=0)
+    peer_mad = np.maximum(peer_mad, np.maximum(0.1 * overall_mad, 1e-9))
+    zscores = 0.6745 * (values - peer_median) / peer_mad
+    
+    result = pd.DataFrame(zscores, index=features.index, columns=[f"{col}_peer_z" for col in behaviour_columns])
+    result['peer_score'] = np.sqrt(np.mean(zscores ** 2, axis=1))
+    result['top_deviation'] = np.array(behaviour_columns)[np.argmax(np.abs(zscores), axis=1)]
+    return result
+"""
+    Rolling robust z-scores for every series of a region x day matrix
+    
+    Each day is compared with the median and MAD of the preceding window days of
+    the same series. All regions and days are computed together on a sliding-window
+    view of the matrix, without a per-region loop. Days with no published data
+    (all-NaN columns) are neither scored nor part of any baseline, so the window
+    spans the preceding published days.
+    
+    Args:
+        matrix: DataFrame, one row per region and one column per day
+        window: Number of preceding published days forming the baseline
+        min_periods: Minimum number of baseline days required to score a day
+        mad_floor: Lower bound on the MAD, so that flat (e.g. all-zero) baselines
+            do not produce infinite scores
+    
+    Returns:
+        dict: 'zscore', 'median' and 'mad' DataFrames shaped like the input
+        (NaN on unpublished days and where there is not enough history)
+"""
+def rolling_robust_zscores(matrix, window=28, min_periods=14, mad_floor=1.0):
+    observed = ~matrix.isna().all(axis=0).values
+    values = matrix.values[:, observed].astype(float)
+    n_regions, n_days = values.shape
+    padded = np.hstack([np.full((n_regions, window), np.nan), values])
+    # windows[:, t, :] holds days t-window .. t-1 of every region
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window, axis=1)[:, :n_days, :]
+    enough = np.sum(~np.isnan(windows), axis=2) >= min_periods
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = np.nanmedian(windows, axis=2)
+        mad = np.nanmedian(np.abs(windows - median[..., None]), axis=2)
+    mad = np.maximum(mad, mad_floor)
+    zscore = np.where(enough, 0.6745 * (values - median) / mad, np.nan)
+    median = np.where(enough, median, np.nan)
+    mad = np.where(enough, mad, np.nan)
+    return {
+        name: pd.DataFrame(array, index=matrix.index, columns=matrix.columns[observed]).reindex(columns=matrix.columns)
+        for name, array in [('zscore', zscore), ('median', median), ('mad', mad)]
+    }
+"""
+    Turn robust z-scores into a long table of alerts
+    
+    Args:
+        matrix: Region x day matrix the scores were computed on
+        scores: Output of rolling_robust_zscores
+        threshold: Absolute z-score above which a day is flagged
+    
+    Returns:
+        DataFrame with one row per flagged region/day: value, baseline median, MAD,
+        z-score and direction ('Spike' or 'Collapse')
+"""
+def robust_zscore_alerts(matrix, scores, threshold=3.5):
+    zscore = scores['zscore'].values
+    rows, cols = np.nonzero(np.abs(np.nan_to_num(zscore)) > threshold)
+    alerts = pd.DataFrame({
+        'date': matrix.columns[cols],
+        'value': matrix.values[rows, cols],
+        'median': scores['median'].values[rows, cols],
+        'mad': scores['mad'].values[rows, cols],
+        'zscore': zscore[rows, cols]
+    })
+    alerts['direction'] = np.where(alerts['zscore'] > 0, 'Spike', 'Collapse')
+    region = matrix.index[rows].to_frame(index=False)
+    return pd.concat([region, alerts], axis=1)
+"""
+    Centred moving average along the rows of a 2-D array
+    
+    Uses cumulative sums, so every window is averaged in one vectorized step.
+    Windows are truncated at the series ends and averaged over the days available.
+"""
+def _centred_moving_average(values, window):
+    n_days = values.shape[1]
+    cumsum = np.hstack([np.zeros((len(values), 1)), np.cumsum(values, axis=1)])
+    half = window // 2
+    starts = np.clip(np.arange(n_days) - half, 0, n_days)
+    ends = np.clip(np.arange(n_days) + window - half, 0, n_days)
+    return (cumsum[:, ends] - cumsum[:, starts]) / (ends - starts)
+"""
+    Seasonal decomposition residual scores for every series of a region x day matrix
+    
+    Each series is split into a centred moving-average trend, a weekday seasonal
+    profile (mean detrended value per weekday, centred to sum to zero) and a
+    residual. Residuals are standardised by the series' own median absolute
+    residual. All regions are decomposed together with matrix operations. Days
+    with no published data (all-NaN columns) are dropped before decomposing, so
+    the trend averages published days only, and come back as NaN.
+    
+    Args:
+        matrix: DataFrame, one row per region and one column per day
+        period: Seasonal period in days
+        trend_window: Moving-average window for the trend (defaults to period)
+        mad_floor: Lower bound on the residual MAD
+    
+    Returns:
+        dict: 'trend', 'seasonal', 'residual' and 'zscore' DataFrames shaped like the
+        input, plus 'median' (trend + seasonal, the expected value) and 'mad' so that
+        the result can be passed to robust_zscore_alerts
+"""
+def seasonal_residual_zscores(matrix, period=7, trend_window=None, mad_floor=1.0):
+    observed = matrix.columns[~matrix.isna().all(axis=0).values]
+    values = matrix[observed].values.astype(float)
+    trend = _centred_moving_average(values, trend_window or period)
+    detrended = values - trend
+
+    # Mean detrended value for each position in the cycle, via a one-hot design
+    phase = np.asarray(pd.DatetimeIndex(observed).dayofweek if period == 7
+                       else np.arange(values.shape[1]) % period)
+    design = np.eye(period)[phase]
+    profile = (detrended @ design) / np.maximum(design.sum(axis=0), 1)
+    profile -= profile.mean(axis=1, keepdims=True)
+    seasonal = profile[:, phase]
+
+    residual = detrended - seasonal
+    mad = np.median(np.abs(residual - np.median(residual, axis=1, keepdims=True)), axis=1)
+    mad = np.broadcast_to(np.maximum(mad, mad_floor)[:, None], values.shape)
+    zscore = 0.6745 * residual / mad
+
+    def frame(array):
+        return pd.DataFrame(array, index=matrix.index, columns=observed).reindex(columns=matrix.columns)
+
+    return {
+        'trend': frame(trend),
+        'seasonal': frame(seasonal),
+        'residual': frame(residual),
+        'zscore': frame(zscore),
+        'median': frame(trend + seasonal),
+        'mad': frame(mad)
+    }
+"""
+    Detect mean shifts in every series of a region x day matrix by binary segmentation
+    
+    Segment costs (within-segment sum of squares) come from prefix sums of the
+    values and their squares, so each round evaluates every candidate split of
+    every series in one vectorized pass. Each round adds, per series, the split
+    with the largest cost reduction if it exceeds penalty * sigma^2 * log(days),
+    where sigma is a robust noise estimate from the series' first differences.
+    Days with no published data (all-NaN columns) are dropped first, so segments,
+    means and differences only span published days.
+    
+    Args:
+        matrix: DataFrame, one row per region and one column per day
+        max_change_points: Maximum number of change points per series
+        min_segment: Minimum number of published days in a segment
+        penalty: Multiplier of the split acceptance threshold
+    
+    Returns:
+        DataFrame with one row per change point: region columns, date (first day
+        of the new regime), mean_before, mean_after, change_pct and strength
+        (cost reduction relative to sigma^2 * log(days))
+"""
+def detect_change_points(matrix, max_change_points=3, min_segment=14, penalty=4.0):
+    matrix = matrix.loc[:, ~matrix.isna().all(axis=0)]
+    values = matrix.to_numpy(dtype=float)
+    n_series, n_days = values.shape
+    rows = np.arange(n_series)[:, None]
+    positions = np.arange(n_days + 1)
+    sums = np.hstack([np.zeros((n_series, 1)), np.cumsum(values, axis=1)])
+    squares = np.hstack([np.zeros((n_series, 1)), np.cumsum(values ** 2, axis=1)])
+
+    def segment_cost(start, end):
+        total = sums[rows, end] - sums[rows, start]
+        return squares[rows, end] - squares[rows, start] - total ** 2 / np.maximum(end - start, 1)
+
+    diffs = np.diff(values, axis=1)
+    mad = np.median(np.abs(diffs - np.median(diffs, axis=1, keepdims=True)), axis=1)
+    scale = np.maximum((mad / 0.6745) ** 2 / 2, 1.0) * np.log(max(n_days, 2))
+
+    boundaries = np.zeros((n_series, n_days + 1), dtype=bool)
+    boundaries[:, [0, n_days]] = True
+    strength = np.zeros((n_series, n_days + 1))
+    candidates = positions[1:n_days]
+    for _ in range(max_change_points):
+        # Segment containing each candidate split: last boundary at or before it, first at or after it
+        left = np.maximum.accumulate(np.where(boundaries, positions, 0), axis=1)[:, 1:n_days]
+        right = np.minimum.accumulate(np.where(boundaries, positions, n_days)[:, ::-1], axis=1)[:, ::-1][:, 1:n_days]
+        gain = segment_cost(left, right) - segment_cost(left, candidates) - segment_cost(candidates, right)
+        valid = (candidates - left >= min_segment) & (right - candidates >= min_segment)
+        gain = np.where(valid, gain, -np.inf)
+        best = np.argmax(gain, axis=1)
+        best_gain = gain[rows[:, 0], best]
+        accept = best_gain > penalty * scale
+        if not accept.any():
+            break
+        boundaries[accept, candidates[best[accept]]] = True
+        strength[accept, candidates[best[accept]]] = best_gain[accept] / scale[accept]
+
+    series, change = np.nonzero(boundaries[:, 1:n_days])
+    change = change + 1
+    left = np.maximum.accumulate(np.where(boundaries, positions, 0), axis=1)
+    right = np.minimum.accumulate(np.where(boundaries, positions, n_days)[:, ::-1], axis=1)[:, ::-1]
+    previous, following = left[series, change - 1], right[series, change + 1]
+    mean_before = (sums[series, change] - sums[series, previous]) / (change - previous)
+    mean_after = (sums[series, following] - sums[series, change]) / (following - change)
+
+    result = matrix.index[series].to_frame(index=False)
+    result['date'] = matrix.columns[change]
+    result['mean_before'] = mean_before
+    result['mean_after'] = mean_after
+    result['change_pct'] = np.where(mean_before != 0, (mean_after - mean_before) / np.where(mean_before != 0, mean_before, 1) * 100, np.nan)
+    result['strength'] = strength[series, change]
+    return result
+"""
+    Initialise the online robust z-score detector from recent history
+    
+    Args:
+        matrix: Region x day matrix of history
+        window: Number of published days kept as the rolling baseline
+    
+    Returns:
+        dict: Detector state holding the last window published days per region
+"""
+def init_robust_detector(matrix, window=28):
+    values = matrix.dropna(axis=1, how='all').values.astype(float)[:, -window:]
+    if values.shape[1] < window:
+        values = np.hstack([np.full((len(matrix), window - values.shape[1]), np.nan), values])
+    return {'index': matrix.index, 'buffer': values, 'last_date': matrix.columns[-1]}
+"""
+    Score one newly ingested day against the rolling baseline and advance the detector
+    
+    Args:
+        state: Detector state from init_robust_detector or a previous update
+        day_values: Series of the day's totals indexed like the detector (missing regions
+            count as 0); an empty or all-NaN Series marks an unpublished day, which
+            leaves the baseline unchanged and raises no alerts
+        date: Date of the new observations
+        threshold: Absolute z-score above which an alert is emitted
+        min_periods: Minimum number of baseline days required to score
+        mad_floor: Lower bound on the MAD
+    
+    Returns:
+        tuple: Updated state and a DataFrame of alerts for the day
+"""
+def update_robust_detector(state, day_values, date, threshold=3.5, min_periods=14, mad_floor=1.0):
+    published = not day_values.isna().all()
+    y = day_values.reindex(state['index'], fill_value=0).fillna(0).values.astype(float)
+    buffer = state['buffer']
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = np.nanmedian(buffer, axis=1)
+        mad = np.maximum(np.nanmedian(np.abs(buffer - median[:, None]), axis=1), mad_floor)
+    enough = np.sum(~np.isnan(buffer), axis=1) >= min_periods
+    zscore = np.where(enough, 0.6745 * (y - median) / mad, np.nan)
+    
+    flagged = published & (np.abs(np.nan_to_num(zscore)) > threshold)
+    alerts = state['index'][flagged].to_frame(index=False)
+    alerts['date'] = date
+    alerts['value'] = y[flagged]
+    alerts['median'] = median[flagged]
+    alerts['mad'] = mad[flagged]
+    alerts['zscore'] = zscore[flagged]
+    alerts['direction'] = np.where(zscore[flagged] > 0, 'Spike', 'Collapse')
+    
+    new_state = {
+        'index': state['index'],
+        'buffer': np.hstack([buffer[:, 1:], y[:, None]]) if published else buffer,
+        'last_date': date
+    }
+    return new_state, alerts
+
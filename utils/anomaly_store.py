@@ -0,0 +1,437 @@
+import os
+import json
+import argparse
+from datetime import datetime, timezone
+import pandas as pd
+import numpy as np
+from utils.data_loader import load_aadhaar_data, get_data_version, build_region_matrix, POSTAL_LEVELS
+from utils.analytics import (
+    build_anomaly_feature_matrix, build_temporal_features, fit_anomaly_scores, apply_anomaly_threshold,
+    rolling_robust_zscores, seasonal_residual_zscores, robust_zscore_alerts, build_peer_table, peer_deviation_scores,
+    detect_change_points,
+    DEFAULT_ANOMALY_FEATURES, TEMPORAL_ANOMALY_FEATURES, PINCODE_MAX_SAMPLES, PEER_BEHAVIOUR_FEATURES
+)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ANOMALY_DIR = os.path.join(BASE_DIR, "data", "anomalies")
+
+# Region levels scored with Isolation Forest on the cross-dataset feature matrix
+REGION_LEVELS = {"State Level": 'state', "District Level": 'district', "Pincode Level": 'pincode'}
+# Levels of the postal (pincode-prefix) hierarchy, scored like the administrative levels; the
+# handful of postal zones is too few for Isolation Forest, so scoring starts at sub-zones
+POSTAL_REGION_LEVELS = {
+    "Postal Sub-zone Level": 'postal_subzone',
+    "Sorting District Level": 'sorting_district'
+}
+# Daily series scored per district: dataset name -> (frame index, value column)
+DAILY_DATASETS = {
+    "Enrolments": (0, 'total_enrolments'),
+    "Demographic Updates": (1, 'total_updates'),
+    "Biometric Updates": (2, 'total_updates')
+}
+DEFAULT_CONTAMINATION = 0.1
+DEFAULT_Z_THRESHOLD = 3.5
+DEFAULT_WINDOW = 28
+DEFAULT_PEER_K = 10
+# Levels scored against their k nearest peers
+PEER_LEVELS = {"District Level": 'district', "Pincode Level": 'pincode'}
+# Levels scanned for regime shifts in their daily series
+TREND_LEVELS = {"State Trend": ['state'], "District Trend": ['state', 'district']}
+# Daily scores below this are not stored; it is the lowest threshold the dashboard offers
+STORED_MIN_ZSCORE = 2.0
+# Columns identifying one scored item; used to diff runs. Snapshot rows are dated with the
+# data's last day, so their date is left out of the key (see _alert_keys)
+ALERT_KEY = ['level', 'dataset', 'detector', 'region', 'date']
+# window: baseline days of the rolling robust z-score; k: peers per region of the peer detector
+TABLE_COLUMNS = [
+    'run_id', 'data_version', 'level', 'dataset', 'detector', 'region', 'state', 'district', 'pincode',
+    'date', 'period', 'window', 'k', 'score', 'is_anomaly', 'direction', 'value', 'expected', 'spread', 'features'
+]
+
+"""
+    Human-readable region key for a frame with state/district/pincode (or postal prefix) columns
+"""
+def _region_key(frame):
+    for column in POSTAL_LEVELS:
+        if column in frame:
+            return frame[column].astype(str)
+    if 'pincode' in frame:
+        return frame['pincode'].astype(str)
+    if 'district' in frame:
+        return frame['district'] + ", " + frame['state']
+    return frame['state']
+"""
+    Score the State, District, Pincode and postal levels with Isolation Forest
+
+    Args:
+        frames: [df, df_demo, df_bio]
+        features: Feature matrix columns to score
+        contamination: Share of regions flagged per level
+
+    Returns:
+        DataFrame in the anomaly table layout with every region's score
+"""
+def score_region_levels(frames, features=DEFAULT_ANOMALY_FEATURES, contamination=DEFAULT_CONTAMINATION):
+    snapshot_date = max(frame['date'].max() for frame in frames)
+    tables = []
+    for level_name, level in {**REGION_LEVELS, **POSTAL_REGION_LEVELS}.items():
+        level_data = build_anomaly_feature_matrix(*frames, level=level)
+        if level == 'pincode':
+            scores = fit_anomaly_scores(level_data, list(features), n_jobs=-1, max_samples=PINCODE_MAX_SAMPLES)
+        else:
+            scores = fit_anomaly_scores(level_data, list(features))
+        scored = apply_anomaly_threshold(level_data, scores, contamination)
+        table = scored.reindex(columns=['state', 'district', 'pincode'])
+        table['level'] = level_name
+        table['dataset'] = "All Datasets"
+        table['detector'] = "Isolation Forest"
+        table['region'] = _region_key(scored)
+        table['date'] = snapshot_date
+        table['period'] = "Snapshot"
+        table['score'] = scored['anomaly_score']
+        table['is_anomaly'] = scored['is_anomaly']
+        table['features'] = [json.dumps(row) for row in scored[list(features)].round(6).to_dict('records')]
+        tables.append(table)
+
+    temporal = build_temporal_features(frames[0])
+    scores = fit_anomaly_scores(temporal, list(TEMPORAL_ANOMALY_FEATURES))
+    scored = apply_anomaly_threshold(temporal, scores, contamination)
+    tables.append(pd.DataFrame({
+        'level': "Temporal (Daily)",
+        'dataset': "Enrolments",
+        'detector': "Isolation Forest",
+        'region': "India",
+        'date': pd.to_datetime(scored['date']),
+        'period': "Day",
+        'score': scored['anomaly_score'],
+        'is_anomaly': scored['is_anomaly'],
+        'value': scored['total_enrolments'].astype(float),
+        'features': [json.dumps(row) for row in scored[list(TEMPORAL_ANOMALY_FEATURES)].round(6).to_dict('records')]
+    }))
+    return pd.concat(tables, ignore_index=True)
+"""
+    Score the District and Pincode levels against their nearest peers
+
+    Args:
+        frames: [df, df_demo, df_bio]
+        k: Number of peers per region
+        contamination: Share of regions flagged per level
+
+    Returns:
+        DataFrame in the anomaly table layout with every region's peer score
+"""
+def score_peer_levels(frames, k=DEFAULT_PEER_K, contamination=DEFAULT_CONTAMINATION):
+    snapshot_date = max(frame['date'].max() for frame in frames)
+    tables = []
+    for level_name, level in PEER_LEVELS.items():
+        level_data = build_anomaly_feature_matrix(*frames, level=level)
+        deviations = peer_deviation_scores(level_data, build_peer_table(level_data, k=k))
+        scored = apply_anomaly_threshold(level_data, deviations['peer_score'], contamination)
+        table = scored.reindex(columns=['state', 'district', 'pincode'])
+        table['level'] = level_name
+        table['dataset'] = "All Datasets"
+        table['detector'] = "Peer kNN"
+        table['region'] = _region_key(scored)
+        table['date'] = snapshot_date
+        table['period'] = "Snapshot"
+        table['score'] = scored['anomaly_score']
+        table['is_anomaly'] = scored['is_anomaly']
+        table['direction'] = deviations['top_deviation']
+        table['k'] = k
+        table['features'] = [
+            json.dumps(row) for row in scored[list(PEER_BEHAVIOUR_FEATURES)].round(6).to_dict('records')
+        ]
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+"""
+    Score every district's daily series of every dataset with both daily detectors
+
+    Args:
+        frames: [df, df_demo, df_bio]
+        window: Baseline window of the rolling robust z-score
+        z_threshold: Absolute z-score above which a district-day is an anomaly
+
+    Returns:
+        DataFrame in the anomaly table layout with every district-day scoring
+        above STORED_MIN_ZSCORE
+"""
+def score_daily_levels(frames, window=DEFAULT_WINDOW, z_threshold=DEFAULT_Z_THRESHOLD):
+    tables = []
+    for dataset, (frame_index, value_col) in DAILY_DATASETS.items():
+        matrix = build_region_matrix(frames[frame_index], value_col, ['state', 'district'], freq='D')
+        for detector, scores in [
+            ("Rolling Robust Z-Score", rolling_robust_zscores(matrix, window=window)),
+            ("Seasonal Decomposition Residual", seasonal_residual_zscores(matrix))
+        ]:
+            alerts = robust_zscore_alerts(matrix, scores, threshold=min(STORED_MIN_ZSCORE, z_threshold))
+            tables.append(pd.DataFrame({
+                'level': "District Daily Shifts",
+                'dataset': dataset,
+                'detector': detector,
+                'region': _region_key(alerts),
+                'state': alerts['state'],
+                'district': alerts['district'],
+                'date': alerts['date'],
+                'period': "Day",
+                'window': window if detector == "Rolling Robust Z-Score" else None,
+                'score': alerts['zscore'],
+                'is_anomaly': alerts['zscore'].abs() > z_threshold,
+                'direction': alerts['direction'],
+                'value': alerts['value'].astype(float),
+                'expected': alerts['median'],
+                'spread': alerts['mad']
+            }))
+    return pd.concat(tables, ignore_index=True)
+"""
+    Detect regime shifts in every state's and district's daily series of every dataset
+
+    Args:
+        frames: [df, df_demo, df_bio]
+
+    Returns:
+        DataFrame in the anomaly table layout with one row per change point
+"""
+def score_change_points(frames):
+    tables = []
+    for dataset, (frame_index, value_col) in DAILY_DATASETS.items():
+        for level_name, region_cols in TREND_LEVELS.items():
+            matrix = build_region_matrix(frames[frame_index], value_col, region_cols, freq='D')
+            shifts = detect_change_points(matrix)
+            tables.append(pd.DataFrame({
+                'level': level_name,
+                'dataset': dataset,
+                'detector': "Binary Segmentation",
+                'region': _region_key(shifts),
+                'state': shifts['state'],
+                'district': shifts.get('district'),
+                'date': shifts['date'],
+                'period': "Day",
+                'score': shifts['strength'],
+                'is_anomaly': True,
+                'direction': pd.Series(shifts['mean_after'] > shifts['mean_before']).map({True: 'Up', False: 'Down'}),
+                'value': shifts['mean_after'],
+                'expected': shifts['mean_before']
+            }))
+    return pd.concat(tables, ignore_index=True)
+"""
+    Score every level and dataset into one anomaly table
+
+    Args:
+        frames: [df, df_demo, df_bio]
+        data_version: Identifier of the data snapshot the frames were loaded from
+        run_id: Identifier of this run (defaults to the current UTC timestamp, to the microsecond)
+        contamination: Share of regions flagged by Isolation Forest
+        z_threshold: Absolute z-score flagged by the daily detectors
+        window: Baseline window of the rolling robust z-score
+        k: Number of peers per region for the peer detector
+
+    Returns:
+        DataFrame with TABLE_COLUMNS
+"""
+def score_all_anomalies(frames, data_version, run_id=None, contamination=DEFAULT_CONTAMINATION,
+                        z_threshold=DEFAULT_Z_THRESHOLD, window=DEFAULT_WINDOW, k=DEFAULT_PEER_K):
+    table = pd.concat([
+        score_region_levels(frames, contamination=contamination),
+        score_peer_levels(frames, k=k, contamination=contamination),
+        score_daily_levels(frames, window=window, z_threshold=z_threshold),
+        score_change_points(frames)
+    ], ignore_index=True)
+    table['run_id'] = run_id or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    table['data_version'] = data_version
+    table['pincode'] = pd.to_numeric(table['pincode'], errors='coerce').astype('Int64')
+    table['window'] = pd.to_numeric(table['window'], errors='coerce').astype('Int64')
+    table['k'] = pd.to_numeric(table['k'], errors='coerce').astype('Int64')
+    table['date'] = pd.to_datetime(table['date'])
+    table['is_anomaly'] = table['is_anomaly'].astype(bool)
+    return table.reindex(columns=TABLE_COLUMNS)
+"""
+    Paths of the stored anomaly runs, oldest first
+"""
+def list_anomaly_runs(anomaly_dir=ANOMALY_DIR):
+    if not os.path.isdir(anomaly_dir):
+        return []
+    return sorted(
+        os.path.join(anomaly_dir, name) for name in os.listdir(anomaly_dir)
+        if name.startswith("anomalies_") and name.endswith(".parquet")
+    )
+"""
+    Load a stored anomaly table
+
+    Args:
+        path: Parquet file to read (defaults to the latest run)
+        anomaly_dir: Directory searched for the latest run
+
+    Returns:
+        DataFrame with TABLE_COLUMNS (columns added since the run was written are
+        empty), or None if no run has been stored
+"""
+def load_anomaly_table(path=None, anomaly_dir=ANOMALY_DIR):
+    if path is None:
+        runs = list_anomaly_runs(anomaly_dir)
+        if not runs:
+            return None
+        path = runs[-1]
+    return pd.read_parquet(path).reindex(columns=TABLE_COLUMNS)
+"""
+    Path of the new-alerts report written alongside a stored run
+"""
+def new_alerts_path(run_path):
+    return run_path.replace("anomalies_", "new_alerts_").replace(".parquet", ".csv")
+"""
+    Stored snapshot scores for one level, aligned to that level's feature rows
+
+    Args:
+        table: Stored anomaly table
+        level: Level name, e.g. "District Level" or "Temporal (Daily)"
+        level_data: Feature rows of the level (region columns, or 'date' for the temporal level)
+        detector: "Isolation Forest" or "Peer kNN"
+        column: Stored column to read (e.g. 'direction' for the peer detector's top deviation)
+
+    Returns:
+        Series of the column indexed like level_data; rows absent from the run are dropped
+"""
+def stored_level_scores(table, level, level_data, detector="Isolation Forest", column='score'):
+    stored = table[(table['level'] == level) & (table['detector'] == detector)]
+    if level == "Temporal (Daily)":
+        keys = pd.to_datetime(level_data['date'])
+        lookup = stored.set_index('date')[column]
+    else:
+        keys = _region_key(level_data)
+        lookup = stored.set_index('region')[column]
+    return pd.Series(keys.map(lookup).values, index=level_data.index).dropna()
+"""
+    Stored district-day alerts in the layout of robust_zscore_alerts
+
+    Args:
+        table: Stored anomaly table
+        dataset: Daily dataset name
+        detector: Daily detector name
+        threshold: Absolute z-score above which a district-day is returned
+
+    Returns:
+        DataFrame with state, district, date, value, median, mad, zscore and direction
+"""
+def stored_daily_alerts(table, dataset, detector, threshold):
+    stored = table[
+        (table['level'] == "District Daily Shifts") & (table['dataset'] == dataset) &
+        (table['detector'] == detector) & (table['score'].abs() > threshold)
+    ]
+    return pd.DataFrame({
+        'state': stored['state'],
+        'district': stored['district'],
+        'date': stored['date'],
+        'value': stored['value'],
+        'median': stored['expected'],
+        'mad': stored['spread'],
+        'zscore': stored['score'],
+        'direction': stored['direction']
+    }).reset_index(drop=True)
+"""
+    Stored regime shifts in the layout of detect_change_points
+
+    Args:
+        table: Stored anomaly table
+        dataset: Daily dataset name
+        level: Key of TREND_LEVELS
+
+    Returns:
+        DataFrame with the level's region columns, date, mean_before, mean_after, change_pct and strength
+"""
+def stored_change_points(table, dataset, level):
+    stored = table[
+        (table['level'] == level) & (table['dataset'] == dataset) & (table['detector'] == "Binary Segmentation")
+    ]
+    mean_before = stored['expected'].to_numpy(dtype=float)
+    mean_after = stored['value'].to_numpy(dtype=float)
+    shifts = stored[TREND_LEVELS[level]].assign(
+        date=stored['date'],
+        mean_before=mean_before,
+        mean_after=mean_after,
+        change_pct=np.where(mean_before != 0, (mean_after - mean_before) / np.where(mean_before != 0, mean_before, 1) * 100, np.nan),
+        strength=stored['score']
+    )
+    return shifts.reset_index(drop=True)
+"""
+    ALERT_KEY columns of a table, with the date blanked on snapshot rows
+
+    A snapshot score's date is the data's last day, which moves with every
+    refresh; blanking it keeps an alert that persists across refreshes known.
+"""
+def _alert_keys(table):
+    keys = table[ALERT_KEY].copy()
+    keys.loc[table['period'] == "Snapshot", 'date'] = pd.NaT
+    return keys
+"""
+    Alerts in the current run that were not alerts in the previous run
+
+    Args:
+        current: Anomaly table of the current run
+        previous: Anomaly table of the previous run, or None
+
+    Returns:
+        DataFrame of the current run's anomalies whose ALERT_KEY is new
+"""
+def diff_new_alerts(current, previous):
+    flagged = current[current['is_anomaly']]
+    if previous is None:
+        return flagged.reset_index(drop=True)
+    known = _alert_keys(previous[previous['is_anomaly']]).drop_duplicates()
+    merged = _alert_keys(flagged).merge(known, on=ALERT_KEY, how='left', indicator=True)
+    return flagged[(merged['_merge'] == 'left_only').to_numpy()].reset_index(drop=True)
+"""
+    Score the current data, store the anomaly table and report new alerts
+
+    Writes anomalies_<run_id>.parquet and new_alerts_<run_id>.csv to anomaly_dir
+    and removes all but the newest keep runs.
+
+    Args:
+        anomaly_dir: Output directory
+        keep: Number of runs retained
+        **kwargs: Passed to score_all_anomalies
+
+    Returns:
+        tuple: (anomaly table, new alerts)
+"""
+def run_anomaly_job(anomaly_dir=ANOMALY_DIR, keep=10, **kwargs):
+    os.makedirs(anomaly_dir, exist_ok=True)
+    previous = load_anomaly_table(anomaly_dir=anomaly_dir)
+    table = score_all_anomalies(load_aadhaar_data(), get_data_version(), **kwargs)
+    run_id = table['run_id'].iloc[0]
+    table.to_parquet(os.path.join(anomaly_dir, f"anomalies_{run_id}.parquet"), index=False)
+
+    new_alerts = diff_new_alerts(table, previous)
+    new_alerts.drop(columns=['features']).to_csv(
+        os.path.join(anomaly_dir, f"new_alerts_{run_id}.csv"), index=False
+    )
+    for path in list_anomaly_runs(anomaly_dir)[:-keep]:
+        os.remove(path)
+        report = new_alerts_path(path)
+        if os.path.exists(report):
+            os.remove(report)
+    return table, new_alerts
+
+def main():
+    parser = argparse.ArgumentParser(description="Score Aadhaar data for anomalies and report new alerts")
+    parser.add_argument("--output-dir", default=ANOMALY_DIR, help="Directory for stored runs and reports")
+    parser.add_argument("--contamination", type=float, default=DEFAULT_CONTAMINATION,
+                        help="Share of regions flagged by Isolation Forest")
+    parser.add_argument("--z-threshold", type=float, default=DEFAULT_Z_THRESHOLD,
+                        help="Absolute z-score flagged by the daily detectors")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW,
+                        help="Baseline window (days) of the rolling robust z-score")
+    parser.add_argument("--peers", type=int, default=DEFAULT_PEER_K, help="Peers per region for the peer detector")
+    parser.add_argument("--keep", type=int, default=10, help="Number of runs retained")
+    args = parser.parse_args()
+
+    table, new_alerts = run_anomaly_job(
+        args.output_dir, keep=args.keep, contamination=args.contamination,
+        z_threshold=args.z_threshold, window=args.window, k=args.peers
+    )
+    print(f"Run {table['run_id'].iloc[0]}: {len(table):,} scores, {int(table['is_anomaly'].sum()):,} anomalies, "
+          f"{len(new_alerts):,} new alerts")
+    if len(new_alerts) > 0:
+        summary = new_alerts.groupby(['level', 'dataset', 'detector']).size().rename('new_alerts')
+        print(summary.to_string())
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,259 @@
 import os
+import hashlib
+import numpy as np
 import pandas as pd
+from scipy import sparse
 import streamlit as st
+from utils.analytics import summarize_values, merge_summaries
 
-@st.cache_data(show_spinner="Loading Aadhaar dataset...")
-def load_aadhaar_data():
+"""
+    Identify the current data snapshot
+    
+    Returns:
+        str: Hash of the names, sizes and modification times of the CSV files in data/
+"""
+def get_data_version():
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     data_dir = os.path.join(base_dir, "data")
+    digest = hashlib.md5()
+    for name in sorted(os.listdir(data_dir)):
+        if name.endswith(".csv"):
+            info = os.stat(os.path.join(data_dir, name))
+            digest.update(f"{name}:{info.st_size}:{info.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+# Source CSV shards of each dataset
+DATASET_SHARDS = {
+    'enrolment': [
+        "api_data_aadhar_enrolment_0_500000.csv",
+        "api_data_aadhar_enrolment_500000_1000000.csv",
+        "api_data_aadhar_enrolment_1000000_1006029.csv"
+    ],
+    'demographic': [
+        "api_data_aadhar_demographic_0_500000.csv",
+        "api_data_aadhar_demographic_500000_1000000.csv",
+        "api_data_aadhar_demographic_1000000_1500000.csv",
+        "api_data_aadhar_demographic_1500000_2000000.csv",
+        "api_data_aadhar_demographic_2000000_2071700.csv"
+    ],
+    'biometric': [
+        "api_data_aadhar_biometric_0_500000.csv",
+        "api_data_aadhar_biometric_500000_1000000.csv",
+        "api_data_aadhar_biometric_1000000_1500000.csv",
+        "api_data_aadhar_biometric_1500000_1861108.csv"
+    ]
+}
+# Count columns of each dataset, checked for negative values
+DATASET_COUNT_COLUMNS = {
+    'enrolment': ['age_0_5', 'age_5_17', 'age_18_greater'],
+    'demographic': ['demo_age_5_17', 'demo_age_17_'],
+    'biometric': ['bio_age_5_17', 'bio_age_17_']
+}
+# Record-level column of each dataset summarised shard by shard while loading
+RECORD_SUMMARY_COLUMNS = {
+    'enrolment': 'total_enrolments',
+    'demographic': 'total_updates',
+    'biometric': 'total_updates'
+}
+# Per-row issue counts reported for each shard
+QUALITY_CHECKS = [
+    'duplicate_rows', 'missing_values', 'invalid_dates', 'negative_counts',
+    'invalid_pincodes', 'placeholder_states', 'unknown_districts'
+]
+
+# Known boundary and renaming fix-ups applied to every dataset:
+# (state, districts, column to set, new value) for rows in that state and those districts
+REGION_FIXES = [
+    ('Chandigarh', ['Rupnagar'], 'state', 'Punjab'),
+    ('Jammu And Kashmir', ['Kargil', 'Leh'], 'state', 'Ladakh'),
+    ('Meghalaya', ['Kamrup'], 'state', 'Assam'),
+    ('Sikkim', ['East'], 'district', 'Gangtok'),
+    ('Sikkim', ['West'], 'district', 'Gyalshing'),
+    ('Sikkim', ['North'], 'district', 'Mangan'),
+    ('Sikkim', ['South'], 'district', 'Namchi')
+]
+# Postal hierarchy derived from pincode prefixes: level column -> divisor.
+# The first digit is the postal zone, two digits the sub-zone and three the sorting district
+POSTAL_LEVELS = {
+    'postal_zone': 100000,
+    'postal_subzone': 10000,
+    'sorting_district': 1000
+}
+# Share of a pincode's rows its majority region must hold before other rows are reassigned
+PINCODE_MASTER_MIN_SHARE = 0.8
+
+"""
+    Normalize the case, spacing and ampersands of state or district names
+"""
+def _normalize_region_names(names):
+    return (
+        names
+        .astype(str)
+        .str.strip()
+        .str.lower()
+        .str.title()
+        .str.replace("&", "And")
+    )
+"""
+    Derive the majority (state, district) of every pincode across datasets
+    
+    Args:
+        frames: List of DataFrames with pincode, state and district columns
+        min_share: Minimum share of a pincode's rows held by its majority region
+            for the pincode to be used for reassignment
+    
+    Returns:
+        DataFrame indexed by pincode with state, district, rows (all rows seen for
+        the pincode), share (held by the majority region) and resolved (share >= min_share)
+"""
+def build_pincode_master(frames, min_share=PINCODE_MASTER_MIN_SHARE):
+    regions = pd.concat([frame[['pincode', 'state', 'district']] for frame in frames], ignore_index=True)
+    votes = regions.groupby(['pincode', 'state', 'district']).size().rename('votes').reset_index()
+    votes = votes.sort_values(['pincode', 'votes'], ascending=[True, False])
+    master = votes.drop_duplicates('pincode').set_index('pincode')
+    master['rows'] = votes.groupby('pincode')['votes'].sum()
+    master['share'] = master['votes'] / master['rows']
+    master['resolved'] = master['share'] >= min_share
+    return master.drop(columns='votes')
+"""
+    Reassign rows whose region disagrees with their pincode's majority region
+    
+    Args:
+        frames: dict of dataset name -> DataFrame
+        master: Output of build_pincode_master
+    
+    Returns:
+        tuple: (dict of repaired DataFrames, change log with one row per dataset,
+        pincode and (from, to) region pair and the number of rows changed)
+"""
+def reconcile_pincode_regions(frames, master):
+    resolved = master[master['resolved']]
+    repaired, changes = {}, []
+    for dataset, frame in frames.items():
+        frame = frame.copy()
+        master_state = frame['pincode'].map(resolved['state'])
+        master_district = frame['pincode'].map(resolved['district'])
+        changed = master_state.notna() & (
+            (frame['state'] != master_state) | (frame['district'] != master_district)
+        )
+        if changed.any():
+            log = pd.DataFrame({
+                'dataset': dataset,
+                'pincode': frame.loc[changed, 'pincode'],
+                'from_state': frame.loc[changed, 'state'],
+                'from_district': frame.loc[changed, 'district'],
+                'to_state': master_state[changed],
+                'to_district': master_district[changed]
+            })
+            changes.append(log.groupby(list(log.columns)).size().rename('rows').reset_index())
+            frame.loc[changed, 'state'] = master_state[changed]
+            frame.loc[changed, 'district'] = master_district[changed]
+        repaired[dataset] = frame
+    columns = ['dataset', 'pincode', 'from_state', 'from_district', 'to_state', 'to_district', 'rows']
+    change_log = pd.concat(changes, ignore_index=True) if changes else pd.DataFrame(columns=columns)
+    return repaired, change_log
+
+"""
+    Rows whose (state, district) the pincode master does not confirm
+    
+    A pair is confirmed when it is the majority region of at least one resolved
+    pincode, so misspelt, placeholder or retired district names that no pincode
+    backs are flagged even when they look like names.
+    
+    Args:
+        frame: Cleaned DataFrame with state and district columns
+        master: Output of build_pincode_master
+    
+    Returns:
+        Boolean array, True for rows in an unconfirmed district
+"""
+def unconfirmed_districts(frame, master):
+    confirmed = pd.MultiIndex.from_frame(master.loc[master['resolved'], ['state', 'district']])
+    return ~pd.MultiIndex.from_frame(frame[['state', 'district']]).isin(confirmed)
 
-    #Loading Aadhaar Enrolment, Demographic and Biometric Data
-    df1 = pd.read_csv(os.path.join(data_dir, "api_data_aadhar_enrolment_0_500000.csv"))
-    df2 = pd.read_csv(os.path.join(data_dir, "api_data_aadhar_enrolment_500000_1000000.csv"))
-    df3 = pd.read_csv(os.path.join(data_dir, "api_data_aadhar_enrolment_1000000_1006029.csv"))
-    df = pd.concat([df1, df2, df3])
+"""
+    Profile one raw CSV shard for data-quality issues
     
-    df_demo1 = pd.read_csv(os.path.join(data_dir, "api_data_aadhar_demographic_0_500000.csv"))
-    df_demo2 = pd.read_csv(os.path.join(data_dir, "api_data_aadhar_demographic_500000_1000000.csv"))
-    df_demo3 = pd.read_csv(os.path.join(data_dir, "api_data_aadhar_demographic_1000000_1500000.csv"))
-    df_demo4 = pd.read_csv(os.path.join(data_dir, "api_data_aadhar_demographic_1500000_2000000.csv"))
-    df_demo5 = pd.read_csv(os.path.join(data_dir, "api_data_aadhar_demographic_2000000_2071700.csv"))
-    df_demo = pd.concat([df_demo1, df_demo2, df_demo3, df_demo4, df_demo5])
+    Every check is a vectorized pass over the shard, so profiling is linear in rows.
+    Duplicate rows (across the whole dataset) and unknown districts (against the
+    pincode master of the cleaned data) are counted by load_aadhaar_snapshot.
     
-    df_bio1 = pd.read_csv(os.path.join(data_dir, "api_data_aadhar_biometric_0_500000.csv"))
-    df_bio2 = pd.read_csv(os.path.join(data_dir, "api_data_aadhar_biometric_500000_1000000.csv"))
-    df_bio3 = pd.read_csv(os.path.join(data_dir, "api_data_aadhar_biometric_1000000_1500000.csv"))
-    df_bio4 = pd.read_csv(os.path.join(data_dir, "api_data_aadhar_biometric_1500000_1861108.csv"))
-    df_bio = pd.concat([df_bio1, df_bio2, df_bio3, df_bio4])
+    Args:
+        shard: DataFrame as read from the CSV
+        dataset: 'enrolment', 'demographic' or 'biometric'
+        shard_name: File name of the shard
+    
+    Returns:
+        dict: Row count, QUALITY_CHECKS counts (rows affected, or cells for
+        missing_values), date range and number of calendar days missing inside it
+"""
+def profile_shard(shard, dataset, shard_name):
+    dates = pd.to_datetime(shard['date'], format="%d-%m-%Y", errors='coerce')
+    pincode = pd.to_numeric(shard['pincode'], errors='coerce')
+    state = shard['state'].astype(str).str.strip()
+    observed_days = dates.dropna().dt.normalize().unique()
+    span_days = (dates.max() - dates.min()).days + 1 if len(observed_days) else 0
+    return {
+        'dataset': dataset,
+        'shard': shard_name,
+        'rows': len(shard),
+        'duplicate_rows': 0,
+        'missing_values': int(shard.isna().sum().sum()),
+        'invalid_dates': int(dates.isna().sum()),
+        'negative_counts': int((shard[DATASET_COUNT_COLUMNS[dataset]] < 0).any(axis=1).sum()),
+        'invalid_pincodes': int((~pincode.between(110000, 999999) | (pincode % 1 != 0)).sum()),
+        'placeholder_states': int(state.str.fullmatch(r"\d+").sum()),
+        'unknown_districts': 0,
+        'first_date': dates.min(),
+        'last_date': dates.max(),
+        'missing_dates': span_days - len(observed_days)
+    }
+
+"""
+    Read, profile and clean every CSV shard of one data snapshot
+    
+    Args:
+        data_version: Output of get_data_version, the cache key, so the frames
+            are reloaded whenever the CSV files change
+    
+    Returns:
+        dict: 'frames' ([df, df_demo, df_bio]), 'quality' (see load_quality_report)
+        and 'record_summaries' (see load_record_summaries)
+"""
+@st.cache_data(show_spinner="Loading Aadhaar dataset...", max_entries=1)
+def load_aadhaar_snapshot(data_version):
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    data_dir = os.path.join(base_dir, "data")
+
+    #Loading Aadhaar Enrolment, Demographic and Biometric Data, profiling each shard as it is read
+    frames, shard_reports, dataset_reports, reports_by_dataset = {}, [], [], {}
+    for dataset, shard_names in DATASET_SHARDS.items():
+        shards = [pd.read_csv(os.path.join(data_dir, name)) for name in shard_names]
+        reports = [profile_shard(shard, dataset, name) for shard, name in zip(shards, shard_names)]
+        frame = pd.concat(shards)
+
+        # Duplicates across shards are attributed to the shard holding the later copy
+        shard_codes = np.repeat(np.arange(len(shards)), [len(shard) for shard in shards])
+        duplicates = np.bincount(shard_codes, weights=frame.duplicated().to_numpy(), minlength=len(shards))
+        for report, count in zip(reports, duplicates):
+            report['duplicate_rows'] = int(count)
+        frame['source_shard'] = shard_codes
+
+        dates = pd.to_datetime(frame['date'], format="%d-%m-%Y", errors='coerce')
+        observed_days = dates.dropna().dt.normalize().nunique()
+        dataset_report = {'dataset': dataset, 'shards': len(shards), 'rows': len(frame)}
+        dataset_report.update({check: sum(report[check] for report in reports) for check in QUALITY_CHECKS})
+        dataset_report.update({
+            'first_date': dates.min(),
+            'last_date': dates.max(),
+            'missing_dates': (dates.max() - dates.min()).days + 1 - observed_days if observed_days else 0
+        })
+        frames[dataset] = frame
+        reports_by_dataset[dataset] = reports
+        shard_reports.extend(reports)
+        dataset_reports.append(dataset_report)
+
+    df, df_demo, df_bio = frames['enrolment'], frames['demographic'], frames['biometric']
 
     # Standardizing Date Format and Creating Additional Columns
     df['date'] = pd.to_datetime(df['date'], format = "%d-%m-%Y")
@@ -259,166 +488,171 @@ def load_aadhaar_data():
         "Leh (Ladakh)" : "Leh"
     }
 
-    df['state'] = (
-        df['state']
-        .astype(str)
-        .str.strip()
-        .str.lower()
-        .str.title()
-        .str.replace("&", "And")
-    )
-    df['district'] = (
-        df['district']
-        .astype(str)
-        .str.strip()
-        .str.lower()
-        .str.title()
-        .str.replace("&", "And")
-        .str.replace(" *", "")
-    )
-    df['state'] = df['state'].replace(state_map)
-    df = df[df['state'] != "100000"]
-    df['district'] = df['district'].replace(district_map)
+    frames = {'enrolment': df, 'demographic': df_demo, 'biometric': df_bio}
+    for dataset, frame in frames.items():
+        frame['state'] = _normalize_region_names(frame['state'])
+        frame['district'] = _normalize_region_names(frame['district']).str.replace(" *", "")
+        frame['state'] = frame['state'].replace(state_map)
+        frame = frame[frame['state'] != "100000"].copy()
+        frame['district'] = frame['district'].replace(district_map)
+        for state, districts, column, value in REGION_FIXES:
+            frame.loc[(frame['state'] == state) & (frame['district'].isin(districts)), column] = value
+        frames[dataset] = frame
+
+    # Remaining misattributions are repaired against the majority region of each pincode
+    pincode_master = build_pincode_master(list(frames.values()))
+    frames, region_changes = reconcile_pincode_regions(frames, pincode_master)
+    # Districts are checked after repair, so only rows no confirmed pincode region covers remain.
+    # Record-level summaries are taken per shard on the cleaned rows and merged pairwise
+    record_summaries = []
+    for (dataset, frame), dataset_report in zip(frames.items(), dataset_reports):
+        reports = reports_by_dataset[dataset]
+        shard_values = frame[RECORD_SUMMARY_COLUMNS[dataset]].groupby(frame['source_shard'])
+        summary = summarize_values([])
+        for _, values in shard_values:
+            summary = merge_summaries(summary, summarize_values(values))
+        record_summaries.append(summary)
+        unknown = np.bincount(
+            frame['source_shard'], weights=unconfirmed_districts(frame, pincode_master), minlength=len(reports)
+        )
+        for report, count in zip(reports, unknown):
+            report['unknown_districts'] = int(count)
+        dataset_report['unknown_districts'] = int(unknown.sum())
+        frame.drop(columns='source_shard', inplace=True)
+    for frame in frames.values():
+        pincode = frame['pincode'].to_numpy()
+        for column, divisor in POSTAL_LEVELS.items():
+            frame[column] = pincode // divisor
+    df, df_demo, df_bio = frames['enrolment'], frames['demographic'], frames['biometric']
+    quality = {
+        'shards': pd.DataFrame(shard_reports),
+        'datasets': pd.DataFrame(dataset_reports),
+        'region_changes': region_changes
+    }
+    return {'frames': [df, df_demo, df_bio], 'quality': quality, 'record_summaries': record_summaries}
 
+"""
+    Load the cleaned enrolment, demographic and biometric DataFrames
     
+    Returns:
+        list: [df, df_demo, df_bio]
+"""
+def load_aadhaar_data():
+    return load_aadhaar_snapshot(get_data_version())['frames']
 
-    df_demo['state'] = (
-        df_demo['state']
-        .astype(str)
-        .str.strip()
-        .str.lower()
-        .str.title()
-        .str.replace("&", "And")
-    )
-    df_demo['district'] = (
-        df_demo['district']
-        .astype(str)
-        .str.strip()
-        .str.lower()
-        .str.title()
-        .str.replace("&", "And")
-        .str.replace(" *", "")
-    )
-    df_demo['state'] = df_demo['state'].replace(state_map)
-    df_demo = df_demo[df_demo['state'] != "100000"]
-    df_demo['district'] = df_demo['district'].replace(district_map)
+"""
+    Data-quality report produced while the current snapshot was loaded
+    
+    Returns:
+        dict: 'shards' (one row per CSV shard) and 'datasets' (one row per dataset)
+        DataFrames of issue counts, date ranges and missing calendar days
+"""
+def load_quality_report():
+    return load_aadhaar_snapshot(get_data_version())['quality']
 
-    df_bio['state'] = (
-        df_bio['state']
-        .astype(str)
-        .str.strip()
-        .str.lower()
-        .str.title()
-        .str.replace("&", "And")
-    )
-    df_bio['district'] = (
-        df_bio['district']
-        .astype(str)
-        .str.strip()
-        .str.lower()
-        .str.title()
-        .str.replace("&", "And")
-        .str.replace(" *", "")
-    )
-    df_bio['state'] = df_bio['state'].replace(state_map)
-    df_bio = df_bio[df_bio['state'] != "100000"]
-    df_bio['district'] = df_bio['district'].replace(district_map)
-   
+"""
+    Summaries of every record's total, merged across the shards of the current snapshot
+    
+    Returns:
+        list: [enrolment, demographic, biometric] summaries as from
+        utils.analytics.summarize_values
+"""
+def load_record_summaries():
+    return load_aadhaar_snapshot(get_data_version())['record_summaries']
 
-    df.loc[
-        (df['state'] == 'Chandigarh') & (df['district'] == 'Rupnagar'),
-        'state'
-    ] = 'Punjab'
-    df.loc[
-        (df['state'] == 'Jammu And Kashmir') & (df['district'].isin(['Kargil', 'Leh'])),
-        'state'
-    ] = 'Ladakh'
-    df.loc[
-        (df['state'] == 'Meghalaya') & (df['district'] == 'Kamrup'),
-        'state'
-    ] = 'Assam'
-    df.loc[
-        (df['state'] == 'Sikkim') & (df['district'] == 'East'),
-        'district'
-    ] = 'Gangtok'
-    df.loc[
-        (df['state'] == 'Sikkim') & (df['district'] == 'West'),
-        'district'
-    ] = 'Gyalshing'
-    df.loc[
-        (df['state'] == 'Sikkim') & (df['district'] == 'North'),
-        'district'
-    ] = 'Mangan'
-    df.loc[
-        (df['state'] == 'Sikkim') & (df['district'] == 'South'),
-        'district'
-    ] = 'Namchi'
+"""
+    Roll every dataset up to one level of the postal (pincode-prefix) hierarchy
     
+    Postal areas cross state and district boundaries, so each row also records
+    how many states, districts and pincodes the area spans.
     
+    Args:
+        frames: [df, df_demo, df_bio] with the POSTAL_LEVELS columns
+        level: One of the POSTAL_LEVELS columns
     
+    Returns:
+        DataFrame indexed by prefix with total_enrolments, demo_updates,
+        bio_updates, pincodes, districts, states and state_names
+"""
+def build_postal_rollup(frames, level):
+    df, df_demo, df_bio = frames
+    totals = pd.concat([
+        df.groupby(level)['total_enrolments'].sum(),
+        df_demo.groupby(level)['total_updates'].sum().rename('demo_updates'),
+        df_bio.groupby(level)['total_updates'].sum().rename('bio_updates')
+    ], axis=1).fillna(0)
+    places = pd.concat([frame[[level, 'pincode', 'state', 'district']] for frame in frames]).drop_duplicates()
+    spans = places.groupby(level).agg(
+        pincodes=('pincode', 'nunique'),
+        states=('state', 'nunique'),
+        state_names=('state', lambda names: ", ".join(sorted(names.unique())))
+    )
+    # District names repeat across states, so districts are counted as (state, district) pairs
+    spans.insert(1, 'districts', places.drop_duplicates([level, 'state', 'district']).groupby(level).size())
+    rollup = totals.join(spans)
+    rollup.index.name = level
+    return rollup
 
+"""
+    Pivot a dataset into a region x period matrix of totals
     
-
-    df_demo.loc[
-        (df_demo['state'] == 'Chandigarh') & (df_demo['district'] == 'Rupnagar'),
-        'state'
-    ] = 'Punjab'
-    df_demo.loc[
-        (df_demo['state'] == 'Jammu And Kashmir') & (df_demo['district'].isin(['Kargil', 'Leh'])),
-        'state'
-    ] = 'Ladakh'
-    df_demo.loc[
-        (df_demo['state'] == 'Meghalaya') & (df_demo['district'] == 'Kamrup'),
-        'state'
-    ] = 'Assam'
-    df_demo.loc[
-        (df_demo['state'] == 'Sikkim') & (df_demo['district'] == 'East'),
-        'district'
-    ] = 'Gangtok'
-    df_demo.loc[
-        (df_demo['state'] == 'Sikkim') & (df_demo['district'] == 'West'),
-        'district'
-    ] = 'Gyalshing'
-    df_demo.loc[
-        (df_demo['state'] == 'Sikkim') & (df_demo['district'] == 'North'),
-        'district'
-    ] = 'Mangan'
-    df_demo.loc[
-        (df_demo['state'] == 'Sikkim') & (df_demo['district'] == 'South'),
-        'district'
-    ] = 'Namchi'
+    Args:
+        data: DataFrame with a 'date' column
+        value_col: Column to aggregate
+        region_cols: Columns identifying a region (None for a single national series)
+        freq: 'D' for daily or 'M' for monthly periods
+        fill_value: Value of a region with no records in a published period
     
+    Returns:
+        DataFrame with one row per region and one column per period (period start
+        timestamps). A region with no records in a published period holds fill_value;
+        periods with no records anywhere in the dataset (publication gaps) are NaN
+"""
+def build_region_matrix(data, value_col, region_cols=None, freq='D', fill_value=0):
+    if freq == 'M':
+        period = data['date'].dt.to_period('M').dt.to_timestamp()
+        full_range = pd.date_range(period.min(), period.max(), freq='MS')
+    else:
+        period = data['date'].dt.normalize()
+        full_range = pd.date_range(period.min(), period.max(), freq='D')
+    if region_cols:
+        keys = [data[col] for col in region_cols] + [period.rename('period')]
+        matrix = data[value_col].groupby(keys).sum().unstack('period', fill_value=fill_value)
+    else:
+        matrix = data[value_col].groupby(period.rename('period')).sum().to_frame('India').T
+    matrix = matrix.reindex(columns=full_range)
+    matrix.columns.name = 'period'
+    return matrix.astype(float)
 
+"""
+    Build a sparse region x period matrix of totals
     
+    Suited to fine-grained regions such as pincodes, where most region/period
+    cells have no records. Only periods with records somewhere in the dataset
+    become columns, so publication gaps are not read as periods without demand.
     
-
-    df_bio.loc[
-        (df_bio['state'] == 'Chandigarh') & (df_bio['district'] == 'Rupnagar'),
-        'state'
-    ] = 'Punjab'
-    df_bio.loc[
-        (df_bio['state'] == 'Jammu And Kashmir') & (df_bio['district'].isin(['Kargil', 'Leh'])),
-        'state'
-    ] = 'Ladakh'
-    df_bio.loc[
-        (df_bio['state'] == 'Meghalaya') & (df_bio['district'] == 'Kamrup'),
-        'state'
-    ] = 'Assam'
-    df_bio.loc[
-        (df_bio['state'] == 'Sikkim') & (df_bio['district'] == 'East'),
-        'district'
-    ] = 'Gangtok'
-    df_bio.loc[
-        (df_bio['state'] == 'Sikkim') & (df_bio['district'] == 'West'),
-        'district'
-    ] = 'Gyalshing'
-    df_bio.loc[
-        (df_bio['state'] == 'Sikkim') & (df_bio['district'] == 'North'),
-        'district'
-    ] = 'Mangan'
-    df_bio.loc[
-        (df_bio['state'] == 'Sikkim') & (df_bio['district'] == 'South'),
-        'district'
-    ] = 'Namchi'
-    return [df, df_demo, df_bio]
+    Args:
+        data: DataFrame with a 'date' column
+        value_col: Column to aggregate
+        region_col: Column identifying a region
+        freq: 'D' for daily or 'M' for monthly periods
+    
+    Returns:
+        dict: 'matrix' (scipy.sparse CSR, regions x periods), 'regions' (Index of row
+        labels) and 'periods' (DatetimeIndex of the published period starts)
+"""
+def build_sparse_region_matrix(data, value_col, region_col='pincode', freq='D'):
+    if freq == 'M':
+        period = data['date'].dt.to_period('M').dt.to_timestamp()
+    else:
+        period = data['date'].dt.normalize()
+    periods = pd.DatetimeIndex(period.dropna().unique()).sort_values()
+    region_codes, regions = pd.factorize(data[region_col], sort=True)
+    period_codes = periods.get_indexer(period)
+    matrix = sparse.coo_matrix(
+        (data[value_col].values.astype(float), (region_codes, period_codes)),
+        shape=(len(regions), len(periods))
+    ).tocsr()
+    matrix.sum_duplicates()
+    return {'matrix': matrix, 'regions': pd.Index(regions, name=region_col), 'periods': periods}
 
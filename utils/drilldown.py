@@ -0,0 +1,151 @@
+import streamlit as st
+import altair as alt
+import numpy as np
+from utils.data_loader import load_aadhaar_data, build_region_matrix, build_postal_rollup
+from utils.analytics import detect_change_points, peer_percentile_bands, DATASET_VALUE_COLUMNS
+
+# Region columns of the drilldown levels
+DRILLDOWN_LEVEL_COLUMNS = {'state': ['state'], 'district': ['state', 'district']}
+# Index level whose regions are peers of each other (None: every state is a peer)
+PEER_GROUP_LEVELS = {'state': None, 'district': 'state'}
+
+"""
+    Format a concentration metric, or 'n/a' for a region the dataset has no activity in
+
+    Args:
+        value: Index value (NaN when the region is missing from the concentration table)
+        spec: Format spec, e.g. '.3f'
+        scale: Multiplier applied before formatting (100 for percentages)
+        suffix: Text appended to the formatted value
+"""
+def format_concentration(value, spec, scale=1, suffix=''):
+    if np.isnan(value):
+        return 'n/a'
+    return f"{value * scale:{spec}}{suffix}"
+
+"""
+    Regime shifts in every region's daily series of one dataset
+
+    Args:
+        dataset: Key of DATASET_VALUE_COLUMNS
+        level: Key of DRILLDOWN_LEVEL_COLUMNS
+        data_version: Data snapshot identifier, part of the cache key
+
+    Returns:
+        DataFrame: Output of detect_change_points
+"""
+@st.cache_data(show_spinner="Detecting regime shifts...")
+def load_change_points(dataset, level, data_version):
+    frame_index, value_col = DATASET_VALUE_COLUMNS[dataset]
+    matrix = build_region_matrix(load_aadhaar_data()[frame_index], value_col, DRILLDOWN_LEVEL_COLUMNS[level], freq='D')
+    return detect_change_points(matrix)
+
+"""
+    Monthly percentile bands of one dataset across peer regions
+
+    Region-months without records are left out of the bands rather than
+    counted as zero, so regions that start or stop reporting do not drag
+    the lower percentiles down.
+
+    Args:
+        dataset: Key of DATASET_VALUE_COLUMNS
+        level: Key of DRILLDOWN_LEVEL_COLUMNS
+        data_version: Data snapshot identifier, part of the cache key
+
+    Returns:
+        DataFrame: Output of peer_percentile_bands
+"""
+@st.cache_data(show_spinner="Computing peer percentile bands...")
+def load_peer_bands(dataset, level, data_version):
+    frame_index, value_col = DATASET_VALUE_COLUMNS[dataset]
+    matrix = build_region_matrix(
+        load_aadhaar_data()[frame_index], value_col, DRILLDOWN_LEVEL_COLUMNS[level], freq='M', fill_value=np.nan
+    )
+    return peer_percentile_bands(matrix, group_level=PEER_GROUP_LEVELS[level])
+
+"""
+    p10-p90 and p25-p75 bands with the peer median, on the monthly trend axis
+
+    Args:
+        bands: Rows of load_peer_bands for the charted peer group
+        level: Key of DRILLDOWN_LEVEL_COLUMNS, used in the tooltip titles
+        y_title: Title of the value axis
+
+    Returns:
+        alt.LayerChart: Outer band, inner band and median line
+"""
+def peer_band_layers(bands, level, y_title):
+    bands = bands.assign(date=bands['period'], month_name=bands['period'].dt.strftime('%b %Y'))
+    x = alt.X('month_name:N', title='Month', sort=alt.EncodingSortField(field='date', order='ascending'))
+    tooltip = [alt.Tooltip('month_name:N', title='Month')] + [
+        alt.Tooltip(f'{column}:Q', title=f'{level.title()}s {column.upper()}', format=',.0f')
+        for column in ['p10', 'p25', 'p50', 'p75', 'p90']
+    ]
+    outer = alt.Chart(bands).mark_area(opacity=0.12, color='#1f4ed8').encode(
+        x=x, y=alt.Y('p10:Q', title=y_title), y2='p90:Q', tooltip=tooltip
+    )
+    inner = alt.Chart(bands).mark_area(opacity=0.2, color='#1f4ed8').encode(x=x, y='p25:Q', y2='p75:Q', tooltip=tooltip)
+    median = alt.Chart(bands).mark_line(color='#6b7280', strokeDash=[2, 2]).encode(x=x, y='p50:Q', tooltip=tooltip)
+    return outer + inner + median
+
+"""
+    Every dataset rolled up to one level of the postal hierarchy
+
+    Args:
+        level: One of the POSTAL_LEVELS columns
+        data_version: Data snapshot identifier, part of the cache key
+
+    Returns:
+        DataFrame: Output of build_postal_rollup
+"""
+@st.cache_data(show_spinner="Rolling up postal areas...")
+def load_postal_rollup(level, data_version):
+    return build_postal_rollup(load_aadhaar_data(), level)
+
+"""
+    Rules marking regime shifts at their month on a monthly trend chart
+
+    Args:
+        change_points: Rows of detect_change_points for the charted region
+
+    Returns:
+        alt.Chart: Dashed rule layer with the shift date and means in the tooltip
+"""
+def change_point_rules(change_points):
+    rules = change_points.rename(columns={'date': 'shift_date'})
+    rules['date'] = rules['shift_date'].dt.to_period('M').dt.to_timestamp()
+    rules['month_name'] = rules['date'].dt.strftime('%b %Y')
+    return (
+        alt.Chart(rules)
+        .mark_rule(color='#dc2626', strokeDash=[4, 4])
+        .encode(
+            x=alt.X('month_name:N', sort=alt.EncodingSortField(field='date', order='ascending')),
+            tooltip=[
+                alt.Tooltip('shift_date:T', title='Regime Shift'),
+                alt.Tooltip('mean_before:Q', title='Daily Mean Before', format=',.1f'),
+                alt.Tooltip('mean_after:Q', title='Daily Mean After', format=',.1f'),
+                alt.Tooltip('change_pct:Q', title='Change %', format='.1f')
+            ]
+        )
+    )
+
+"""
+    Show a region's regime shifts and, in an expander, those of its comparison scope
+
+    Args:
+        change_points: Shifts of the charted region
+        all_change_points: Shifts of every region in the scope
+        region_label: Name of the charted region
+        scope_label: Description of the scope (e.g. 'all states')
+"""
+def render_change_points(change_points, all_change_points, region_label, scope_label):
+    if len(change_points) > 0:
+        st.caption(f"Dashed lines mark regime shifts detected in the {region_label} daily series.")
+        st.dataframe(
+            change_points[['date', 'mean_before', 'mean_after', 'change_pct', 'strength']],
+            use_container_width=True
+        )
+    else:
+        st.caption(f"No regime shifts detected in the {region_label} daily series.")
+    with st.expander(f"Regime shifts across {scope_label}"):
+        st.dataframe(all_change_points.sort_values('strength', ascending=False), use_container_width=True)
@@ -1,22 +1,168 @@
+import time
+from collections import deque
 import pandas as pd
 import numpy as np
+from scipy import sparse
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 import warnings
 warnings.filterwarnings('ignore')
 
+# Defaults for residual-bootstrap prediction intervals
+DEFAULT_BOOTSTRAP_DRAWS = 1000
+DEFAULT_INTERVAL_QUANTILES = (0.025, 0.975)
+# Upper bound on draws x series x periods materialized at once by the bootstrap
+BOOTSTRAP_CHUNK_ELEMENTS = 5_000_000
+
+"""
+    Resample residuals into bootstrap error paths
+    
+    Args:
+        residuals: In-sample residuals, shape (series, observations)
+        periods: Forecast horizon
+        n_draws: Number of bootstrap draws
+        cumulative: Accumulate errors over the horizon (for level/random-walk style models)
+        rng: numpy Generator used to draw the resampling indices
+    
+    Returns:
+        ndarray: Centred error paths of shape (n_draws, series, periods)
+"""
+
+def _bootstrap_error_paths(residuals, periods, n_draws, cumulative, rng):
+    n_series, n_obs = residuals.shape
+    # Centre residuals so that model bias does not shift the band off the forecast
+    residuals = residuals - residuals.mean(axis=1, keepdims=True)
+    idx = rng.integers(0, n_obs, size=(n_draws, n_series, periods))
+    paths = residuals[np.arange(n_series)[None, :, None], idx]
+    return np.cumsum(paths, axis=2) if cumulative else paths
+
+"""
+    Residual-bootstrap prediction intervals
+    
+    All draws, series and horizon steps are resampled with a single fancy-indexing
+    operation; series are only split into chunks to bound memory when many regions
+    are bootstrapped together.
+    
+    Args:
+        forecast: Point forecasts, shape (periods,) or (series, periods)
+        residuals: In-sample residuals, shape (observations,) or (series, observations)
+        n_draws: Number of bootstrap draws
+        quantiles: Lower and upper quantiles of the interval
+        cumulative: Accumulate resampled errors over the horizon
+        random_state: Seed so that intervals are stable across reruns
+    
+    Returns:
+        tuple: Lower and upper bounds with the same shape as forecast
+"""
+
+def bootstrap_prediction_intervals(forecast, residuals, n_draws=DEFAULT_BOOTSTRAP_DRAWS,
+                                   quantiles=DEFAULT_INTERVAL_QUANTILES, cumulative=False,
+                                   random_state=42):
+    forecast = np.asarray(forecast, dtype=float)
+    residuals = np.asarray(residuals, dtype=float)
+    single = forecast.ndim == 1
+    forecast = np.atleast_2d(forecast)
+    residuals = np.atleast_2d(residuals)
+    n_series, periods = forecast.shape
+    
+    rng = np.random.default_rng(random_state)
+    chunk = max(1, BOOTSTRAP_CHUNK_ELEMENTS // (n_draws * periods))
+    lower = np.empty_like(forecast)
+    upper = np.empty_like(forecast)
+    for start in range(0, n_series, chunk):
+        rows = slice(start, start + chunk)
+        paths = _bootstrap_error_paths(residuals[rows], periods, n_draws, cumulative, rng)
+        q_low, q_high = np.quantile(paths, quantiles, axis=0)
+        lower[rows] = forecast[rows] + q_low
+        upper[rows] = forecast[rows] + q_high
+    
+    if single:
+        return lower[0], upper[0]
+    return lower, upper
+
+# Registry of forecasting models combined by ensemble_forecast, keyed by model name.
+# Each entry holds the forecast function, its keyword parameters, its ensemble
+# weight, whether it takes part in the ensemble by default and the series
+# frequencies ('D' daily, 'M' monthly) it applies to.
+FORECAST_MODELS = {}
+
+# Latency of recent model calls as (model name, seconds), newest last
+MODEL_TIMINGS = deque(maxlen=1000)
+
+"""
+    Register a forecasting model for use in the ensemble
+    
+    Args:
+        name: Registry key for the model
+        func: Forecast function called as func(series, periods=..., **params)
+        params: Extra keyword arguments passed to func
+        weight: Ensemble weight (0 drops the model from the ensemble)
+        enabled: Whether the model is used when no explicit model list is given
+        frequencies: Series frequencies the model applies to ('D' and/or 'M')
+"""
+
+def register_forecast_model(name, func, params=None, weight=1.0, enabled=True, frequencies=('D', 'M')):
+    FORECAST_MODELS[name] = {
+        'func': func,
+        'params': dict(params or {}),
+        'weight': weight,
+        'enabled': enabled,
+        'frequencies': tuple(frequencies)
+    }
+
+"""
+    Run one registered model and record how long its fit/predict call took
+    
+    Args:
+        name: Registered model name
+        series: Time series data
+        periods: Number of periods to forecast
+        **kwargs: Extra keyword arguments passed to the model
+    
+    Returns:
+        tuple: Model result dict and elapsed seconds
+"""
+
+def timed_forecast(name, series, periods, **kwargs):
+    entry = FORECAST_MODELS[name]
+    start = time.perf_counter()
+    result = entry['func'](series, periods=periods, **{**entry['params'], **kwargs})
+    elapsed = time.perf_counter() - start
+    MODEL_TIMINGS.append((name, elapsed))
+    return result, elapsed
+
+"""
+    Summarise recorded model latencies
+    
+    Returns:
+        DataFrame: Calls, mean and 95th percentile latency (ms) per model
+"""
+
+def get_model_timings():
+    if not MODEL_TIMINGS:
+        return pd.DataFrame(columns=['model', 'calls', 'mean_ms', 'p95_ms'])
+    timings = pd.DataFrame(list(MODEL_TIMINGS), columns=['model', 'seconds'])
+    return (
+        timings.groupby('model')['seconds']
+        .agg(calls='count', mean_ms=lambda x: x.mean() * 1000, p95_ms=lambda x: x.quantile(0.95) * 1000)
+        .reset_index()
+    )
+
 """
     Simple linear regression-based forecasting
     
     Args:
         series: Time series data (pandas Series)
         periods: Number of periods to forecast ahead
+        n_draws: Number of bootstrap draws for the prediction interval
+        quantiles: Lower and upper quantiles of the prediction interval
     
     Returns:
-        dict: Forecast values and confidence intervals
+        dict: Forecast values and bootstrap prediction intervals
 """
 
-def simple_linear_forecast(series, periods=3):
+def simple_linear_forecast(series, periods=3, n_draws=DEFAULT_BOOTSTRAP_DRAWS,
+                           quantiles=DEFAULT_INTERVAL_QUANTILES):
     if len(series) < 3:
         return {'error': 'Insufficient data for forecasting'}
     
@@ -32,15 +178,16 @@ def simple_linear_forecast(series, periods=3):
     future_X = np.arange(len(series), len(series) + periods).reshape(-1, 1)
     forecast = model.predict(future_X)
     
-    # Calculate confidence intervals (simplified)
+    # Prediction intervals from resampled residuals
     residuals = y - model.predict(X)
-    std_error = np.std(residuals)
-    confidence_interval = 1.96 * std_error  # 95% CI
+    lower, upper = bootstrap_prediction_intervals(forecast, residuals, n_draws, quantiles)
     
     return {
         'forecast': forecast,
-        'lower_bound': forecast - confidence_interval,
-        'upper_bound': forecast + confidence_interval,
+        'lower_bound': lower,
+        'upper_bound': upper,
+        'residuals': residuals,
+        'cumulative_errors': False,
         'model_type': 'Linear Regression',
         'r_squared': model.score(X, y)
     }
@@ -52,12 +199,15 @@ def simple_linear_forecast(series, periods=3):
         series: Time series data
         window: Moving average window size
         periods: Number of periods to forecast
+        n_draws: Number of bootstrap draws for the prediction interval
+        quantiles: Lower and upper quantiles of the prediction interval
     
     Returns:
-        dict: Forecast values
+        dict: Forecast values and bootstrap prediction intervals
 """
 
-def moving_average_forecast(series, window=3, periods=3):
+def moving_average_forecast(series, window=3, periods=3, n_draws=DEFAULT_BOOTSTRAP_DRAWS,
+                            quantiles=DEFAULT_INTERVAL_QUANTILES):
     if len(series) < window:
         return {'error': 'Insufficient data for forecasting'}
     
@@ -67,8 +217,18 @@ def moving_average_forecast(series, window=3, periods=3):
     # Simple forecast: use last moving average value
     forecast = np.full(periods, last_ma)
     
+    # One-step-ahead errors; these accumulate over the flat forecast horizon
+    residuals = (series - ma.shift(1)).dropna().values
+    if len(residuals) == 0:
+        residuals = (series - last_ma).values
+    lower, upper = bootstrap_prediction_intervals(forecast, residuals, n_draws, quantiles, cumulative=True)
+    
     return {
         'forecast': forecast,
+        'lower_bound': lower,
+        'upper_bound': upper,
+        'residuals': residuals,
+        'cumulative_errors': True,
         'model_type': f'Moving Average (window={window})'
     }
 
@@ -79,19 +239,18 @@ def moving_average_forecast(series, window=3, periods=3):
         series: Time series data
         periods: Number of periods to forecast
         alpha: Smoothing parameter (0-1)
+        n_draws: Number of bootstrap draws for the prediction interval
+        quantiles: Lower and upper quantiles of the prediction interval
     
     Returns:
-        dict: Forecast values
+        dict: Forecast values and bootstrap prediction intervals
 """
 
-def exponential_smoothing_forecast(series, periods=3, alpha=0.3):
+def exponential_smoothing_forecast(series, periods=3, alpha=0.3, n_draws=DEFAULT_BOOTSTRAP_DRAWS,
+                                   quantiles=DEFAULT_INTERVAL_QUANTILES):
     if len(series) < 3:
         return {'error': 'Insufficient data for forecasting'}
     
-    # Simple exponential smoothing
-    forecast_values = []
-    last_value = series.iloc[-1]
-    
     # Use weighted average of recent values
     weights = np.array([alpha * (1 - alpha)**i for i in range(min(10, len(series)))])
     weights = weights / weights.sum()
@@ -102,59 +261,572 @@ def exponential_smoothing_forecast(series, periods=3, alpha=0.3):
     # Forecast: use smoothed value
     forecast = np.full(periods, smoothed_value)
     
+    # One-step-ahead errors of the same weighted window applied across the history
+    values = series.values.astype(float)
+    if len(values) > len(weights):
+        windows = np.lib.stride_tricks.sliding_window_view(values[:-1], len(weights))
+        residuals = values[len(weights):] - windows @ weights
+    else:
+        residuals = values - smoothed_value
+    lower, upper = bootstrap_prediction_intervals(forecast, residuals, n_draws, quantiles, cumulative=True)
+    
     return {
         'forecast': forecast,
+        'lower_bound': lower,
+        'upper_bound': upper,
+        'residuals': residuals,
+        'cumulative_errors': True,
         'model_type': f'Exponential Smoothing (alpha={alpha})'
     }
 """
     Ensemble forecasting using multiple methods
     
+    Models come from FORECAST_MODELS; each call is timed. The ensemble interval is
+    bootstrapped from the models' residuals over their common history, resampling
+    the same time indices for every model so that the weighted error paths keep
+    the correlation between models.
+    
     Args:
         series: Time series data
         periods: Number of periods to forecast
+        n_draws: Number of bootstrap draws for the prediction interval
+        quantiles: Lower and upper quantiles of the prediction interval
+        models: Model names to combine (defaults to the enabled registered models)
+        weights: dict of model name -> weight replacing the registered weights
+            (models missing from it get weight 0)
     
     Returns:
-        dict: Ensemble forecast and individual model forecasts
+        dict: Ensemble forecast, prediction intervals, individual model forecasts and timings
 """
 
-def ensemble_forecast(series, periods=3):
-    forecasts = {}
-    # Try different methods
-    linear = simple_linear_forecast(series, periods)
-    if 'forecast' in linear:
-        forecasts['linear'] = linear['forecast']
-    ma = moving_average_forecast(series, window=3, periods=periods)
-    if 'forecast' in ma:
-        forecasts['moving_average'] = ma['forecast']
-    es = exponential_smoothing_forecast(series, periods=periods)
-    if 'forecast' in es:
-        forecasts['exponential_smoothing'] = es['forecast']
-    if not forecasts:
+def ensemble_forecast(series, periods=3, n_draws=DEFAULT_BOOTSTRAP_DRAWS,
+                      quantiles=DEFAULT_INTERVAL_QUANTILES, models=None, weights=None):
+    if models is None:
+        models = [name for name, entry in FORECAST_MODELS.items() if entry['enabled']]
+    if weights is None:
+        weights = {name: FORECAST_MODELS[name]['weight'] for name in models}
+    else:
+        weights = {name: weights.get(name, 0.0) for name in models}
+    results = {}
+    timings = {}
+    for name in models:
+        if weights[name] <= 0:
+            continue
+        result, timings[name] = timed_forecast(name, series, periods, n_draws=n_draws, quantiles=quantiles)
+        if 'forecast' in result:
+            results[name] = result
+    if not results:
         return {'error': 'No forecasting methods succeeded'}
-    # Ensemble: simple average
+    forecasts = {name: result['forecast'] for name, result in results.items()}
+    # Ensemble: weighted average
+    model_weights = np.array([weights[name] for name in results], dtype=float)
+    model_weights = model_weights / model_weights.sum()
     forecast_array = np.array(list(forecasts.values()))
-    ensemble_forecast = np.mean(forecast_array, axis=0)
+    ensemble_forecast = model_weights @ forecast_array
+    
+    # Weighted average of the models' bootstrap error paths drawn from the same time indices
+    common = min(len(result['residuals']) for result in results.values())
+    error_paths = np.tensordot(model_weights, [
+        _bootstrap_error_paths(
+            np.atleast_2d(result['residuals'][-common:]), periods, n_draws,
+            result['cumulative_errors'], np.random.default_rng(42)
+        )[:, 0, :]
+        for result in results.values()
+    ], axes=1)
+    q_low, q_high = np.quantile(error_paths, quantiles, axis=0)
     
+    equal_weights = np.allclose(model_weights, model_weights[0])
     return {
         'forecast': ensemble_forecast,
+        'lower_bound': ensemble_forecast + q_low,
+        'upper_bound': ensemble_forecast + q_high,
         'individual_forecasts': forecasts,
-        'model_type': 'Ensemble (Average)',
+        'individual_bounds': {
+            name: (result['lower_bound'], result['upper_bound']) for name, result in results.items()
+        },
+        'weights': dict(zip(results, model_weights)),
+        'timings': timings,
+        'model_type': 'Ensemble (Average)' if equal_weights else 'Ensemble (Weighted)',
         'methods_used': list(forecasts.keys())
     }
 
+"""
+    Build the shared design matrix for the weekly seasonal regression
+    
+    Args:
+        dates: DatetimeIndex of the periods to describe
+        origin: First date of the fitted history (trend is measured from here)
+        scale: Number of days in the fitted history, used to scale the trend term
+    
+    Returns:
+        ndarray: Intercept, linear trend and Tuesday..Sunday dummy columns
+"""
+
+def _weekly_design(dates, origin, scale):
+    trend = ((dates - origin).days.values / scale).reshape(-1, 1)
+    day_of_week = dates.dayofweek.values
+    dummies = (day_of_week.reshape(-1, 1) == np.arange(1, 7)).astype(float)
+    return np.hstack([np.ones((len(dates), 1)), trend, dummies])
+
+"""
+    Daily forecasting with weekly seasonality for many regions at once
+    
+    Every region is regressed on the same design matrix (intercept, linear trend
+    and day-of-week dummies), so all series are fitted with a single least-squares
+    solve instead of one model per region. Days with no published data (NaN
+    columns) are left out of the fit and of the bootstrap residuals.
+    
+    Args:
+        matrix: DataFrame of daily values, one row per region and one column per date
+        periods: Number of days to forecast ahead
+        n_draws: Number of bootstrap draws for the prediction intervals
+        quantiles: Lower and upper quantiles of the prediction intervals
+    
+    Returns:
+        dict: Forecast, interval bounds, fitted and residual matrices indexed like the input
+"""
+
+def seasonal_daily_forecast_batch(matrix, periods=14, n_draws=DEFAULT_BOOTSTRAP_DRAWS,
+                                  quantiles=DEFAULT_INTERVAL_QUANTILES):
+    Y = matrix.values.astype(float).T
+    observed = ~np.isnan(Y).any(axis=1)
+    if observed.sum() < 14:
+        return {'error': 'Insufficient data for forecasting (need at least two weeks of daily data)'}
+    
+    dates = pd.DatetimeIndex(matrix.columns)
+    future_dates = pd.date_range(dates[-1] + pd.Timedelta(days=1), periods=periods, freq='D')
+    X = _weekly_design(dates, dates[0], len(dates))
+    future_X = _weekly_design(future_dates, dates[0], len(dates))
+    
+    # One solve for every region over the published days: Y is (days x regions)
+    coef, _, _, _ = np.linalg.lstsq(X[observed], Y[observed], rcond=None)
+    fitted = X @ coef
+    forecast = np.clip(future_X @ coef, 0, None)
+    residuals = Y.T - fitted.T
+    lower, upper = bootstrap_prediction_intervals(forecast.T, residuals[:, observed], n_draws, quantiles)
+    
+    return {
+        'forecast': pd.DataFrame(forecast.T, index=matrix.index, columns=future_dates),
+        'lower_bound': pd.DataFrame(np.clip(lower, 0, None), index=matrix.index, columns=future_dates),
+        'upper_bound': pd.DataFrame(upper, index=matrix.index, columns=future_dates),
+        'fitted': pd.DataFrame(fitted.T, index=matrix.index, columns=dates),
+        'residuals': pd.DataFrame(residuals, index=matrix.index, columns=dates),
+        'model_type': 'Weekly Seasonal Regression'
+    }
+
+"""
+    Weekly seasonal forecasting for a single daily series
+    
+    Args:
+        series: Daily time series with a DatetimeIndex
+        periods: Number of days to forecast ahead
+        n_draws: Number of bootstrap draws for the prediction interval
+        quantiles: Lower and upper quantiles of the prediction interval
+    
+    Returns:
+        dict: Forecast values and bootstrap prediction intervals
+"""
+
+def seasonal_daily_forecast(series, periods=14, n_draws=DEFAULT_BOOTSTRAP_DRAWS,
+                            quantiles=DEFAULT_INTERVAL_QUANTILES):
+    result = seasonal_daily_forecast_batch(series.to_frame().T, periods=periods,
+                                           n_draws=n_draws, quantiles=quantiles)
+    if 'error' in result:
+        return result
+    return {
+        'forecast': result['forecast'].values[0],
+        'lower_bound': result['lower_bound'].values[0],
+        'upper_bound': result['upper_bound'].values[0],
+        'residuals': result['residuals'].dropna(axis=1).values[0],
+        'cumulative_errors': False,
+        'model_type': result['model_type']
+    }
+
+"""
+    Single smoothing pass of Croston's method over a sparse series matrix
+    
+    Args:
+        csc: scipy.sparse CSC matrix, one row per series and one column per period
+        alpha: Smoothing parameter for demand sizes and intervals
+        factor: Multiplier applied to size / interval (1 for Croston, 1 - alpha/2 for SBA)
+    
+    Returns:
+        tuple: Smoothed sizes, smoothed intervals, demand counts per series and the
+        forecast rate after each non-zero entry (aligned with csc.data)
+"""
+
+def _croston_pass(csc, alpha, factor):
+    n_series, n_periods = csc.shape
+    size = np.zeros(n_series)
+    interval = np.zeros(n_series)
+    last_demand = np.full(n_series, -1)
+    demand_count = np.zeros(n_series, dtype=int)
+    event_rates = np.zeros(len(csc.data))
+    # Only series with demand in period t are touched, so the work is O(non-zero cells)
+    for t in range(n_periods):
+        cells = slice(csc.indptr[t], csc.indptr[t + 1])
+        rows = csc.indices[cells]
+        if len(rows) == 0:
+            continue
+        values = csc.data[cells]
+        gap = t - last_demand[rows]
+        first = demand_count[rows] == 0
+        size[rows] = np.where(first, values, size[rows] + alpha * (values - size[rows]))
+        interval[rows] = np.where(first, gap, interval[rows] + alpha * (gap - interval[rows]))
+        last_demand[rows] = t
+        demand_count[rows] += 1
+        event_rates[cells] = factor * size[rows] / interval[rows]
+    return size, interval, demand_count, event_rates
+
+"""
+    Croston / SBA intermittent-demand forecasting for many series at once
+    
+    Demand sizes and inter-demand intervals are smoothed only at periods with
+    demand, so one pass over the non-zero cells of the sparse matrix updates every
+    series (e.g. all pincodes) together.
+    
+    Args:
+        matrix: scipy.sparse matrix, one row per series and one column per period
+        periods: Number of periods to forecast ahead
+        alpha: Smoothing parameter for demand sizes and intervals (0-1)
+        variant: 'sba' (Syntetos-Boylan bias correction) or 'croston'
+    
+    Returns:
+        dict: Forecast matrix (series x periods), per-period demand rate, smoothed
+        demand size and interval, and the number of periods with demand
+"""
+
+def croston_forecast_batch(matrix, periods=3, alpha=0.1, variant='sba'):
+    csc = sparse.csc_matrix(matrix)
+    csc.sum_duplicates()
+    csc.eliminate_zeros()
+    factor = 1 - alpha / 2 if variant == 'sba' else 1.0
+    size, interval, demand_count, _ = _croston_pass(csc, alpha, factor)
+    has_demand = demand_count > 0
+    rate = np.zeros(csc.shape[0])
+    rate[has_demand] = factor * size[has_demand] / interval[has_demand]
+    
+    return {
+        'forecast': np.repeat(rate[:, None], periods, axis=1),
+        'rate': rate,
+        'demand_size': np.where(has_demand, size, np.nan),
+        'demand_interval': np.where(has_demand, interval, np.nan),
+        'demand_periods': demand_count,
+        'model_type': 'SBA (Intermittent Demand)' if variant == 'sba' else 'Croston (Intermittent Demand)'
+    }
+
+"""
+    Croston / SBA forecasting for a single intermittent series
+    
+    Args:
+        series: Time series data
+        periods: Number of periods to forecast ahead
+        alpha: Smoothing parameter for demand sizes and intervals (0-1)
+        variant: 'sba' or 'croston'
+        n_draws: Number of bootstrap draws for the prediction interval
+        quantiles: Lower and upper quantiles of the prediction interval
+    
+    Returns:
+        dict: Forecast values and bootstrap prediction intervals
+"""
+
+def croston_forecast(series, periods=3, alpha=0.1, variant='sba', n_draws=DEFAULT_BOOTSTRAP_DRAWS,
+                     quantiles=DEFAULT_INTERVAL_QUANTILES):
+    values = np.clip(series.values.astype(float), 0, None)
+    demand_at = np.flatnonzero(values)
+    if len(demand_at) == 0:
+        return {'error': 'No demand recorded for this series'}
+    
+    factor = 1 - alpha / 2 if variant == 'sba' else 1.0
+    csc = sparse.csc_matrix(values.reshape(1, -1))
+    _, _, _, event_rates = _croston_pass(csc, alpha, factor)
+    forecast = np.full(periods, event_rates[-1])
+    
+    # One-step-ahead errors: the rate in force at t is the one after the latest earlier demand
+    latest = np.searchsorted(demand_at, np.arange(len(values)), side='left') - 1
+    in_sample = latest >= 0
+    residuals = values[in_sample] - event_rates[latest[in_sample]]
+    if len(residuals) == 0:
+        residuals = values - forecast[0]
+    lower, upper = bootstrap_prediction_intervals(forecast, residuals, n_draws, quantiles)
+    
+    return {
+        'forecast': forecast,
+        'lower_bound': np.clip(lower, 0, None),
+        'upper_bound': upper,
+        'residuals': residuals,
+        'cumulative_errors': False,
+        'model_type': 'SBA (Intermittent Demand)' if variant == 'sba' else 'Croston (Intermittent Demand)'
+    }
+
+"""
+    One step of Holt's linear smoothing for every series
+    
+    Args:
+        level: Current levels, one per series
+        trend: Current trends, one per series
+        values: New observations, one per series
+        alpha: Level smoothing parameter (0-1)
+        beta: Trend smoothing parameter (0-1)
+    
+    Returns:
+        tuple: Updated levels and trends
+"""
+
+def _holt_step(level, trend, values, alpha, beta):
+    new_level = alpha * values + (1 - alpha) * (level + trend)
+    new_trend = beta * (new_level - level) + (1 - beta) * trend
+    return new_level, new_trend
+
+"""
+    Build compact per-series state for incremental forecasting
+    
+    The OLS trend is kept as the running sums n, sum(x), sum(x^2), sum(y) and
+    sum(x*y), and Holt's linear smoothing as the last level and trend. Later
+    periods can then be folded in with update_forecast_state without re-reading
+    the history. Periods with no published data (all-NaN columns) keep their
+    position on the time axis but add nothing to the sums, and Holt's level
+    simply follows its trend across them.
+    
+    Args:
+        matrix: DataFrame (or 2-D array) with one row per series and one column per period
+        alpha: Level smoothing parameter for Holt's method
+        beta: Trend smoothing parameter for Holt's method
+    
+    Returns:
+        dict: Running sums over the observed periods, the number of periods
+        covered, levels and trends per series plus the smoothing parameters
+"""
+
+def init_forecast_state(matrix, alpha=0.3, beta=0.1):
+    values = np.asarray(matrix, dtype=float)
+    n_series, n_periods = values.shape
+    observed = np.flatnonzero(~np.isnan(values).all(axis=0))
+    x = observed.astype(float)
+    y = np.nan_to_num(values[:, observed])
+    
+    level = y[:, 0].copy()
+    trend = (y[:, 1] - y[:, 0]) / (x[1] - x[0]) if len(observed) > 1 else np.zeros(n_series)
+    for t in range(observed[0] + 1, n_periods):
+        if np.isnan(values[:, t]).all():
+            level = level + trend
+        else:
+            level, trend = _holt_step(level, trend, np.nan_to_num(values[:, t]), alpha, beta)
+    
+    return {
+        'index': matrix.index if isinstance(matrix, pd.DataFrame) else pd.RangeIndex(n_series),
+        'periods': n_periods,
+        'n': len(observed),
+        'sum_x': x.sum(),
+        'sum_xx': (x ** 2).sum(),
+        'sum_y': y.sum(axis=1),
+        'sum_xy': y @ x,
+        'level': level,
+        'trend': trend,
+        'alpha': alpha,
+        'beta': beta
+    }
+
+"""
+    Fold one new period into the forecasting state in O(series)
+    
+    Args:
+        state: State from init_forecast_state or a previous update
+        new_values: New observation per series (array in state order, or a Series
+            indexed like the state; missing series count as 0). All-NaN values
+            mark an unpublished period, which only advances the time axis
+    
+    Returns:
+        dict: Updated state (the input state is left unchanged)
+"""
+
+def update_forecast_state(state, new_values):
+    if isinstance(new_values, pd.Series):
+        new_values = new_values.reindex(state['index'], fill_value=0)
+    y = np.asarray(new_values, dtype=float)
+    if np.isnan(y).all():
+        return {**state, 'periods': state['periods'] + 1, 'level': state['level'] + state['trend']}
+    y = np.nan_to_num(y)
+    x = float(state['periods'])
+    level, trend = _holt_step(state['level'], state['trend'], y, state['alpha'], state['beta'])
+    return {
+        **state,
+        'periods': state['periods'] + 1,
+        'n': state['n'] + 1,
+        'sum_x': state['sum_x'] + x,
+        'sum_xx': state['sum_xx'] + x * x,
+        'sum_y': state['sum_y'] + y,
+        'sum_xy': state['sum_xy'] + x * y,
+        'level': level,
+        'trend': trend
+    }
+
+"""
+    Bring a stored forecasting state up to date with a region x period matrix
+    
+    The stored state covers the closed periods (all but the latest, which may
+    still be partial). Closed periods newer than the stored ones are folded in
+    with update_forecast_state; the state is rebuilt when the series change, the
+    stored periods are no longer in the matrix, or the stored state has fewer
+    than two observed periods (Holt's initial trend needs the first two). The latest period is
+    folded into the returned state alone, so a revised partial period never
+    enters the store.
+    
+    Args:
+        stored: Entry returned by a previous call (None to build from scratch)
+        matrix: DataFrame with one row per series and one column per period
+        alpha: Level smoothing parameter for Holt's method
+        beta: Trend smoothing parameter for Holt's method
+    
+    Returns:
+        tuple: (state including the latest period, entry to store for the next call)
+"""
+
+def refresh_forecast_state(stored, matrix, alpha=0.3, beta=0.1):
+    if matrix.shape[1] < 2:
+        return init_forecast_state(matrix, alpha, beta), None
+    closed = matrix.iloc[:, :-1]
+    if (stored is None or not stored['state']['index'].equals(matrix.index)
+            or stored['closed_through'] not in closed.columns or stored['state']['n'] < 2):
+        state = init_forecast_state(closed, alpha, beta)
+    else:
+        state = stored['state']
+        for period in closed.columns[closed.columns > stored['closed_through']]:
+            state = update_forecast_state(state, closed[period])
+    entry = {'state': state, 'closed_through': closed.columns[-1]}
+    return update_forecast_state(state, matrix.iloc[:, -1]), entry
+
+"""
+    Forecast every series from its incremental state
+    
+    Args:
+        state: State from init_forecast_state / update_forecast_state
+        periods: Number of periods to forecast ahead
+    
+    Returns:
+        dict: 'linear' (OLS trend) and 'holt' forecasts as DataFrames, one row per series
+"""
+
+def forecast_from_state(state, periods=3):
+    n = state['n']
+    denominator = n * state['sum_xx'] - state['sum_x'] ** 2
+    if denominator > 0:
+        slope = (n * state['sum_xy'] - state['sum_x'] * state['sum_y']) / denominator
+    else:
+        slope = np.zeros_like(state['sum_y'])
+    intercept = (state['sum_y'] - slope * state['sum_x']) / n
+    
+    future_x = np.arange(state['periods'], state['periods'] + periods, dtype=float)
+    steps = np.arange(1, periods + 1, dtype=float)
+    columns = pd.RangeIndex(1, periods + 1, name='step')
+    return {
+        'linear': pd.DataFrame(intercept[:, None] + slope[:, None] * future_x, index=state['index'], columns=columns),
+        'holt': pd.DataFrame(state['level'][:, None] + state['trend'][:, None] * steps, index=state['index'], columns=columns)
+    }
+
+# Share of the enrolled 0-5 cohort reaching age 5, and so falling due for a
+# mandatory biometric update, each month (children are spread over 60 months of age)
+COHORT_AGEING_RATE = 1 / 60
+DEFAULT_COHORT_PERIODS = 6
+
+"""
+    Cohort model of biometric-update demand for every region
+    
+    Each month, the region's 5-17 enrolments and COHORT_AGEING_RATE of its
+    accumulated 0-5 enrolments fall due for a mandatory biometric update. Updates
+    also serve children enrolled before the data window, so demand is converted
+    to expected updates with a benchmark rate (by default the national ratio of
+    updates to due children). The completion ratio compares actual with expected
+    updates (1 = benchmark), and the backlog is the cumulative shortfall.
+    
+    All regions are computed at once with cumulative sums over the aligned
+    region x month arrays; months unpublished in either the enrolment or the
+    update data are left out of both. The monthly demand and update flows are
+    loaded into incremental forecast states (refreshed from stored entries when
+    given, see refresh_forecast_state), whose Holt forecasts project the backlog.
+    
+    Args:
+        infant_matrix: DataFrame of age 0-5 enrolments, regions x months
+        child_matrix: DataFrame of age 5-17 enrolments, regions x months
+        update_matrix: DataFrame of age 5-17 biometric updates, regions x months
+        periods: Number of months to project
+        ageing_rate: Monthly share of the 0-5 cohort falling due
+        benchmark: Expected updates per due child (None for the overall ratio)
+        stored: dict of 'due' / 'updates' -> entries from a previous call's 'stored'
+    
+    Returns:
+        dict: 'expected' and 'updates' (cumulative DataFrames, regions x months),
+        'benchmark', 'summary' (one row per region: due, expected, updates,
+        completion_ratio, backlog, projected_expected, projected_updates,
+        projected_backlog), 'state' (forecast states of the monthly 'due'
+        and 'updates' flows) and 'stored' (their entries for the next call)
+"""
+def cohort_update_demand(infant_matrix, child_matrix, update_matrix, periods=DEFAULT_COHORT_PERIODS,
+                         ageing_rate=COHORT_AGEING_RATE, benchmark=None, stored=None):
+    regions = infant_matrix.index.union(child_matrix.index).union(update_matrix.index)
+    months = infant_matrix.columns.union(child_matrix.columns).union(update_matrix.columns)
+    infant, child, updates = (
+        matrix.reindex(index=regions, fill_value=0).reindex(columns=months).to_numpy(dtype=float, copy=True)
+        for matrix in (infant_matrix, child_matrix, update_matrix)
+    )
+    due_flow = child + ageing_rate * np.nancumsum(infant, axis=1)
+    unpublished = np.isnan(due_flow).all(axis=0) | np.isnan(updates).all(axis=0)
+    due_flow[:, unpublished] = np.nan
+    updates[:, unpublished] = np.nan
+    if benchmark is None:
+        benchmark = np.nansum(updates) / np.nansum(due_flow) if np.nansum(due_flow) > 0 else 1.0
+    expected = benchmark * np.nancumsum(due_flow, axis=1)
+    completed = np.nancumsum(updates, axis=1)
+
+    state, entries = {}, {}
+    for name, flow in [('due', due_flow), ('updates', updates)]:
+        state[name], entries[name] = refresh_forecast_state(
+            (stored or {}).get(name), pd.DataFrame(flow, index=regions, columns=months)
+        )
+    projected_due = np.clip(forecast_from_state(state['due'], periods)['holt'].to_numpy(), 0, None).sum(axis=1)
+    projected_updates = np.clip(forecast_from_state(state['updates'], periods)['holt'].to_numpy(), 0, None).sum(axis=1)
+
+    shortfall = expected[:, -1] - completed[:, -1]
+    summary = pd.DataFrame({
+        'due': expected[:, -1] / benchmark,
+        'expected': expected[:, -1],
+        'updates': completed[:, -1],
+        'completion_ratio': completed[:, -1] / np.where(expected[:, -1] > 0, expected[:, -1], np.nan),
+        'backlog': np.maximum(shortfall, 0),
+        'projected_expected': benchmark * projected_due,
+        'projected_updates': projected_updates,
+        'projected_backlog': np.maximum(shortfall + benchmark * projected_due - projected_updates, 0)
+    }, index=regions)
+    return {
+        'expected': pd.DataFrame(expected, index=regions, columns=months),
+        'updates': pd.DataFrame(completed, index=regions, columns=months),
+        'benchmark': benchmark,
+        'summary': summary,
+        'state': state,
+        'stored': entries
+    }
+
+register_forecast_model('linear', simple_linear_forecast)
+register_forecast_model('moving_average', moving_average_forecast, params={'window': 3})
+register_forecast_model('exponential_smoothing', exponential_smoothing_forecast)
+register_forecast_model('seasonal_weekly', seasonal_daily_forecast, enabled=False, frequencies=('D',))
+register_forecast_model('croston_sba', croston_forecast, params={'variant': 'sba'}, enabled=False)
+
 """
     Evaluate forecast accuracy metrics
     
     Args:
-        actual: Actual values
+        actual: Actual values (NaN for unpublished periods, which are skipped)
         predicted: Predicted values
     
     Returns:
         dict: Accuracy metrics
 """
 def evaluate_forecast_accuracy(actual, predicted):
-    actual = np.array(actual)
-    predicted = np.array(predicted)
+    actual = np.array(actual, dtype=float)
+    predicted = np.array(predicted, dtype=float)
+    observed = ~np.isnan(actual)
+    actual, predicted = actual[observed], predicted[observed]
     mae = mean_absolute_error(actual, predicted)
     mse = mean_squared_error(actual, predicted)
     rmse = np.sqrt(mse)
@@ -166,4 +838,63 @@ def evaluate_forecast_accuracy(actual, predicted):
         'MAPE': mape
     }
 
+"""
+    Rolling-origin backtest of registered models with latency per model
+    
+    Args:
+        series: Time series data
+        horizon: Number of periods forecast from each origin
+        n_origins: Number of rolling forecast origins (most recent first)
+        models: Model names to evaluate (defaults to the enabled registered models)
+    
+    Returns:
+        DataFrame: MAE, RMSE, MAPE and mean latency (ms) per model
+"""
+def backtest_forecast_models(series, horizon=3, n_origins=3, models=None):
+    if models is None:
+        models = [name for name, entry in FORECAST_MODELS.items() if entry['enabled']]
+    last_origin = len(series) - horizon
+    origins = [o for o in range(last_origin - n_origins + 1, last_origin + 1) if o >= 3]
+    rows = []
+    for name in models:
+        metrics = []
+        latencies = []
+        for origin in origins:
+            result, elapsed = timed_forecast(name, series.iloc[:origin], horizon)
+            latencies.append(elapsed)
+            if 'forecast' in result:
+                metrics.append(evaluate_forecast_accuracy(series.iloc[origin:origin + horizon].values, result['forecast']))
+        row = {'model': name, 'origins': len(metrics), 'latency_ms': np.mean(latencies) * 1000 if latencies else np.nan}
+        for metric in ['MAE', 'RMSE', 'MAPE']:
+            row[metric] = np.mean([m[metric] for m in metrics]) if metrics else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows, columns=['model', 'origins', 'MAE', 'RMSE', 'MAPE', 'latency_ms'])
+
+"""
+    Derive ensemble weights from backtest error
+    
+    Weights are proportional to inverse error. A model slower than max_latency_ms
+    is dropped (weight 0) unless it is more accurate than every model within the
+    latency budget.
+    
+    Args:
+        report: Output of backtest_forecast_models
+        metric: Error column used for weighting
+        max_latency_ms: Latency budget per model call (None disables the check)
+    
+    Returns:
+        dict: Model name -> normalised weight
+"""
+def backtest_ensemble_weights(report, metric='MAE', max_latency_ms=None):
+    report = report.dropna(subset=[metric])
+    if report.empty:
+        return {}
+    errors = report.set_index('model')[metric].clip(lower=1e-9)
+    inverse = 1 / errors
+    if max_latency_ms is not None:
+        latency = report.set_index('model')['latency_ms']
+        fast = latency <= max_latency_ms
+        best_fast = errors[fast].min() if fast.any() else np.inf
+        inverse[~fast & (errors >= best_fast)] = 0
+    return (inverse / inverse.sum()).to_dict()
 